@@ -1,18 +1,12 @@
 from django_filters import FilterSet, CharFilter, IsoDateTimeFilter, MethodFilter
-from ui.models import Warc, Seed, Harvest, Collection
-from django_filters import Filter
-from django_filters.fields import Lookup
-
-
-class ListFilter(Filter):
-    def filter(self, qs, value):
-        return super(ListFilter, self).filter(qs, Lookup(value.split(u","), "in"))
+from ui.models import Warc, Harvest, Collection
 
 
 class WarcFilter(FilterSet):
     # Allows queries like /api/v1/warcs/?collection=39c00280274a4db0b1cb5bfa4d527a1e
     collection = CharFilter(name="harvest__historical_collection__collection_id")
-    seed = ListFilter(name="harvest__historical_seeds__seed_id", distinct=True)
+    # Allows queries like /api/v1/warcs/?seed=1,2
+    seed = MethodFilter(action="seed_filter")
     harvest_date_start = IsoDateTimeFilter(name="harvest__date_started", lookup_type='gte')
     harvest_date_end = IsoDateTimeFilter(name="harvest__date_started", lookup_type='lte')
     exclude_web = MethodFilter(action="web_filter")
@@ -21,6 +15,14 @@ class WarcFilter(FilterSet):
         model = Warc
         fields = ['collection']
 
+    @staticmethod
+    def seed_filter(queryset, value):
+        if not value:
+            return queryset
+        # A subquery rather than a join through the historical seeds, so that distinct is not needed.
+        return queryset.filter(harvest__in=Harvest.objects.filter(
+            historical_seeds__seed_id__in=value.split(u",")).values("id"))
+
     @staticmethod
     def web_filter(queryset, value):
         if value.lower() in ("true", "yes"):
@@ -0,0 +1,123 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.six.moves.urllib import parse as urlparse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class WarcCursorPagination(BasePagination):
+    """
+    Cursor pagination for warcs, ordered by date created and id.
+
+    A cursor holds the date created and id of the warc that a page follows (or, for
+    the previous link, precedes). Pages are retrieved by filtering on both fields,
+    not with an offset, so they stay fast deep into the list and are not affected
+    by warcs that have the same date created.
+
+    In v1 of the API, pagination is only applied when a page_size or cursor is
+    requested, so that existing clients that expect a list of all warcs are not
+    affected. In later versions, it is always applied.
+    """
+    cursor_query_param = "cursor"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    invalid_cursor_message = "Invalid cursor"
+    # Versions of the API in which pagination must be requested
+    opt_in_versions = ("v1",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[2]
+        if reverse:
+            queryset = queryset.order_by("-date_created", "-id")
+        else:
+            queryset = queryset.order_by("date_created", "id")
+        if cursor is not None:
+            date_created, pk, _ = cursor
+            if reverse:
+                queryset = queryset.filter(date_created__lte=date_created).filter(
+                    Q(date_created__lt=date_created) | Q(id__lt=pk))
+            else:
+                queryset = queryset.filter(date_created__gte=date_created).filter(
+                    Q(date_created__gt=date_created) | Q(id__gt=pk))
+
+        # An extra warc is retrieved to determine if there is another page.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = len(results) > self.page_size
+        else:
+            self.has_next = len(results) > self.page_size
+            self.has_previous = cursor is not None
+        return self.page
+
+    def get_page_size(self, request):
+        if self.page_size_query_param in request.query_params:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+                if page_size > 0:
+                    return min(page_size, self.max_page_size)
+            except ValueError:
+                pass
+            return self.page_size
+        if self.cursor_query_param in request.query_params or request.version not in self.opt_in_versions:
+            return self.page_size
+        return None
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], True)
+
+    def decode_cursor(self, request):
+        """
+        Returns the (date created, id, reverse) of the request's cursor or None if there is no cursor.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = urlparse.parse_qs(b64decode(encoded.encode("ascii")).decode("ascii"))
+            date_created = parse_datetime(tokens["d"][0])
+            pk = int(tokens["i"][0])
+            reverse = tokens.get("r", ["0"])[0] == "1"
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if date_created is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date_created, pk, reverse
+
+    def encode_cursor(self, warc, reverse):
+        """
+        Returns the url for a cursor positioned at a warc.
+        """
+        tokens = {"d": warc.date_created.isoformat(), "i": str(warc.id)}
+        if reverse:
+            tokens["r"] = "1"
+        encoded = b64encode(urlparse.urlencode(sorted(tokens.items())).encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data)
+        ]))
@@ -0,0 +1,31 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def ndjson_line(obj):
+    """
+    Returns an object as a line of newline delimited JSON.
+    """
+    return json.dumps(obj, cls=JSONEncoder, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renderer for newline delimited JSON, i.e., one JSON object per line.
+
+    Lists are streamed by NDJSONListMixin; this renders other responses, e.g., a
+    single object or an error.
+    """
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, list):
+            return b"".join(ndjson_line(obj) for obj in data)
+        return ndjson_line(data)
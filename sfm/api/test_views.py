@@ -0,0 +1,144 @@
+from django.test import TestCase
+from ui.models import User, Group, CollectionSet, Credential, Collection, Harvest, Warc, Seed
+from datetime import datetime
+import json
+import pytz
+from mock import patch
+
+
+class WarcViewSetTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser(username="test_user", email="test_user@test.com",
+                                             password="test_password")
+        group = Group.objects.create(name="test_group")
+        collection_set = CollectionSet.objects.create(group=group, name="test_collection_set")
+        credential = Credential.objects.create(user=user, platform="test_platform", token="{}")
+        collection = Collection.objects.create(collection_set=collection_set, credential=credential,
+                                               harvest_type=Collection.TWITTER_SEARCH, name="test_collection")
+        historical_collection = collection.history.all()[0]
+        harvest = Harvest.objects.create(collection=collection, historical_collection=historical_collection,
+                                         harvest_type=Collection.TWITTER_SEARCH)
+        self.collection_id = collection.collection_id
+        seed1 = Seed.objects.create(collection=collection, token="test_token1", seed_id="1")
+        seed2 = Seed.objects.create(collection=collection, token="test_token2", seed_id="2")
+        harvest.historical_seeds.add(seed1.history.all()[0], seed2.history.all()[0])
+        for i in range(1, 6):
+            Warc.objects.create(harvest=harvest, warc_id="warc{}".format(i), path="/sfm-data/warc{}.warc.gz".format(i),
+                                sha1="7512e1c227c29332172118f0b79b2ca75cbe8979", bytes=i,
+                                date_created=datetime(2016, 5, 6 - i, tzinfo=pytz.utc))
+
+    def test_list(self):
+        response = self.client.get("/api/v1/warcs/", {"collection": self.collection_id})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(5, len(json.loads(response.content)))
+
+    def test_list_queries(self):
+        # Constant number of queries, regardless of the number of warcs
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/v1/warcs/", {"exclude_web": "true"})
+        self.assertEqual(5, len(json.loads(response.content)))
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/v1/warcs/", {"page_size": 2})
+        self.assertEqual(2, len(json.loads(response.content)["results"]))
+
+    def test_list_seed(self):
+        response = self.client.get("/api/v1/warcs/", {"seed": "1,2"})
+        # No duplicates for a harvest with both seeds
+        self.assertEqual(5, len(json.loads(response.content)))
+        response = self.client.get("/api/v1/warcs/", {"seed": "3"})
+        self.assertEqual(0, len(json.loads(response.content)))
+
+    def test_list_paginated(self):
+        response = self.client.get("/api/v1/warcs/", {"collection": self.collection_id, "page_size": 2})
+        warc_ids = []
+        pages = 0
+        while True:
+            self.assertEqual(200, response.status_code)
+            page = json.loads(response.content)
+            self.assertLessEqual(len(page["results"]), 2)
+            warc_ids.extend([warc["warc_id"] for warc in page["results"]])
+            pages += 1
+            if not page["next"]:
+                break
+            response = self.client.get(page["next"])
+
+        self.assertEqual(3, pages)
+        # Ordered by date created
+        self.assertListEqual(["warc5", "warc4", "warc3", "warc2", "warc1"], warc_ids)
+
+        # And back
+        warc_ids = []
+        while page["previous"]:
+            response = self.client.get(page["previous"])
+            page = json.loads(response.content)
+            warc_ids = [warc["warc_id"] for warc in page["results"]] + warc_ids
+        self.assertListEqual(["warc5", "warc4", "warc3", "warc2"], warc_ids)
+
+    def test_list_paginated_same_date_created(self):
+        Warc.objects.update(date_created=datetime(2016, 5, 1, tzinfo=pytz.utc))
+        response = self.client.get("/api/v1/warcs/", {"page_size": 2})
+        warc_ids = []
+        while True:
+            page = json.loads(response.content)
+            warc_ids.extend([warc["warc_id"] for warc in page["results"]])
+            if not page["next"]:
+                break
+            response = self.client.get(page["next"])
+
+        # Ordered by id
+        self.assertListEqual(["warc1", "warc2", "warc3", "warc4", "warc5"], warc_ids)
+
+    def test_list_invalid_cursor(self):
+        response = self.client.get("/api/v1/warcs/", {"cursor": "invalid"})
+        self.assertEqual(404, response.status_code)
+
+    @patch("api.pagination.WarcCursorPagination.page_size", 2)
+    def test_list_v2(self):
+        # Paginated by default
+        response = self.client.get("/api/v2/warcs/")
+        self.assertEqual(200, response.status_code)
+        page = json.loads(response.content)
+        self.assertListEqual(["warc5", "warc4"], [warc["warc_id"] for warc in page["results"]])
+        self.assertTrue(page["next"].startswith("http://testserver/api/v2/warcs/?cursor="))
+
+        response = self.client.get("/api/v2/")
+        self.assertEqual("http://testserver/api/v2/warcs/", json.loads(response.content)["warcs"])
+
+    def test_list_ndjson(self):
+        response = self.client.get("/api/v1/warcs/", {"collection": self.collection_id, "format": "ndjson"})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("application/x-ndjson", response["Content-Type"])
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(5, len(lines))
+        warc = json.loads(lines[0])
+        self.assertEqual("warc1", warc["warc_id"])
+        self.assertEqual("/sfm-data/warc1.warc.gz", warc["path"])
+        self.assertEqual("2016-05-05T00:00:00Z", warc["date_created"])
+        self.assertEqual(Collection.TWITTER_SEARCH, warc["harvest_type"])
+
+    @patch("api.views.WarcViewSet.ndjson_chunk_size", 2)
+    def test_list_ndjson_chunks(self):
+        response = self.client.get("/api/v1/warcs/", {"format": "ndjson"})
+        warc_ids = [json.loads(line)["warc_id"] for line in b"".join(response.streaming_content).splitlines()]
+        self.assertListEqual(["warc1", "warc2", "warc3", "warc4", "warc5"], warc_ids)
+
+
+class CollectionViewSetTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser(username="test_user", email="test_user@test.com",
+                                             password="test_password")
+        group = Group.objects.create(name="test_group")
+        collection_set = CollectionSet.objects.create(group=group, name="test_collection_set")
+        credential = Credential.objects.create(user=user, platform="test_platform", token="{}")
+        self.collection = Collection.objects.create(collection_set=collection_set, credential=credential,
+                                                    harvest_type=Collection.TWITTER_SEARCH, name="test_collection")
+
+    def test_list_ndjson(self):
+        response = self.client.get("/api/v1/collections/", {"format": "ndjson"})
+        self.assertEqual(200, response.status_code)
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual(1, len(lines))
+        self.assertDictEqual({"collection_id": self.collection.collection_id,
+                              "harvest_type": Collection.TWITTER_SEARCH,
+                              "name": "test_collection",
+                              "is_active": False}, json.loads(lines[0]))
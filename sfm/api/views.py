@@ -1,23 +1,69 @@
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from ui.models import Warc, Collection
 from .serializers import WarcSerializer, CollectionSerializer
 from .filters import WarcFilter, CollectionFilter
+from .pagination import WarcCursorPagination
+from .renderers import NDJSONRenderer, ndjson_line
 
 
-class WarcViewSet(ReadOnlyModelViewSet):
+class NDJSONListMixin(object):
+    """
+    Streams lists as newline delimited JSON when requested with format=ndjson.
+
+    Rows are retrieved with values() in chunks ordered by primary key and written
+    without serializer instances, so memory use does not grow with the size of
+    the list. Pagination is not applied.
+
+    ndjson_fields is a list of (name, lookup) pairs for the fields of each object.
+    """
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer]
+    ndjson_fields = ()
+    ndjson_chunk_size = 1000
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            queryset = self.filter_queryset(self.get_queryset())
+            return StreamingHttpResponse(self._ndjson_lines(queryset), content_type=NDJSONRenderer.media_type)
+        return super(NDJSONListMixin, self).list(request, *args, **kwargs)
+
+    def _ndjson_lines(self, queryset):
+        lookups = [lookup for _, lookup in self.ndjson_fields]
+        last_pk = None
+        while True:
+            # Django's iterator() does not use a server-side cursor, so retrieving by chunks.
+            chunk_queryset = queryset.order_by("pk")
+            if last_pk is not None:
+                chunk_queryset = chunk_queryset.filter(pk__gt=last_pk)
+            rows = list(chunk_queryset.values_list("pk", *lookups)[:self.ndjson_chunk_size])
+            for row in rows:
+                yield ndjson_line(dict((name, value) for (name, _), value in zip(self.ndjson_fields, row[1:])))
+            if len(rows) < self.ndjson_chunk_size:
+                return
+            last_pk = rows[-1][0]
+
+
+class WarcViewSet(NDJSONListMixin, ReadOnlyModelViewSet):
     serializer_class = WarcSerializer
     lookup_field = "warc_id"
     filter_fields = ('warc_id', 'path')
     filter_class = WarcFilter
+    pagination_class = WarcCursorPagination
+    ndjson_fields = (("warc_id", "warc_id"), ("path", "path"), ("sha1", "sha1"), ("bytes", "bytes"),
+                     ("date_created", "date_created"), ("harvest_type", "harvest__harvest_type"))
 
     def get_queryset(self):
-        return Warc.objects.all()
+        # Harvest is selected for harvest_type.
+        return Warc.objects.select_related("harvest")
 
 
-class CollectionViewSet(ReadOnlyModelViewSet):
+class CollectionViewSet(NDJSONListMixin, ReadOnlyModelViewSet):
     serializer_class = CollectionSerializer
     lookup_field = "warc_id"
     filter_class = CollectionFilter
+    ndjson_fields = (("collection_id", "collection_id"), ("harvest_type", "harvest_type"), ("name", "name"),
+                     ("is_active", "is_active"))
 
     def get_queryset(self):
-        return Collection.objects.all()
\ No newline at end of file
+        return Collection.objects.all()
@@ -0,0 +1,219 @@
+import logging
+import socket
+import time
+from itertools import groupby
+
+from django.db import transaction
+from kombu import Connection, Exchange, Queue, Consumer
+
+from ui.models import Harvest, Warc, Export
+from .sfm_ui_consumer import SfmUiConsumer
+import iso8601
+
+log = logging.getLogger(__name__)
+
+# Order in which groups of messages are applied within a batch.
+# Web harvests are created before their status messages; harvests are updated before their warcs are recorded.
+GROUP_ORDER = ("harvest.start.web", "harvest.status.", "warc_created", "export.status.")
+WARC_CREATED_GROUP = GROUP_ORDER.index("warc_created")
+
+
+def _group(routing_key):
+    for i, prefix in enumerate(GROUP_ORDER):
+        if routing_key.startswith(prefix):
+            return i
+    return len(GROUP_ORDER)
+
+
+class BatchSfmUiConsumer(SfmUiConsumer):
+    """
+    SFM UI Consumer that pulls messages in batches and applies each batch
+    in a single transaction.
+
+    A batch is complete when batch_size messages have been received or
+    batch_timeout seconds have passed since the first message of the batch.
+    Messages are acknowledged only after the batch has been committed.
+    """
+
+    def __init__(self, mq_config=None, batch_size=100, batch_timeout=1.0):
+        super(BatchSfmUiConsumer, self).__init__(mq_config=mq_config)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        # List of (routing key, message, message object)
+        self._batch = []
+
+    def run(self):
+        with Connection(transport="librabbitmq",
+                        hostname=self.mq_config.host,
+                        userid=self.mq_config.username,
+                        password=self.mq_config.password) as connection:
+            channel = connection.channel()
+            exchange = Exchange(name=self.mq_config.exchange, type="topic", durable=True)
+            queues = []
+            for queue_name, routing_keys in self.mq_config.queues.items():
+                queue = Queue(queue_name, exchange=exchange, channel=channel, durable=True)
+                queue.declare()
+                for routing_key in routing_keys:
+                    queue.bind_to(exchange=exchange, routing_key=routing_key)
+                queues.append(queue)
+
+            with Consumer(channel, queues=queues, callbacks=[self._on_batch_message], no_ack=False) as consumer:
+                # Do not let the broker deliver more than a batch of unacknowledged messages.
+                consumer.qos(prefetch_count=self.batch_size)
+                log.info("Consuming in batches of up to %s messages or %s seconds", self.batch_size,
+                         self.batch_timeout)
+                while True:
+                    self._fill_batch(connection)
+                    self.process_batch()
+
+    def _on_batch_message(self, message, message_obj):
+        self._batch.append((message_obj.delivery_info["routing_key"], message, message_obj))
+
+    def _fill_batch(self, connection):
+        # Block until the first message of the batch arrives.
+        while not self._batch:
+            connection.drain_events()
+        deadline = time.time() + self.batch_timeout
+        while len(self._batch) < self.batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                connection.drain_events(timeout=timeout)
+            except socket.timeout:
+                break
+
+    def process_batch(self):
+        """
+        Applies the current batch of messages and acknowledges them.
+
+        If applying the batch fails, the messages are applied one at a time
+        so that a single bad message does not hold up the rest.
+        """
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        log.debug("Processing batch of %s messages", len(batch))
+        self._wait_for_objects(batch)
+        self._add_export_files(batch)
+        # The harvests and exports have been waited for, so do not wait again while the transaction is open.
+        retry_delays, self.retry_delays = self.retry_delays, ()
+        try:
+            # Emails are sent only once the messages that they are about have been committed.
+            self.queued_mails = []
+            try:
+                with transaction.atomic():
+                    self._apply_batch(batch)
+                self.send_mails(self.queued_mails)
+            except Exception:
+                log.exception("Processing batch of %s messages failed. Processing messages individually.",
+                              len(batch))
+                for routing_key, message, _ in batch:
+                    self.queued_mails = []
+                    try:
+                        with transaction.atomic():
+                            self._apply_message(routing_key, message)
+                        self.send_mails(self.queued_mails)
+                    except Exception:
+                        log.exception("Processing message with routing key %s failed", routing_key)
+        finally:
+            self.retry_delays = retry_delays
+            self.queued_mails = None
+
+        for _, _, message_obj in batch:
+            message_obj.ack()
+
+    def _wait_for_objects(self, batch):
+        """
+        Waits for the harvests and exports that the messages in a batch refer to.
+
+        This is done before the batch's transaction is opened, so that locks are not
+        held while waiting. Web harvests started within the batch are not waited for.
+        """
+        harvest_ids = set()
+        web_harvest_ids = set()
+        export_ids = set()
+        for routing_key, message, _ in batch:
+            if routing_key.startswith("harvest.status."):
+                harvest_ids.add(message.get("id"))
+            elif routing_key == "warc_created":
+                harvest_ids.add(message.get("harvest", {}).get("id"))
+            elif routing_key == "harvest.start.web":
+                harvest_ids.add(message.get("parent_id"))
+                web_harvest_ids.add(message.get("id"))
+            elif routing_key.startswith("export.status."):
+                export_ids.add(message.get("id"))
+        harvest_ids -= web_harvest_ids
+        harvest_ids.discard(None)
+        export_ids.discard(None)
+        for delay in self.retry_delays:
+            harvest_ids -= set(Harvest.objects.filter(harvest_id__in=harvest_ids).values_list(
+                "harvest_id", flat=True))
+            export_ids -= set(Export.objects.filter(export_id__in=export_ids).values_list("export_id", flat=True))
+            if not harvest_ids and not export_ids:
+                return
+            log.debug("Harvests %s and exports %s not found. Retrying in %s seconds.", harvest_ids, export_ids,
+                      delay)
+            time.sleep(delay)
+
+    def _add_export_files(self, batch):
+        """
+        Adds the files of successful exports to export status messages that do not list them.
+
+        Creating a manifest scans the export directory, which may be on a network file system, so this is done
+        before the batch's transaction is opened.
+        """
+        for routing_key, message, _ in batch:
+            if (routing_key.startswith("export.status.") and message.get("status") == Export.SUCCESS and
+                    "files" not in message):
+                export = Export.objects.filter(export_id=message.get("id")).first()
+                if export is not None:
+                    manifest = self._create_export_manifest(export)
+                    if manifest is not None:
+                        message["files"] = manifest
+
+    def _apply_batch(self, batch):
+        # Sort is stable, so messages keep their order within a group.
+        for group, group_batch in groupby(sorted(batch, key=lambda m: _group(m[0])), key=lambda m: _group(m[0])):
+            group_batch = list(group_batch)
+            if group == WARC_CREATED_GROUP:
+                self._on_warc_created_messages([message for _, message, _ in group_batch])
+            else:
+                for routing_key, message, _ in group_batch:
+                    self._apply_message(routing_key, message)
+
+    def _apply_message(self, routing_key, message):
+        self.routing_key = routing_key
+        self.message = message
+        self.on_message()
+
+    def _on_warc_created_messages(self, messages):
+        """
+        Records the warcs for a list of warc_created messages with a single insert.
+        """
+        harvests = dict((harvest.harvest_id, harvest) for harvest in Harvest.objects.filter(
+            harvest_id__in=set(message["harvest"]["id"] for message in messages)))
+        warc_ids = set(Warc.objects.filter(
+            warc_id__in=[message["warc"]["id"] for message in messages]).values_list("warc_id", flat=True))
+
+        warcs = []
+        for message in messages:
+            if message["warc"]["id"] in warc_ids:
+                log.warn("Skipping warc with id %s since it already exists", message["warc"]["id"])
+                continue
+            harvest = harvests.get(message["harvest"]["id"])
+            if harvest is None:
+                # Fall back to retrying the lookup.
+                self._apply_message("warc_created", message)
+                continue
+            warcs.append(Warc(
+                harvest=harvest,
+                warc_id=message["warc"]["id"],
+                path=message["warc"]["path"],
+                sha1=message["warc"]["sha1"],
+                bytes=message["warc"]["bytes"],
+                date_created=iso8601.parse_date(message["warc"]["date_created"])
+            ))
+            warc_ids.add(message["warc"]["id"])
+        log.debug("Creating %s warcs", len(warcs))
+        Warc.objects.bulk_create(warcs)
@@ -1,6 +1,8 @@
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from message_consumer.sfm_ui_consumer import SfmUiConsumer
+from message_consumer.batch_consumer import BatchSfmUiConsumer
+from message_consumer.pool_consumer import PooledSfmUiConsumer
 from sfmutils.consumer import MqConfig, EXCHANGE
 
 QUEUE = "sfm_ui"
@@ -11,10 +13,26 @@ ROUTING_KEYS = ["harvest.status.*", "harvest.status.*.*", "warc_created", "expor
 class Command(BaseCommand):
     help = 'Starts the message consumer'
 
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int,
+                            help="Apply messages in batches of up to this many messages in a single transaction.")
+        parser.add_argument("--batch-timeout", type=int, default=1000,
+                            help="Milliseconds to wait for a batch to fill. Default is 1000.")
+        parser.add_argument("--workers", type=int,
+                            help="Apply messages with this many workers. Messages for the same collection or export "
+                                 "are always applied by the same worker.")
+
     def handle(self, *args, **options):
         username = settings.RABBITMQ_USER
         password = settings.RABBITMQ_PASSWORD
-        consumer = SfmUiConsumer(mq_config=MqConfig(settings.RABBITMQ_HOST,
-                                 username, password, EXCHANGE,
-                                 {QUEUE: ROUTING_KEYS}))
+        mq_config = MqConfig(settings.RABBITMQ_HOST, username, password, EXCHANGE, {QUEUE: ROUTING_KEYS})
+        if options["batch_size"] and options["workers"]:
+            raise CommandError("--batch-size and --workers may not be used together.")
+        if options["workers"]:
+            consumer = PooledSfmUiConsumer(mq_config=mq_config, workers=options["workers"])
+        elif options["batch_size"]:
+            consumer = BatchSfmUiConsumer(mq_config=mq_config, batch_size=options["batch_size"],
+                                          batch_timeout=options["batch_timeout"] / 1000.0)
+        else:
+            consumer = SfmUiConsumer(mq_config=mq_config)
         consumer.run()
@@ -0,0 +1,231 @@
+import logging
+import Queue
+import socket
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.db import connection as db_connection
+from kombu import Connection, Exchange, Queue as MqQueue, Consumer
+
+from ui.models import Harvest
+from .sfm_ui_consumer import SfmUiConsumer
+
+log = logging.getLogger(__name__)
+
+
+def shard(key, workers):
+    """
+    Returns the number of the worker that handles messages with a shard key.
+    """
+    if isinstance(key, unicode):
+        key = key.encode("utf-8")
+    return (zlib.crc32(key) & 0xffffffff) % workers
+
+
+class ShardKeys(object):
+    """
+    Returns the keys used to assign messages to workers.
+
+    Messages about harvests are keyed by the harvest's collection, so that all of
+    the messages for a collection, including those for its web harvests, are
+    applied by the same worker. Otherwise, updates to the collection's harvest
+    state and stats rollups could be applied concurrently. If the harvest is not
+    found, messages are keyed by harvest, so that they are spread across workers
+    while waiting for the harvest. Messages about exports are keyed by export.
+
+    The collections of harvests are cached, since they do not change.
+    """
+
+    def __init__(self, cache_size=10000):
+        self.cache_size = cache_size
+        self._collection_ids = OrderedDict()
+
+    def shard_key(self, routing_key, message):
+        if routing_key.startswith("export.status."):
+            return u"export:{}".format(message.get("id"))
+        if routing_key == "harvest.start.web":
+            harvest_id = message.get("parent_id")
+            collection_id = self.collection_id(harvest_id)
+            if collection_id is not None:
+                # The web harvest is created by the worker, so it cannot be looked up for later messages.
+                self._cache(message.get("id"), collection_id)
+        else:
+            if routing_key == "warc_created":
+                harvest_id = message.get("harvest", {}).get("id")
+            else:
+                harvest_id = message.get("id")
+            collection_id = self.collection_id(harvest_id)
+        if collection_id is None:
+            log.warn("Collection not found for message with routing key %s for harvest %s", routing_key, harvest_id)
+            return u"harvest:{}".format(harvest_id)
+        return u"collection:{}".format(collection_id)
+
+    def collection_id(self, harvest_id):
+        """
+        Returns the id of a harvest's collection or None if the harvest is not found.
+        """
+        if harvest_id is None:
+            return None
+        collection_id = self._collection_ids.get(harvest_id)
+        if collection_id is None:
+            collection_id = Harvest.objects.filter(harvest_id=harvest_id).values_list(
+                "collection_id", flat=True).first()
+            if collection_id is not None:
+                self._cache(harvest_id, collection_id)
+        return collection_id
+
+    def _cache(self, harvest_id, collection_id):
+        self._collection_ids[harvest_id] = collection_id
+        if len(self._collection_ids) > self.cache_size:
+            self._collection_ids.popitem(last=False)
+
+
+class ConsumerWorker(threading.Thread):
+    """
+    Thread that applies the messages assigned to it, one at a time and in order.
+
+    Processed message objects are put on the done queue so that they can be
+    acknowledged by the thread that owns the channel.
+    """
+
+    def __init__(self, number, done_queue, queue=None):
+        super(ConsumerWorker, self).__init__(name="consumer-worker-{}".format(number))
+        self.daemon = True
+        self.number = number
+        self.done_queue = done_queue
+        self.queue = queue or Queue.Queue()
+        self.consumer = SfmUiConsumer()
+        # Throughput counters
+        self.processed = 0
+        self.failed = 0
+        self.busy_secs = 0.0
+        self.started = time.time()
+
+    def run(self):
+        try:
+            while True:
+                self.process(*self.queue.get())
+        finally:
+            db_connection.close()
+
+    def process(self, routing_key, message, message_obj):
+        start = time.time()
+        try:
+            self.consumer.routing_key = routing_key
+            self.consumer.message = message
+            self.consumer.on_message()
+            self.processed += 1
+        except Exception:
+            log.exception("Worker %s failed processing message with routing key %s", self.number, routing_key)
+            self.failed += 1
+        finally:
+            self.busy_secs += time.time() - start
+            self.done_queue.put(message_obj)
+
+    def stats(self):
+        """
+        Returns a dict of throughput counters for this worker.
+        """
+        elapsed_secs = time.time() - self.started
+        return {
+            "worker": self.number,
+            "processed": self.processed,
+            "failed": self.failed,
+            "queued": self.queue.qsize(),
+            "busy_secs": self.busy_secs,
+            "messages_per_sec": self.processed / elapsed_secs if elapsed_secs else 0.0
+        }
+
+
+class PooledSfmUiConsumer(SfmUiConsumer):
+    """
+    SFM UI Consumer that applies messages with a pool of worker threads.
+
+    Messages are assigned to workers by collection (or export for export
+    messages), so the messages for a single collection are applied in order
+    while messages for different collections are applied in parallel.
+
+    Workers that die are restarted. Throughput counters for each worker are
+    logged every stats_interval seconds.
+    """
+
+    def __init__(self, mq_config=None, workers=4, prefetch_per_worker=10, stats_interval=60):
+        super(PooledSfmUiConsumer, self).__init__(mq_config=mq_config)
+        self.prefetch_per_worker = prefetch_per_worker
+        self.stats_interval = stats_interval
+        self.done_queue = Queue.Queue()
+        self.workers = [ConsumerWorker(i, self.done_queue) for i in range(workers)]
+        self.shard_keys = ShardKeys()
+
+    def run(self):
+        for worker in self.workers:
+            worker.start()
+
+        with Connection(transport="librabbitmq",
+                        hostname=self.mq_config.host,
+                        userid=self.mq_config.username,
+                        password=self.mq_config.password) as connection:
+            channel = connection.channel()
+            exchange = Exchange(name=self.mq_config.exchange, type="topic", durable=True)
+            queues = []
+            for queue_name, routing_keys in self.mq_config.queues.items():
+                queue = MqQueue(queue_name, exchange=exchange, channel=channel, durable=True)
+                queue.declare()
+                for routing_key in routing_keys:
+                    queue.bind_to(exchange=exchange, routing_key=routing_key)
+                queues.append(queue)
+
+            with Consumer(channel, queues=queues, callbacks=[self.dispatch], no_ack=False) as consumer:
+                consumer.qos(prefetch_count=self.prefetch_per_worker * len(self.workers))
+                log.info("Consuming with %s workers", len(self.workers))
+                last_stats = time.time()
+                while True:
+                    try:
+                        connection.drain_events(timeout=0.1)
+                    except socket.timeout:
+                        pass
+                    self.ack_done()
+                    self.supervise()
+                    if time.time() - last_stats >= self.stats_interval:
+                        self.log_stats()
+                        last_stats = time.time()
+
+    def dispatch(self, message, message_obj):
+        routing_key = message_obj.delivery_info["routing_key"]
+        key = self.shard_keys.shard_key(routing_key, message)
+        self.workers[shard(key, len(self.workers))].queue.put((routing_key, message, message_obj))
+
+    def ack_done(self):
+        """
+        Acknowledges messages that the workers have finished processing.
+        """
+        while True:
+            try:
+                message_obj = self.done_queue.get_nowait()
+            except Queue.Empty:
+                return
+            message_obj.ack()
+
+    def supervise(self):
+        """
+        Restarts any workers that have died, keeping their queued messages.
+        """
+        for i, worker in enumerate(self.workers):
+            if not worker.is_alive():
+                log.error("Worker %s died. Restarting.", worker.number)
+                new_worker = ConsumerWorker(worker.number, self.done_queue, queue=worker.queue)
+                self.workers[i] = new_worker
+                new_worker.start()
+
+    def stats(self):
+        """
+        Returns a list of throughput counters, one dict per worker.
+        """
+        return [worker.stats() for worker in self.workers]
+
+    def log_stats(self):
+        for worker_stats in self.stats():
+            log.info("Worker %(worker)s: %(processed)s processed, %(failed)s failed, %(queued)s queued, "
+                     "%(busy_secs).1f secs busy, %(messages_per_sec).2f messages/sec", worker_stats)
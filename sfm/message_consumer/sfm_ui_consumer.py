@@ -1,11 +1,13 @@
 import logging
 from sfmutils.consumer import BaseConsumer
-from ui.models import Harvest, Collection, Seed, Warc, Export, HarvestStat
+from ui.models import Harvest, Collection, Seed, Warc, Export, HarvestStat, HarvestStatRollup
 from ui.jobs import collection_stop
+from ui.export import create_export_manifest
 import json
 from django.core.mail import send_mail
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.core.urlresolvers import reverse
 from django.contrib.sites.models import Site
 import iso8601
@@ -20,11 +22,13 @@ class SfmUiConsumer(BaseConsumer):
     Class for the SFM UI Consumer, which subscribes to
     messages from the queue and updates the models as appropriate.
     """
-    def on_message(self):
-        # This is the worst ever, but it avoids a race condition.
-        # It is possible for the harvester/exporter to respond before the commit occurs.
-        time.sleep(1)
+    # Seconds to wait between attempts to retrieve a model object that does not exist (yet).
+    retry_delays = (0.5, 1, 2, 4)
+    # List of emails (subject, message, recipients) to send after the current transaction is committed.
+    # None to send emails immediately.
+    queued_mails = None
 
+    def on_message(self):
         if self.routing_key.startswith("harvest.status."):
             self._on_harvest_status_message()
         elif self.routing_key == "warc_created":
@@ -36,11 +40,32 @@ class SfmUiConsumer(BaseConsumer):
         else:
             log.warn("Unexpected message with routing key %s: %s", self.routing_key, json.dumps(self.message, indent=4))
 
+    def _get_with_retry(self, model_class, **kwargs):
+        """
+        Retrieves a model object, retrying with backoff if it is not found.
+
+        Harvests and exports are committed before their start messages are sent, so
+        this should only be necessary in exceptional cases, e.g., a replica that is lagging.
+
+        :param model_class: the model class to retrieve the object for
+        :param kwargs: lookup parameters
+        :return: the model object
+        :raises ObjectDoesNotExist: if the model object is not found after all retries
+        """
+        for delay in self.retry_delays:
+            try:
+                return model_class.objects.get(**kwargs)
+            except ObjectDoesNotExist:
+                log.debug("%s model object not found for %s. Retrying in %s seconds.", model_class.__name__,
+                          kwargs, delay)
+                time.sleep(delay)
+        return model_class.objects.get(**kwargs)
+
     def _on_harvest_status_message(self):
         try:
             log.debug("Updating harvest with id %s", self.message["id"])
             # Retrieve harvest model object
-            harvest = Harvest.objects.get(harvest_id=self.message["id"])
+            harvest = self._get_with_retry(Harvest, harvest_id=self.message["id"])
 
         except ObjectDoesNotExist:
             log.error("Harvest model object not found for harvest status message: %s",
@@ -59,7 +84,9 @@ class SfmUiConsumer(BaseConsumer):
         harvest.date_started = iso8601.parse_date(self.message["date_started"])
         if "date_ended" in self.message:
             harvest.date_ended = iso8601.parse_date(self.message["date_ended"])
-        harvest.save()
+        with transaction.atomic():
+            harvest.save()
+            harvest.collection.update_harvest_state(harvest)
 
         # Update seeds based on tokens that have changed
         for seed_id, token in self.message.get("token_updates", {}).items():
@@ -89,17 +116,13 @@ class SfmUiConsumer(BaseConsumer):
 
         # Update stats
         if self.message["status"] != Harvest.FAILURE:
-            day_stats = self.message.get("stats", {})
-
-            for day_str, stat in day_stats.items():
+            counts = []
+            for day_str, stat in self.message.get("stats", {}).items():
                 day = iso8601.parse_date(day_str).date()
                 for item, count in stat.items():
-                    try:
-                        stat = harvest.harvest_stats.get(item=item, harvest_date=day)
-                        stat.count = count
-                        stat.save()
-                    except ObjectDoesNotExist:
-                        HarvestStat.objects.create(item=item, harvest=harvest, count=count, harvest_date=day)
+                    counts.append((day, item, count))
+            HarvestStat.objects.upsert(harvest, counts)
+            HarvestStatRollup.objects.refresh(harvest.collection, counts)
 
         # Turn off stream collections if they failed
         turned_collection_off = False
@@ -145,15 +168,31 @@ class SfmUiConsumer(BaseConsumer):
                     mail_message += self.format_messages_for_mail(harvest.warnings, "warning")
                     mail_message += self.format_messages_for_mail(harvest.errors, "error")
 
-                    try:
-                        log.debug("Sending email to %s: %s", receiver_emails, mail_subject)
-                        send_mail(mail_subject, mail_message, settings.EMAIL_HOST_USER,
-                                  receiver_emails, fail_silently=False)
-                    except SMTPException, ex:
-                        log.error("Error sending email: %s", ex)
+                    self._send_mail(mail_subject, mail_message, receiver_emails)
             else:
                 log.warn("No email addresses for %s", harvest.collection.collection_set.group)
 
+    def _send_mail(self, subject, message, recipients):
+        """
+        Sends an email or, if emails are being queued, queues it.
+        """
+        if self.queued_mails is not None:
+            self.queued_mails.append((subject, message, recipients))
+        else:
+            self.send_mails(((subject, message, recipients),))
+
+    @staticmethod
+    def send_mails(mails):
+        """
+        Sends a list of emails (subject, message, recipients).
+        """
+        for subject, message, recipients in mails:
+            try:
+                log.debug("Sending email to %s: %s", recipients, subject)
+                send_mail(subject, message, settings.EMAIL_HOST_USER, recipients, fail_silently=False)
+            except SMTPException, ex:
+                log.error("Error sending email: %s", ex)
+
     @staticmethod
     def format_messages_for_mail(messages, message_type):
         mail_message = ""
@@ -168,7 +207,7 @@ class SfmUiConsumer(BaseConsumer):
             log.debug("Warc with id %s", self.message["warc"]["id"])
             # Create warc model object
             warc = Warc.objects.create(
-                harvest=Harvest.objects.get(harvest_id=self.message["harvest"]["id"]),
+                harvest=self._get_with_retry(Harvest, harvest_id=self.message["harvest"]["id"]),
                 warc_id=self.message["warc"]["id"],
                 path=self.message["warc"]["path"],
                 sha1=self.message["warc"]["sha1"],
@@ -181,11 +220,33 @@ class SfmUiConsumer(BaseConsumer):
             log.error("Harvest model object not found for harvest status message: %s",
                       json.dumps(self.message, indent=4))
 
+    def _export_manifest(self, export):
+        """
+        Returns the manifest for a successful export.
+
+        The files listed in the export status message are used if the exporter provided them. Otherwise,
+        the manifest is created from the export directory without checksums, which are added by the scheduler.
+        """
+        if "files" in self.message:
+            return self.message["files"]
+        return self._create_export_manifest(export)
+
+    @staticmethod
+    def _create_export_manifest(export):
+        """
+        Returns a manifest created from the export directory or None if it cannot be created.
+        """
+        try:
+            return create_export_manifest(export.path)
+        except (IOError, OSError), ex:
+            log.error("Error creating manifest for export %s: %s", export.export_id, ex)
+            return None
+
     def _on_export_status_message(self):
         try:
             log.debug("Updating export with id %s", self.message["id"])
             # Retrieve export model object
-            export = Export.objects.get(export_id=self.message["id"])
+            export = self._get_with_retry(Export, export_id=self.message["id"])
             # And update export model object
             export.status = self.message["status"]
             export.infos = self.message.get("infos", [])
@@ -194,6 +255,10 @@ class SfmUiConsumer(BaseConsumer):
             export.date_started = iso8601.parse_date(self.message["date_started"])
             if "date_ended" in self.message:
                 export.date_ended = iso8601.parse_date(self.message["date_ended"])
+            if export.status == Export.SUCCESS:
+                export.manifest = self._export_manifest(export)
+                export.manifest_checksummed = export.manifest is not None and all(
+                    "sha1" in fileinfo for fileinfo in export.manifest)
             export.save()
 
             # Get reciever's email address
@@ -219,12 +284,7 @@ class SfmUiConsumer(BaseConsumer):
                     else:
                         log.debug("Unhandled export status: %s", export.status)
                     if mail_message:
-                        try:
-                            log.debug("Sending email to %s: %s", receiver_email, mail_subject)
-                            send_mail(mail_subject, mail_message, settings.EMAIL_HOST_USER,
-                                      [receiver_email], fail_silently=False)
-                        except SMTPException, ex:
-                            log.error("Error sending email: %s", ex)
+                        self._send_mail(mail_subject, mail_message, [receiver_email])
             else:
                 log.warn("No email address for %s", export.user)
 
@@ -235,12 +295,13 @@ class SfmUiConsumer(BaseConsumer):
     def _on_web_harvest_start_message(self):
         try:
             log.debug("Creating harvest for web harvest with id %s", self.message["id"])
-            parent_harvest = Harvest.objects.get(harvest_id=self.message["parent_id"])
-            harvest = Harvest.objects.create(harvest_type=self.message["type"],
-                                             harvest_id=self.message["id"],
-                                             parent_harvest=parent_harvest,
-                                             collection=parent_harvest.collection)
-            harvest.save()
+            parent_harvest = self._get_with_retry(Harvest, harvest_id=self.message["parent_id"])
+            with transaction.atomic():
+                harvest = Harvest.objects.create(harvest_type=self.message["type"],
+                                                 harvest_id=self.message["id"],
+                                                 parent_harvest=parent_harvest,
+                                                 collection=parent_harvest.collection)
+                harvest.collection.update_harvest_state(harvest, created=True)
         except ObjectDoesNotExist:
             log.error("Harvest model object not found for web harvest status message: %s",
                       json.dumps(self.message, indent=4))
@@ -0,0 +1,165 @@
+from django.test import TestCase, override_settings
+from django.conf import settings
+from django.db import transaction
+from ui.models import Harvest, Collection, Group, CollectionSet, Credential, User, Warc, Export
+import json
+import os
+import shutil
+from batch_consumer import BatchSfmUiConsumer
+from mock import MagicMock, patch
+
+
+def _warc_message(warc_id, harvest_id):
+    return {
+        "warc": {
+            "path": "/sfm-data/{}.warc.gz".format(warc_id),
+            "sha1": "7512e1c227c29332172118f0b79b2ca75cbe8979",
+            "bytes": 26146,
+            "id": warc_id,
+            "date_created": "2015-07-28T11:17:36.640178"
+        },
+        "collection_set": {
+            "id": "test_collection_set"
+        },
+        "harvest": {
+            "id": harvest_id,
+        }
+    }
+
+
+class BatchConsumerTest(TestCase):
+    def setUp(self):
+        group = Group.objects.create(name="test_group")
+        user = User.objects.create_superuser(username="test_user", email="test_user@test.com",
+                                             password="test_password")
+        collection_set = CollectionSet.objects.create(group=group, name="test_collection_set")
+        credential = Credential.objects.create(user=user, platform="test_platform",
+                                               token=json.dumps({}))
+        collection = Collection.objects.create(collection_set=collection_set, credential=credential,
+                                               harvest_type="test_type", name="test_collection",
+                                               harvest_options=json.dumps({}))
+        self.harvest = Harvest.objects.create(harvest_id="test:1", collection=collection)
+        self.export = Export.objects.create(export_id="test:2", user=user, export_type="test_type",
+                                            collection=collection)
+        self.consumer = BatchSfmUiConsumer(batch_size=10)
+
+    def tearDown(self):
+        if os.path.exists(settings.SFM_DATA_DIR):
+            shutil.rmtree(settings.SFM_DATA_DIR)
+
+    def _add_message(self, routing_key, message):
+        message_obj = MagicMock()
+        message_obj.delivery_info = {"routing_key": routing_key}
+        self.consumer._on_batch_message(message, message_obj)
+        return message_obj
+
+    def test_process_batch(self):
+        message_objs = [
+            # Warc for a web harvest that is started later in the batch
+            self._add_message("warc_created", _warc_message("warc1", "webtest:1")),
+            self._add_message("warc_created", _warc_message("warc2", "test:1")),
+            self._add_message("harvest.status.test.test_search", {
+                "id": "test:1",
+                "status": Harvest.RUNNING,
+                "date_started": "2015-07-28T11:17:36.640044"
+            }),
+            self._add_message("harvest.start.web", {
+                "id": "webtest:1",
+                "parent_id": "test:1",
+                "type": "web"
+            }),
+            # Duplicate
+            self._add_message("warc_created", _warc_message("warc2", "test:1")),
+        ]
+
+        self.consumer.process_batch()
+
+        self.assertEqual(Harvest.RUNNING, Harvest.objects.get(harvest_id="test:1").status)
+        self.assertEqual("webtest:1", Warc.objects.get(warc_id="warc1").harvest.harvest_id)
+        self.assertEqual(self.harvest, Warc.objects.get(warc_id="warc2").harvest)
+        for message_obj in message_objs:
+            message_obj.ack.assert_called_once_with()
+        self.assertEqual([], self.consumer._batch)
+
+    @patch("message_consumer.sfm_ui_consumer.time.sleep")
+    @patch("message_consumer.batch_consumer.Warc.objects.bulk_create")
+    def test_process_batch_failure(self, mock_bulk_create, mock_sleep):
+        mock_bulk_create.side_effect = Exception("Bad warc")
+        message_objs = [
+            self._add_message("harvest.status.test.test_search", {
+                "id": "test:1",
+                "status": Harvest.RUNNING,
+                "date_started": "2015-07-28T11:17:36.640044"
+            }),
+            self._add_message("warc_created", _warc_message("warc1", "test:1")),
+        ]
+
+        self.consumer.process_batch()
+
+        # Messages applied individually
+        self.assertEqual(Harvest.RUNNING, Harvest.objects.get(harvest_id="test:1").status)
+        self.assertTrue(Warc.objects.filter(warc_id="warc1").exists())
+        for message_obj in message_objs:
+            message_obj.ack.assert_called_once_with()
+
+    def test_process_batch_export(self):
+        os.makedirs(self.export.path)
+        with open(os.path.join(self.export.path, "test.csv"), "w") as f:
+            f.write("test")
+        message = {
+            "id": "test:2",
+            "status": Export.SUCCESS,
+            "date_started": "2015-07-28T11:17:36.640044"
+        }
+        self._add_message("export.status.test.test_type", message)
+
+        self.consumer.process_batch()
+
+        manifest = [{"filename": "test.csv", "bytes": 4,
+                     "mtime": os.path.getmtime(os.path.join(self.export.path, "test.csv"))}]
+        # Added to the message before the batch is applied
+        self.assertListEqual(manifest, message["files"])
+        export = Export.objects.get(export_id="test:2")
+        self.assertEqual(Export.SUCCESS, export.status)
+        self.assertListEqual(manifest, export.manifest)
+        # Checksums are added later.
+        self.assertFalse(export.manifest_checksummed)
+
+    @override_settings(PERFORM_EMAILS=True)
+    @patch("message_consumer.sfm_ui_consumer.send_mail")
+    @patch("message_consumer.batch_consumer.Warc.objects.bulk_create")
+    def test_process_batch_failure_email(self, mock_bulk_create, mock_send_mail):
+        mock_bulk_create.side_effect = Exception("Bad warc")
+        self._add_message("export.status.test.test_type", {
+            "id": "test:2",
+            "status": Export.FAILURE,
+            "date_started": "2015-07-28T11:17:36.640044"
+        })
+        self._add_message("warc_created", _warc_message("warc1", "test:1"))
+
+        self.consumer.process_batch()
+
+        # Email not sent for the batch that was rolled back.
+        self.assertEqual(1, mock_send_mail.call_count)
+        self.assertEqual("SFM Export failed", mock_send_mail.call_args[0][0])
+        self.assertIsNone(self.consumer.queued_mails)
+
+    @patch("message_consumer.batch_consumer.transaction.atomic")
+    @patch("message_consumer.sfm_ui_consumer.time.sleep")
+    def test_process_batch_missing_harvest(self, mock_sleep, mock_atomic):
+        calls = []
+        mock_sleep.side_effect = lambda delay: calls.append("sleep")
+
+        def atomic(*args, **kwargs):
+            calls.append("atomic")
+            return transaction.atomic(*args, **kwargs)
+        mock_atomic.side_effect = atomic
+        self._add_message("warc_created", _warc_message("warc1", "missing:1"))
+
+        self.consumer.process_batch()
+
+        # Waited before the transaction was opened and not within it.
+        self.assertEqual(["sleep", "sleep", "sleep", "sleep", "atomic"], calls[:5])
+        self.assertEqual(4, calls.count("sleep"))
+        self.assertFalse(Warc.objects.filter(warc_id="warc1").exists())
+        self.assertEqual((0.5, 1, 2, 4), self.consumer.retry_delays)
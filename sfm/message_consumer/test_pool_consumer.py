@@ -0,0 +1,83 @@
+from django.test import TestCase
+from ui.models import Harvest, Collection, Group, CollectionSet, Credential, User
+import json
+import Queue
+from pool_consumer import ConsumerWorker, PooledSfmUiConsumer, ShardKeys, shard
+from mock import MagicMock
+
+
+class PoolConsumerTest(TestCase):
+    def setUp(self):
+        group = Group.objects.create(name="test_group")
+        user = User.objects.create_superuser(username="test_user", email="test_user@test.com",
+                                             password="test_password")
+        collection_set = CollectionSet.objects.create(group=group, name="test_collection_set")
+        credential = Credential.objects.create(user=user, platform="test_platform",
+                                               token=json.dumps({}))
+        self.collection = Collection.objects.create(collection_set=collection_set, credential=credential,
+                                                    harvest_type="test_type", name="test_collection",
+                                                    harvest_options=json.dumps({}))
+        Harvest.objects.create(harvest_id="test:1", collection=self.collection)
+        Harvest.objects.create(harvest_id="test:2", collection=self.collection)
+
+    def test_shard_key(self):
+        shard_keys = ShardKeys()
+        key = u"collection:{}".format(self.collection.id)
+        # Messages for harvests of the same collection have the same key
+        self.assertEqual(key, shard_keys.shard_key("harvest.status.twitter.twitter_search", {"id": "test:1"}))
+        self.assertEqual(key, shard_keys.shard_key("warc_created", {"harvest": {"id": "test:1"}, "warc": {}}))
+        self.assertEqual(key, shard_keys.shard_key("harvest.status.twitter.twitter_search", {"id": "test:2"}))
+        # Including web harvests, which do not exist until the start message is applied
+        self.assertEqual(key, shard_keys.shard_key("harvest.start.web", {"id": "test:3", "parent_id": "test:1"}))
+        with self.assertNumQueries(0):
+            self.assertEqual(key, shard_keys.shard_key("harvest.status.web", {"id": "test:3"}))
+        self.assertEqual(u"export:test:4", shard_keys.shard_key("export.status.twitter", {"id": "test:4"}))
+        # Harvest not found
+        self.assertEqual(u"harvest:test:5", shard_keys.shard_key("harvest.status.twitter.twitter_search",
+                                                                 {"id": "test:5"}))
+        self.assertEqual(u"harvest:test:5", shard_keys.shard_key("warc_created", {"harvest": {"id": "test:5"}}))
+        self.assertEqual(u"harvest:test:5", shard_keys.shard_key("harvest.start.web",
+                                                                 {"id": "test:6", "parent_id": "test:5"}))
+
+    def test_shard(self):
+        worker = shard(u"collection:1", 4)
+        self.assertEqual(worker, shard("collection:1", 4))
+        self.assertTrue(0 <= worker < 4)
+
+    def test_dispatch(self):
+        consumer = PooledSfmUiConsumer(workers=3)
+        message_obj = MagicMock()
+        message_obj.delivery_info = {"routing_key": "warc_created"}
+        message = {"harvest": {"id": "test:1"}, "warc": {}}
+        consumer.dispatch(message, message_obj)
+
+        worker = consumer.workers[shard(u"collection:{}".format(self.collection.id), 3)]
+        self.assertEqual(("warc_created", message, message_obj), worker.queue.get_nowait())
+
+    def test_worker_process(self):
+        done_queue = Queue.Queue()
+        worker = ConsumerWorker(0, done_queue)
+        message_obj = MagicMock()
+        worker.process("harvest.status.test.test_search", {
+            "id": "test:1",
+            "status": Harvest.RUNNING,
+            "date_started": "2015-07-28T11:17:36.640044"
+        }, message_obj)
+
+        self.assertEqual(Harvest.RUNNING, Harvest.objects.get(harvest_id="test:1").status)
+        self.assertEqual(message_obj, done_queue.get_nowait())
+        stats = worker.stats()
+        self.assertEqual(1, stats["processed"])
+        self.assertEqual(0, stats["failed"])
+
+        # Failures are counted and the message is still done
+        worker.process("harvest.status.test.test_search", {"id": "test:1"}, message_obj)
+        self.assertEqual(message_obj, done_queue.get_nowait())
+        self.assertEqual(1, worker.stats()["failed"])
+
+    def test_ack_done(self):
+        consumer = PooledSfmUiConsumer(workers=2)
+        message_obj = MagicMock()
+        consumer.done_queue.put(message_obj)
+        consumer.ack_done()
+        message_obj.ack.assert_called_once_with()
@@ -1,5 +1,6 @@
 from django.test import TestCase
-from ui.models import Harvest, Collection, Group, CollectionSet, Credential, User, Seed, Warc, Export, HarvestStat
+from ui.models import Harvest, Collection, Group, CollectionSet, Credential, User, Seed, Warc, Export, HarvestStat, \
+    HarvestStatRollup
 import json
 from sfm_ui_consumer import SfmUiConsumer
 import iso8601
@@ -84,6 +85,9 @@ class ConsumerTest(TestCase):
         harvest = Harvest.objects.get(harvest_id="test:1")
         self.assertEqual(Harvest.RUNNING, harvest.status)
         self.assertEqual(12, harvest.harvest_stats.get(item="photos", harvest_date=date(2016, 5, 20)).count)
+        # Rollup includes stats from other harvests of the collection
+        self.assertEqual(15, HarvestStatRollup.objects.get(collection=harvest.collection, item="photos",
+                                                           harvest_date=date(2016, 5, 20)).count)
         self.assertDictEqual({
             "1": "j.littman"
         }, harvest.token_updates)
@@ -143,6 +147,7 @@ class ConsumerTest(TestCase):
         self.assertListEqual([{"code": "test_code_1", "message": "congratulations"}], harvest.infos)
         self.assertListEqual([{"code": "test_code_2", "message": "be careful"}], harvest.warnings)
         self.assertListEqual([{"code": "test_code_3", "message": "oops"}], harvest.errors)
+        self.assertEqual(iso8601.parse_date("2015-07-28T11:17:42.539470"), harvest.collection.last_success_date)
 
     @patch("message_consumer.sfm_ui_consumer.collection_stop")
     def test_harvest_status_stream_failed_on_message(self, mock_collection_stop):
@@ -169,7 +174,8 @@ class ConsumerTest(TestCase):
         # Trigger on_message and nothing happens
         self.consumer.on_message()
 
-    def test_on_message_ignores_unknown_harvest(self):
+    @patch("message_consumer.sfm_ui_consumer.time.sleep")
+    def test_on_message_ignores_unknown_harvest(self, mock_sleep):
         self.consumer.routing_key = "harvest.status.test.test_search"
         self.consumer.message = {
             "id": "xtest:1"
@@ -177,6 +183,27 @@ class ConsumerTest(TestCase):
         # Trigger on_message and nothing happens
         self.consumer.on_message()
 
+        # Retried with backoff before giving up
+        self.assertEqual([((0.5,),), ((1,),), ((2,),), ((4,),)], mock_sleep.call_args_list)
+
+    @patch("message_consumer.sfm_ui_consumer.time.sleep")
+    def test_on_message_retries_missing_harvest(self, mock_sleep):
+        def create_harvest(_):
+            Harvest.objects.create(harvest_id="test:4", collection=self.harvest.collection)
+
+        mock_sleep.side_effect = create_harvest
+
+        self.consumer.routing_key = "harvest.start.web"
+        self.consumer.message = {
+            "id": "webtest:2",
+            "parent_id": "test:4",
+            "type": "web"
+        }
+        self.consumer.on_message()
+
+        mock_sleep.assert_called_once_with(0.5)
+        self.assertEqual("test:4", Harvest.objects.get(harvest_id="webtest:2").parent_harvest.harvest_id)
+
     def test_warc_created_on_message(self):
         self.consumer.routing_key = "warc_created"
         self.consumer.message = {
@@ -230,6 +257,26 @@ class ConsumerTest(TestCase):
         self.assertListEqual([{"code": "test_code_1", "message": "congratulations"}], export.infos)
         self.assertListEqual([{"code": "test_code_2", "message": "be careful"}], export.warnings)
         self.assertListEqual([{"code": "test_code_3", "message": "oops"}], export.errors)
+        # No export directory
+        self.assertIsNone(export.manifest)
+
+    def test_export_status_on_message_files(self):
+        files = [{"filename": "test.csv", "bytes": 4, "sha1": "a94a8fe5ccb19ba61c4c0873d391e987982fbbd3"}]
+        self.consumer.routing_key = "export.status.test"
+        self.consumer.message = {
+            "id": "test:2",
+            "status": "completed success",
+            "date_started": "2015-07-28T11:17:36.640044",
+            "date_ended": "2015-07-28T11:17:42.539470",
+            "files": files
+        }
+
+        # Trigger on_message
+        self.consumer.on_message()
+
+        export = Export.objects.get(export_id="test:2")
+        self.assertListEqual(files, export.manifest)
+        self.assertTrue(export.manifest_checksummed)
 
     def test_web_harvest_start_on_message(self):
         self.consumer.routing_key = "harvest.start.web"
@@ -255,3 +302,4 @@ class ConsumerTest(TestCase):
         self.assertEqual("web", harvest.harvest_type)
         self.assertEqual(self.harvest, harvest.parent_harvest)
         self.assertEqual(harvest.status, "requested")
+        self.assertEqual(1, Collection.objects.get(pk=self.harvest.collection.pk).harvest_count)
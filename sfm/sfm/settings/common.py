@@ -150,17 +150,52 @@ SOCIALACCOUNT_ADAPTER = "ui.auth.SocialAccountAdapter"
 RABBITMQ_HOST = env.get('SFM_RABBITMQ_HOST')
 RABBITMQ_USER = env.get('SFM_RABBITMQ_USER')
 RABBITMQ_PASSWORD = env.get('SFM_RABBITMQ_PASSWORD')
+# Maximum number of connections used for publishing messages.
+RABBITMQ_POOL_LIMIT = int(env.get('SFM_RABBITMQ_POOL_LIMIT', '10'))
+# Whether to wait for RabbitMQ to confirm that published messages have been received.
+RABBITMQ_CONFIRM_PUBLISH = env.get('SFM_RABBITMQ_CONFIRM_PUBLISH', 'False') == 'True'
+
+# Outbox of messages to be published, e.g., harvest and export start messages. Messages are
+# relayed after they are committed and by the scheduler every OUTBOX_RELAY_SECONDS. The scheduler
+# only runs where SFM_RUN_SCHEDULER is True, so it must be set for exactly one SFM UI process.
+OUTBOX_RELAY_SECONDS = int(env.get('SFM_OUTBOX_RELAY_SECONDS', '2'))
+OUTBOX_RELAY_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 10
+# A relay's claim on messages that it is sending expires after this many seconds.
+OUTBOX_CLAIM_SECONDS = 300
 
 # crispy forms bootstrap version
 CRISPY_TEMPLATE_PACK = 'bootstrap3'
 
+# Seconds that the changed fields of historical objects are cached for.
+DIFF_CACHE_SECS = int(env.get('SFM_DIFF_CACHE_SECS', '86400'))
+
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ('rest_framework.filters.DjangoFilterBackend',)
+    'DEFAULT_FILTER_BACKENDS': ('rest_framework.filters.DjangoFilterBackend',),
+    # v2 differs from v1 in that lists of warcs are always paginated.
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ('v1', 'v2')
 }
 
 # Directory where SFM data (e.g., harvested WARCs) is stored.
 SFM_DATA_DIR = env.get("SFM_DATA_DIR", "/sfm-data")
 
+# How export files are downloaded: file (sent by Django), x-accel-redirect (sent by nginx)
+# or x-sendfile (sent by Apache with mod_xsendfile).
+EXPORT_DOWNLOAD_BACKEND = env.get('SFM_EXPORT_DOWNLOAD_BACKEND', 'file')
+# For x-accel-redirect, the internal nginx location that is an alias for SFM_DATA_DIR.
+EXPORT_DOWNLOAD_ACCEL_PREFIX = env.get('SFM_EXPORT_DOWNLOAD_ACCEL_PREFIX', '/sfm-data-internal/')
+
+# How often the scheduler adds checksums to the manifests of export files.
+EXPORT_CHECKSUM_SECONDS = int(env.get('SFM_EXPORT_CHECKSUM_SECONDS', '60'))
+
+# How often the scheduler runs requested seed imports.
+SEED_IMPORT_SECONDS = int(env.get('SFM_SEED_IMPORT_SECONDS', '30'))
+
+# Running seed imports that have not made progress in this many seconds are assumed to have been
+# interrupted, e.g., by a restart of the scheduler, and are marked as failed.
+SEED_IMPORT_STALE_SECS = int(env.get('SFM_SEED_IMPORT_STALE_SECS', '600'))
+
 # Whether to register receivers on Collection for scheduling harvests.
 SCHEDULE_HARVESTS = True
 
@@ -186,3 +221,5 @@ RUN_SCHEDULER = env.get('SFM_RUN_SCHEDULER', 'False') == 'True'
 PERFORM_USER_HARVEST_EMAILS = env.get('SFM_PERFORM_USER_HARVEST_EMAILS', 'True') == 'True'
 USER_HARVEST_EMAILS_HOUR = env.get('SFM_USER_HARVEST_EMAILS_HOUR', '1')
 USER_HARVEST_EMAILS_MINUTE = env.get('SFM_USER_HARVEST_EMAILS_MINUTE', '0')
+# Number of threads, each with its own connection to the mail server, used to send user harvest emails.
+USER_HARVEST_EMAILS_THREADS = int(env.get('SFM_USER_HARVEST_EMAILS_THREADS', '4'))
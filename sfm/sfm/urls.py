@@ -9,5 +9,5 @@ urlpatterns = [
     url(r"^accounts/password/reset/done/$", password_reset_done, name="account_reset_password_done"),
     url(r'^accounts/', include('allauth.urls')),
     url(r'^ui/', include('ui.urls')),
-    url(r'^api/v1/', include('api.urls')),
+    url(r'^api/(?P<version>v1|v2)/', include('api.urls')),
 ]
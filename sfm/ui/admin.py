@@ -151,6 +151,17 @@ class HarvestStat(a.ModelAdmin):
     search_fields = []
 
 
+class HarvestStatRollup(a.ModelAdmin):
+    fields = (
+        'collection_set', 'collection', 'harvest_date', 'item', 'count'
+    )
+    list_display = (
+        'collection_set', 'collection', 'harvest_date', 'item', 'count'
+    )
+    list_filter = ['harvest_date', 'item']
+    search_fields = []
+
+
 class Warc(a.ModelAdmin):
     fields = (
        'warc_id', 'harvest', 'path', 'sha1', 'bytes', 'date_created')
@@ -169,6 +180,23 @@ class Export(a.ModelAdmin):
     list_filter = ['date_requested', 'user', 'export_type', 'status']
     search_fields = ['id', 'export_id', 'path']
 
+
+class SeedImport(a.ModelAdmin):
+    fields = (
+        'seed_import_id', 'collection', 'user', 'seeds_type', 'history_note', 'path', 'status', 'lines_processed',
+        'seeds_added', 'date_requested', 'date_started', 'date_ended', 'errors')
+    list_display = ['id', 'collection', 'user', 'date_requested', 'status']
+    list_filter = ['date_requested', 'user', 'status']
+    search_fields = ['id', 'seed_import_id']
+
+
+class OutboxMessage(a.ModelAdmin):
+    fields = (
+        'routing_key', 'message', 'date_added', 'attempts', 'last_error')
+    list_display = ['id', 'routing_key', 'date_added', 'attempts']
+    list_filter = ['routing_key', 'date_added']
+    search_fields = ['id', 'routing_key']
+
 a.site.register(m.Credential, Credential)
 a.site.register(m.HistoricalCredential, HistoricalCredential)
 a.site.register(m.CollectionSet, CollectionSet)
@@ -179,5 +207,8 @@ a.site.register(m.Seed, Seed)
 a.site.register(m.HistoricalSeed, HistoricalSeed)
 a.site.register(m.Harvest, Harvest)
 a.site.register(m.HarvestStat, HarvestStat)
+a.site.register(m.HarvestStatRollup, HarvestStatRollup)
 a.site.register(m.Warc, Warc)
 a.site.register(m.Export, Export)
+a.site.register(m.SeedImport, SeedImport)
+a.site.register(m.OutboxMessage, OutboxMessage)
@@ -1,6 +1,6 @@
 from django.apps import AppConfig
 from rabbit import RabbitWorker
-from django.db.models.signals import post_save, pre_delete, m2m_changed
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.conf import settings
 import logging
 
@@ -13,16 +13,21 @@ class UIConfig(AppConfig):
 
     def ready(self):
         RabbitWorker().declare_exchange()
-        from models import Collection, Export
+        from models import Collection, Export, Harvest, harvest_delete_receiver
         from sched import start_sched, schedule_harvest_receiver, unschedule_harvest_receiver
-        from export import export_receiver, export_m2m_receiver
+        from export import export_receiver, export_m2m_receiver, checksum_export_manifests
         from notifications import send_user_harvest_emails
+        from outbox import relay_messages
+        from seeds import run_seed_imports, SEED_IMPORT_JOB_ID
 
         if settings.SCHEDULE_HARVESTS:
             log.debug("Setting receivers for collections.")
             post_save.connect(schedule_harvest_receiver, sender=Collection)
             pre_delete.connect(unschedule_harvest_receiver, sender=Collection)
 
+        # Harvest state of collections
+        post_delete.connect(harvest_delete_receiver, sender=Harvest)
+
         # Export
         if settings.PERFORM_EXPORTS:
             log.debug("Setting receiver for exports.")
@@ -42,6 +47,15 @@ class UIConfig(AppConfig):
                     sched.remove_job('user_harvest_emails')
                 sched.add_job(send_user_harvest_emails, 'cron', hour=settings.USER_HARVEST_EMAILS_HOUR,
                               minute=settings.USER_HARVEST_EMAILS_MINUTE, id='user_harvest_emails')
+            # Frequent, so kept in memory rather than updating the job store on every run.
+            if sched.get_job('outbox_relay', jobstore='default') is not None:
+                sched.remove_job('outbox_relay', jobstore='default')
+            sched.add_job(relay_messages, 'interval', seconds=settings.OUTBOX_RELAY_SECONDS, id='outbox_relay',
+                          coalesce=True, max_instances=1, jobstore='memory')
+            sched.add_job(checksum_export_manifests, 'interval', seconds=settings.EXPORT_CHECKSUM_SECONDS,
+                          id='export_checksum', coalesce=True, max_instances=1, jobstore='memory')
+            sched.add_job(run_seed_imports, 'interval', seconds=settings.SEED_IMPORT_SECONDS,
+                          id=SEED_IMPORT_JOB_ID, coalesce=True, max_instances=1, jobstore='memory')
 
         else:
             log.debug("Not running scheduler")
@@ -0,0 +1,239 @@
+import logging
+import mimetypes
+import os
+import re
+import urllib
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, FileResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+log = logging.getLogger(__name__)
+
+FILE = "file"
+X_ACCEL_REDIRECT = "x-accel-redirect"
+X_SENDFILE = "x-sendfile"
+
+CHUNK_SIZE = 32768
+
+RANGE_SPEC_RE = re.compile(r"^(\d*)-(\d*)$")
+# Requests for more ranges than this get the whole file.
+MAX_RANGES = 20
+
+
+def download_response(request, filepath, filename):
+    """
+    Returns a response that downloads a file, using the configured download backend.
+
+    Conditional requests (If-None-Match and If-Modified-Since) are answered with
+    a 304 response for all backends.
+
+    Authorization must be performed before calling.
+    """
+    stat = os.stat(filepath)
+    etag = file_etag(stat)
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        backend = DOWNLOAD_BACKENDS.get(settings.EXPORT_DOWNLOAD_BACKEND)
+        if backend is None:
+            log.warn("Unknown download backend %s. Using %s.", settings.EXPORT_DOWNLOAD_BACKEND, FILE)
+            backend = file_response
+        response = backend(request, filepath)
+        response["Content-Disposition"] = "attachment; filename=%s" % filename
+    response["ETag"] = quote_etag(etag)
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    return response
+
+
+def file_etag(stat):
+    """
+    Returns an (unquoted) ETag for a file based on its modification time and size.
+    """
+    return "{:x}-{:x}".format(int(stat.st_mtime), stat.st_size)
+
+
+def not_modified(request, etag, mtime):
+    """
+    Returns True if a conditional request can be answered with a 304.
+
+    If-None-Match takes precedence over If-Modified-Since.
+    """
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return "*" in etags or etag in etags
+    if_modified_since = request.META.get("HTTP_IF_MODIFIED_SINCE")
+    if if_modified_since:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        return if_modified_since is not None and int(mtime) <= if_modified_since
+    return False
+
+
+def x_accel_redirect_response(request, filepath):
+    """
+    Returns a response that has nginx send the file.
+
+    nginx handles range requests.
+    """
+    response = HttpResponse(content_type=_content_type(filepath))
+    relpath = os.path.relpath(filepath, settings.SFM_DATA_DIR)
+    response["X-Accel-Redirect"] = urllib.quote(
+        u"{}/{}".format(settings.EXPORT_DOWNLOAD_ACCEL_PREFIX.rstrip("/"), relpath).encode("utf-8"))
+    return response
+
+
+def x_sendfile_response(request, filepath):
+    """
+    Returns a response that has Apache (mod_xsendfile) send the file.
+
+    Apache handles range requests.
+    """
+    response = HttpResponse(content_type=_content_type(filepath))
+    response["X-Sendfile"] = filepath
+    return response
+
+
+def file_response(request, filepath):
+    """
+    Returns a response that sends the file from Django.
+
+    A whole file is sent with a FileResponse, which the WSGI server's file wrapper
+    can send without copying through Python. Single and multiple byte ranges are
+    supported so that downloads can be resumed or parallelized.
+    """
+    stat = os.stat(filepath)
+    size = stat.st_size
+    content_type = _content_type(filepath)
+    byte_ranges = None
+    if _if_range_matches(request, file_etag(stat), stat.st_mtime):
+        byte_ranges = parse_ranges(request.META.get("HTTP_RANGE"), size)
+    if byte_ranges is None:
+        response = FileResponse(open(filepath, "rb"), content_type=content_type)
+        response["Content-Length"] = size
+    elif not byte_ranges:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = "bytes */{}".format(size)
+    elif len(byte_ranges) == 1:
+        start, end = byte_ranges[0]
+        response = StreamingHttpResponse(_read_range(filepath, start, end), status=206, content_type=content_type)
+        response["Content-Range"] = "bytes {}-{}/{}".format(start, end, size)
+        response["Content-Length"] = end - start + 1
+    else:
+        boundary = uuid.uuid4().hex
+        parts = []
+        length = len(_multipart_end(boundary))
+        for start, end in byte_ranges:
+            part_header = _multipart_header(boundary, content_type, start, end, size)
+            parts.append((part_header, start, end))
+            length += len(part_header) + end - start + 1
+        response = StreamingHttpResponse(_read_multipart(filepath, boundary, parts), status=206,
+                                         content_type="multipart/byteranges; boundary={}".format(boundary))
+        response["Content-Length"] = length
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def parse_ranges(range_header, size):
+    """
+    Parses a Range header for one or more byte ranges.
+
+    :return: None if no or an unsupported range header (so the whole file should be sent),
+    an empty list if no range is satisfiable, otherwise a list of (start, end) tuples of
+    inclusive positions.
+    """
+    if not range_header:
+        return None
+    range_header = range_header.strip()
+    if not range_header.startswith("bytes="):
+        return None
+    byte_ranges = []
+    range_specs = range_header[len("bytes="):].split(",")
+    if len(range_specs) > MAX_RANGES:
+        return None
+    for range_spec in range_specs:
+        match = RANGE_SPEC_RE.match(range_spec.strip())
+        if not match or match.groups() == ("", ""):
+            return None
+        start_str, end_str = match.groups()
+        if not start_str:
+            # Suffix range, i.e., the last bytes
+            suffix_length = int(end_str)
+            if suffix_length and size:
+                byte_ranges.append((max(size - suffix_length, 0), size - 1))
+            continue
+        start = int(start_str)
+        if end_str:
+            end = int(end_str)
+            if end < start:
+                return None
+        else:
+            end = size - 1
+        # A range that starts past the end of the file is unsatisfiable.
+        if start < size:
+            byte_ranges.append((start, min(end, size - 1)))
+    return byte_ranges
+
+
+def _if_range_matches(request, etag, mtime):
+    """
+    Returns True if there is no If-Range header or it matches the file, i.e., ranges can be sent.
+    """
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(("\"", "W/")):
+        return if_range == quote_etag(etag)
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and int(mtime) <= if_range_date
+
+
+def _multipart_header(boundary, content_type, start, end, size):
+    return "\r\n--{}\r\nContent-Type: {}\r\nContent-Range: bytes {}-{}/{}\r\n\r\n".format(
+        boundary, content_type, start, end, size).encode("ascii")
+
+
+def _multipart_end(boundary):
+    return "\r\n--{}--\r\n".format(boundary).encode("ascii")
+
+
+def _read_range(filepath, start, end):
+    file_obj = open(filepath, "rb")
+    file_obj.seek(start)
+    return read_file_chunkwise(file_obj, end - start + 1)
+
+
+def _read_multipart(filepath, boundary, parts):
+    for part_header, start, end in parts:
+        yield part_header
+        for data in _read_range(filepath, start, end):
+            yield data
+    yield _multipart_end(boundary)
+
+
+def read_file_chunkwise(file_obj, length=None):
+    """
+    Reads file in 32Kb chunks, optionally stopping after length bytes.
+    """
+    try:
+        while length is None or length > 0:
+            data = file_obj.read(CHUNK_SIZE if length is None else min(CHUNK_SIZE, length))
+            if not data:
+                break
+            if length is not None:
+                length -= len(data)
+            yield data
+    finally:
+        file_obj.close()
+
+
+def _content_type(filepath):
+    return mimetypes.guess_type(filepath)[0] or "application/octet-stream"
+
+
+DOWNLOAD_BACKENDS = {
+    FILE: file_response,
+    X_ACCEL_REDIRECT: x_accel_redirect_response,
+    X_SENDFILE: x_sendfile_response
+}
@@ -1,8 +1,19 @@
-from .rabbit import RabbitWorker
+from .outbox import queue_message, request_relay
+import hashlib
 import logging
+import os
 from django.utils import timezone
+from django.db import transaction
 from .models import Export
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
 log = logging.getLogger(__name__)
 
 
@@ -69,12 +80,117 @@ def request_export(export):
 
     routing_key = "export.start.{}.{}".format(platform, export.export_type)
 
-    log.debug("Sending %s message to %s with id %s", export.export_type, routing_key, export.export_id)
-
-    # Publish message to queue via rabbit worker
-    RabbitWorker().send_message(message, routing_key)
-
-    # Update date requested
-    export.date_requested = timezone.now()
-    export.status = Export.REQUESTED
-    export.save()
+    log.debug("Queueing %s message to %s with id %s", export.export_type, routing_key, export.export_id)
+
+    with transaction.atomic():
+        # Queue message. It is published after the export has been committed.
+        queue_message(message, routing_key)
+
+        # Update date requested
+        export.date_requested = timezone.now()
+        export.status = Export.REQUESTED
+        export.save()
+    request_relay()
+
+
+def export_fileinfos(export):
+    """
+    Returns list of file names, bytes for an export.
+
+    Read from the export's manifest if it has one, otherwise from the export directory.
+    """
+    if export.manifest is not None:
+        return [(fileinfo["filename"], fileinfo["bytes"]) for fileinfo in export.manifest]
+    return scan_export_files(export.path)
+
+
+def scan_export_files(path):
+    """
+    Returns sorted list of file names, bytes within directory.
+    """
+    return [(filename, stat.st_size) for filename, stat in _scan_files(path)]
+
+
+def _scan_files(path):
+    """
+    Returns sorted list of file names, stats within directory.
+    """
+    filestats = []
+    if not os.path.exists(path):
+        return filestats
+    if scandir is not None:
+        for entry in scandir(path):
+            if entry.is_file():
+                filestats.append((entry.name, entry.stat()))
+    else:
+        for filename in os.listdir(path):
+            filepath = os.path.join(path, filename)
+            if os.path.isfile(filepath):
+                filestats.append((filename, os.stat(filepath)))
+    return sorted(filestats, key=lambda filestat: filestat[0])
+
+
+def create_export_manifest(path):
+    """
+    Returns a manifest of the files within an export directory.
+
+    The files are not read, so the manifest does not have checksums. They are
+    added by checksum_export_manifests().
+
+    :return: list of dicts of filename, bytes and mtime or None if the export directory does not exist
+    """
+    if not os.path.exists(path):
+        return None
+    manifest = []
+    for filename, stat in _scan_files(path):
+        manifest.append({
+            "filename": filename,
+            "bytes": stat.st_size,
+            "mtime": stat.st_mtime
+        })
+    return manifest
+
+
+def checksum_export_manifests(limit=10):
+    """
+    Adds sha1 checksums to the manifests of successful exports that do not have them.
+
+    Run by the scheduler, so that the consumer does not read every export file.
+    A file that has changed since the manifest was created is not checksummed.
+
+    :param limit: maximum number of exports to checksum
+    :return: the number of exports checksummed
+    """
+    exports = Export.objects.filter(status=Export.SUCCESS, manifest__isnull=False,
+                                    manifest_checksummed=False).order_by("id")[:limit]
+    count = 0
+    for export in exports:
+        manifest = [dict(fileinfo) for fileinfo in export.manifest]
+        for fileinfo in manifest:
+            if "sha1" in fileinfo:
+                continue
+            filepath = os.path.join(export.path, fileinfo["filename"])
+            try:
+                stat = os.stat(filepath)
+                if stat.st_size == fileinfo["bytes"] and stat.st_mtime == fileinfo.get("mtime"):
+                    fileinfo["sha1"] = _sha1(filepath)
+                else:
+                    log.warn("Not checksumming %s since it has changed", filepath)
+            except (IOError, OSError), ex:
+                log.error("Error checksumming %s: %s", filepath, ex)
+        export.manifest = manifest
+        export.manifest_checksummed = True
+        export.save(update_fields=["manifest", "manifest_checksummed"])
+        count += 1
+    return count
+
+
+def _sha1(filepath):
+    sha1 = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        while True:
+            data = f.read(65536)
+            if not data:
+                break
+            sha1.update(data)
+    return sha1.hexdigest()
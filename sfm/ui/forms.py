@@ -11,6 +11,7 @@ from crispy_forms.bootstrap import FormActions
 from datetimewidget.widgets import DateTimeWidget
 from .models import CollectionSet, Collection, Seed, Credential, Export, User
 from .utils import clean_token, clean_blogname
+from .seeds import validate_seed_token
 
 import json
 import logging
@@ -575,8 +576,11 @@ class SeedTumblrBlogPostsForm(BaseSeedForm):
 class BaseBulkSeedForm(forms.Form):
     TYPES = (('token', 'Username'), ('uid', 'NSID'))
     seeds_type = forms.ChoiceField(required=True, choices=TYPES, widget=forms.RadioSelect)
-    tokens = forms.CharField(required=True, widget=forms.Textarea(attrs={'rows': 20}),
+    tokens = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 20}),
                              help_text="Enter each seed on a separate line.", label="Bulk Seeds")
+    tokens_file = forms.FileField(required=False, label="Or upload a file of seeds",
+                                  help_text="A text file with each seed on a separate line. Large files are added in "
+                                            "the background.")
     history_note = forms.CharField(label=HISTORY_NOTE_LABEL, widget=HISTORY_NOTE_WIDGET, help_text=HISTORY_NOTE_HELP,
                                    required=False)
 
@@ -591,6 +595,7 @@ class BaseBulkSeedForm(forms.Form):
                 '',
                 'seeds_type',
                 'tokens',
+                'tokens_file',
                 'history_note'
             ),
             FormActions(
@@ -600,6 +605,12 @@ class BaseBulkSeedForm(forms.Form):
             )
         )
 
+    def clean(self):
+        cleaned_data = super(BaseBulkSeedForm, self).clean()
+        if not cleaned_data.get("tokens") and not cleaned_data.get("tokens_file"):
+            raise ValidationError("Enter seeds or upload a file of seeds.")
+        return cleaned_data
+
 
 class BulkSeedTwitterUserTimelineForm(BaseBulkSeedForm):
     def __init__(self, *args, **kwargs):
@@ -609,20 +620,18 @@ class BulkSeedTwitterUserTimelineForm(BaseBulkSeedForm):
     def clean_tokens(self):
         seed_type = self.cleaned_data.get("seeds_type")
         tokens = self.cleaned_data.get("tokens")
-        splittoken = ''.join(tokens).splitlines()
-        numtoken, strtoken = [], []
-        for t in splittoken:
-            clean_t = clean_token(t)
-            if clean_t and clean_t.isdigit():
-                numtoken.append(clean_t)
-            elif clean_t and not clean_t.isdigit():
-                strtoken.append(clean_t)
-        if seed_type == 'token' and numtoken:
+        invalid_tokens = []
+        for line in tokens.splitlines():
+            clean_t = clean_token(line)
+            if validate_seed_token(Collection.TWITTER_USER_TIMELINE, seed_type, clean_t):
+                invalid_tokens.append(clean_t)
+        if seed_type == 'token' and invalid_tokens:
             raise ValidationError(
-                'Screen names may not be numeric. Please correct the following seeds: ' + ', '.join(numtoken) + '.')
-        elif seed_type == 'uid' and strtoken:
+                'Screen names may not be numeric. Please correct the following seeds: ' + ', '.join(
+                    invalid_tokens) + '.')
+        elif seed_type == 'uid' and invalid_tokens:
             raise ValidationError(
-                'UIDs must be numeric. Please correct the following seeds: ' + ', '.join(strtoken) + '.')
+                'UIDs must be numeric. Please correct the following seeds: ' + ', '.join(invalid_tokens) + '.')
         return tokens
 
 
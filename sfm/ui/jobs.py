@@ -1,7 +1,7 @@
 import json
 import logging
 
-from .rabbit import RabbitWorker
+from .outbox import queue_message, request_relay
 from .models import Collection, Harvest, default_uuid
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
@@ -10,8 +10,19 @@ from django.db import transaction
 log = logging.getLogger(__name__)
 
 
-@transaction.atomic
 def collection_harvest(collection_pk):
+    _collection_harvest(collection_pk)
+    # Send the queued message now rather than waiting for the scheduled relay.
+    request_relay()
+
+
+def collection_stop(collection_id):
+    _collection_stop(collection_id)
+    request_relay()
+
+
+@transaction.atomic
+def _collection_harvest(collection_pk):
 
     message = {
         "collection_set": {},
@@ -83,12 +94,6 @@ def collection_harvest(collection_pk):
     routing_key = "harvest.start.{}.{}".format(historical_credential.platform,
                                                harvest_type)
 
-    log.debug("Sending %s message to %s with id %s", harvest_type,
-              routing_key, harvest_id)
-
-    # Publish message to queue via rabbit worker
-    RabbitWorker().send_message(message, routing_key)
-
     # Record harvest model instance
     harvest = Harvest.objects.create(harvest_type=harvest_type,
                                      harvest_id=harvest_id,
@@ -96,18 +101,25 @@ def collection_harvest(collection_pk):
                                      historical_collection=historical_collection,
                                      historical_credential=historical_credential)
     harvest.historical_seeds.add(*historical_seeds)
+    collection.update_harvest_state(harvest, created=True)
+
+    log.debug("Queueing %s message to %s with id %s", harvest_type,
+              routing_key, harvest_id)
+
+    # Queue message. It is published after the harvest has been committed.
+    queue_message(message, routing_key)
 
 
 @transaction.atomic
-def collection_stop(collection_id):
+def _collection_stop(collection_id):
 
     # Retrieve collection
     try:
-        collection = Collection.objects.get(id=collection_id)
+        collection = Collection.objects.select_related("latest_harvest").get(id=collection_id)
     except ObjectDoesNotExist:
         log.error("Stopping harvest of %s failed because collection does not exist", collection_id)
         return
-    harvest = collection.last_harvest()
+    harvest = collection.latest_harvest
     assert collection.is_streaming()
     if harvest is None or harvest.status not in (Harvest.REQUESTED, Harvest.RUNNING, Harvest.FAILURE):
         log.debug("Ignoring stop harvest of collection since %s does not have a running harvest.")
@@ -119,12 +131,13 @@ def collection_stop(collection_id):
 
     routing_key = "harvest.stop.{}.{}".format(harvest.historical_credential.platform, harvest.harvest_type)
 
-    log.debug("Sending %s stop message to %s with id %s", harvest.harvest_type, routing_key, harvest.harvest_id)
+    log.debug("Queueing %s stop message to %s with id %s", harvest.harvest_type, routing_key, harvest.harvest_id)
 
-    # Publish message to queue via rabbit worker
-    RabbitWorker().send_message(message, routing_key)
+    # Queue message. It is published after the harvest has been committed.
+    queue_message(message, routing_key)
 
     # Update harvest model instance
     if harvest.status in (Harvest.REQUESTED, Harvest.RUNNING):
         harvest.status = Harvest.STOP_REQUESTED
-        harvest.save()
\ No newline at end of file
+        harvest.save()
+        collection.update_harvest_state(harvest)
@@ -0,0 +1,25 @@
+from __future__ import absolute_import
+from django.core.management.base import BaseCommand, CommandError
+from ui.models import CollectionSet, Collection
+
+
+class Command(BaseCommand):
+    help = 'Recalculates the last harvest, harvest count and last success date of collections from their harvests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--collection-set", help="Limit to collection set with this collection set id.")
+
+    def handle(self, *args, **options):
+        collections = Collection.objects.all()
+        if options["collection_set"]:
+            try:
+                collection_set = CollectionSet.objects.get(collection_set_id=options["collection_set"])
+            except CollectionSet.DoesNotExist:
+                raise CommandError("Collection set {} does not exist.".format(options["collection_set"]))
+            collections = collections.filter(collection_set=collection_set)
+
+        count = 0
+        for collection in collections.iterator():
+            collection.refresh_harvest_state()
+            count += 1
+        self.stdout.write("Harvest state of {} collections backfilled".format(count))
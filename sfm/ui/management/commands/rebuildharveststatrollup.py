@@ -0,0 +1,21 @@
+from __future__ import absolute_import
+from django.core.management.base import BaseCommand, CommandError
+from ui.models import CollectionSet, HarvestStatRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the rollup of harvest stats used for the stats charts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--collection-set", help="Limit to collection set with this collection set id.")
+
+    def handle(self, *args, **options):
+        collection_set = None
+        if options["collection_set"]:
+            try:
+                collection_set = CollectionSet.objects.get(collection_set_id=options["collection_set"])
+            except CollectionSet.DoesNotExist:
+                raise CommandError("Collection set {} does not exist.".format(options["collection_set"]))
+
+        HarvestStatRollup.objects.rebuild(collection_set=collection_set)
+        self.stdout.write("Harvest stat rollup rebuilt")
@@ -17,5 +17,7 @@ class Command(BaseCommand):
         users = None
         if options['username']:
             users = [User.objects.get(username = options['username'])]
-        send_user_harvest_emails(users)
+        failures = send_user_harvest_emails(users)
+        for recipient, error in failures.items():
+            self.stderr.write('Sending to {} failed: {}'.format(recipient, error))
         self.stdout.write('Sent user harvest emails.')
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_rollup(apps, schema_editor):
+    HarvestStat = apps.get_model("ui", "HarvestStat")
+    HarvestStatRollup = apps.get_model("ui", "HarvestStatRollup")
+    rollups = []
+    for item_count in HarvestStat.objects.order_by().values(
+            "harvest__collection__collection_set", "harvest__collection", "harvest_date", "item").annotate(
+            count=Sum("count")).iterator():
+        rollups.append(HarvestStatRollup(collection_set_id=item_count["harvest__collection__collection_set"],
+                                         collection_id=item_count["harvest__collection"],
+                                         harvest_date=item_count["harvest_date"],
+                                         item=item_count["item"],
+                                         count=item_count["count"]))
+    HarvestStatRollup.objects.bulk_create(rollups, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0005_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HarvestStatRollup',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('harvest_date', models.DateField()),
+                ('item', models.CharField(max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+                ('collection', models.ForeignKey(related_name='harvest_stat_rollups', to='ui.Collection')),
+                ('collection_set', models.ForeignKey(related_name='harvest_stat_rollups', to='ui.CollectionSet')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='harveststatrollup',
+            unique_together=set([('collection', 'harvest_date', 'item')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='harveststatrollup',
+            index_together=set([('collection_set', 'item', 'harvest_date')]),
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import ui.models
+import jsonfield.fields
+import django.utils.timezone
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0006_harveststatrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeedImport',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('seed_import_id', models.CharField(default=ui.models.default_uuid, unique=True, max_length=32)),
+                ('seeds_type', models.CharField(max_length=10)),
+                ('history_note', models.TextField(blank=True)),
+                ('path', models.TextField(blank=True)),
+                ('status', models.CharField(default='requested', max_length=20, choices=[('requested', 'Requested'), ('running', 'Running'), ('completed success', 'Success'), ('completed failure', 'Failure')])),
+                ('lines_processed', models.PositiveIntegerField(default=0)),
+                ('seeds_added', models.PositiveIntegerField(default=0)),
+                ('date_requested', models.DateTimeField(default=django.utils.timezone.now)),
+                ('date_started', models.DateTimeField(null=True, blank=True)),
+                ('date_ended', models.DateTimeField(null=True, blank=True)),
+                ('errors', jsonfield.fields.JSONField(blank=True)),
+                ('collection', models.ForeignKey(related_name='seed_imports', to='ui.Collection')),
+                ('user', models.ForeignKey(related_name='seed_imports', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
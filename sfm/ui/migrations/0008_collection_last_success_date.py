@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+
+
+def populate_last_success_date(apps, schema_editor):
+    Collection = apps.get_model("ui", "Collection")
+    Harvest = apps.get_model("ui", "Harvest")
+    for last_success in Harvest.objects.filter(status="completed success").exclude(harvest_type="web").order_by(
+            ).values("collection").annotate(
+            last_success_date=Max(Coalesce("date_ended", "date_started", "date_requested"))).iterator():
+        Collection.objects.filter(pk=last_success["collection"]).update(
+            last_success_date=last_success["last_success_date"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0007_seedimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='last_success_date',
+            field=models.DateTimeField(null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='historicalcollection',
+            name='last_success_date',
+            field=models.DateTimeField(null=True, blank=True),
+        ),
+        migrations.RunPython(populate_last_success_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_harvest_state(apps, schema_editor):
+    Collection = apps.get_model("ui", "Collection")
+    Harvest = apps.get_model("ui", "Harvest")
+    for collection in Collection.objects.all().iterator():
+        harvests = Harvest.objects.filter(collection=collection)
+        latest_harvest = harvests.exclude(harvest_type="web").order_by("-date_requested").first()
+        Collection.objects.filter(pk=collection.pk).update(
+            latest_harvest=latest_harvest,
+            last_harvest_status=latest_harvest.status if latest_harvest else None,
+            harvest_count=harvests.count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0008_collection_last_success_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='harvest_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='last_harvest_status',
+            field=models.CharField(max_length=20, null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='latest_harvest',
+            field=models.ForeignKey(related_name='+', on_delete=django.db.models.deletion.SET_NULL, blank=True, to='ui.Harvest', null=True),
+        ),
+        migrations.AddField(
+            model_name='historicalcollection',
+            name='harvest_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='historicalcollection',
+            name='last_harvest_status',
+            field=models.CharField(max_length=20, null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='historicalcollection',
+            name='latest_harvest',
+            field=models.ForeignKey(related_name='+', on_delete=django.db.models.deletion.DO_NOTHING, db_constraint=False, blank=True, to='ui.Harvest', null=True),
+        ),
+        migrations.RunPython(populate_harvest_state, migrations.RunPython.noop),
+    ]
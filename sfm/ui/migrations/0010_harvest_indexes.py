@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Partial index for the last (non-web) harvest of a collection. Only supported by PostgreSQL.
+LAST_HARVEST_INDEX = "ui_harvest_last_harvest_idx"
+
+
+def create_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE INDEX {} ON ui_harvest (collection_id, date_requested DESC) "
+                              "WHERE harvest_type <> 'web'".format(LAST_HARVEST_INDEX))
+
+
+def drop_partial_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS {}".format(LAST_HARVEST_INDEX))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0009_collection_harvest_state'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='harvest',
+            index_together=set([('collection', 'date_requested'), ('historical_collection', 'date_started')]),
+        ),
+        migrations.RunPython(create_partial_indexes, drop_partial_indexes),
+    ]
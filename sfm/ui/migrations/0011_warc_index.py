@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0010_harvest_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='warc',
+            index_together=set([('date_created', 'id')]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0011_warc_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='manifest',
+            field=jsonfield.fields.JSONField(null=True, blank=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0012_export_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seedimport',
+            name='date_updated',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
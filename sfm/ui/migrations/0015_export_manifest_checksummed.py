@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ui', '0014_outboxmessage_date_claimed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='export',
+            name='manifest_checksummed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
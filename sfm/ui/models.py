@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser, Group
-from django.db import models
+from django.db import models, connections, transaction, IntegrityError
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from jsonfield import JSONField
@@ -11,11 +12,12 @@ import uuid
 import datetime
 import logging
 import json
+import sqlite3
 
 log = logging.getLogger(__name__)
 
-# This adds an additional meta field
-options.DEFAULT_NAMES = options.DEFAULT_NAMES + (u'diff_fields',)
+# This adds additional meta fields. secret_diff_fields are diff fields whose values are not cached.
+options.DEFAULT_NAMES = options.DEFAULT_NAMES + (u'diff_fields', u'secret_diff_fields')
 
 
 def default_uuid():
@@ -42,31 +44,103 @@ def history_save(self, *args, **kw):
     """
     A save method that skips creating a historical record if none of the
     diff fields have changed.
+
+    The diff fields are compared against the values tracked when the object
+    was loaded or last saved (see DiffFieldsMixin). Only if these are not
+    available is the object retrieved from the database.
     """
     is_changed = False
     if self.pk is not None:
-        orig = self.__class__.objects.get(pk=self.pk)
-        is_changed = False
-        for field in self.__class__._meta.diff_fields:
-            if getattr(orig, field) != getattr(self, field):
-                is_changed = True
-                break
+        orig_diff_values = getattr(self, "_orig_diff_values", None)
+        if orig_diff_values is None:
+            orig_diff_values = _diff_values(self.__class__.objects.get(pk=self.pk))
+        is_changed = orig_diff_values != _diff_values(self)
 
     else:
         is_changed = True
 
     if is_changed:
-        return super(self.__class__, self).save(*args, **kw)
+        ret = super(self.__class__, self).save(*args, **kw)
     else:
         self.skip_history_when_saving = True
         try:
             ret = super(self.__class__, self).save(*args, **kw)
         finally:
             del self.skip_history_when_saving
-        return ret
+    self._orig_diff_values = _diff_values(self)
+    return ret
+
+
+def _diff_attnames(model):
+    # Using attnames so that foreign keys are compared by id, without retrieving the related objects.
+    return [model._meta.get_field(field_name).attname for field_name in model._meta.concrete_model._meta.diff_fields]
 
 
-class Credential(models.Model):
+def _diff_values(obj):
+    return dict((attname, getattr(obj, attname)) for attname in _diff_attnames(obj.__class__))
+
+
+class DiffFieldsMixin(object):
+    """
+    Mixin for models saved with history_save that tracks the values of the diff
+    fields when an object is loaded, so that saving does not require retrieving
+    the object again.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obj = super(DiffFieldsMixin, cls).from_db(db, field_names, values)
+        # Deferred fields are not tracked.
+        if all(attname in obj.__dict__ for attname in _diff_attnames(cls)):
+            obj._orig_diff_values = _diff_values(obj)
+        return obj
+
+
+def history_bulk_create(objs, key_field, batch_size=500):
+    """
+    Creates objects and their historical records with batched inserts.
+
+    As with bulk_create(), save() is not called and signals are not sent. Since
+    bulk_create() does not set primary keys on all databases, the objects are
+    retrieved again by key_field, which must be unique.
+
+    :param objs: list of new objects, all of the same model
+    :param key_field: name of a unique field that is set on the objects, e.g., seed_id
+    :param batch_size: number of objects per insert or query
+    :return: list of the created objects, with primary keys
+    """
+    if not objs:
+        return []
+    model = objs[0].__class__
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    keys = [getattr(obj, key_field) for obj in objs]
+    created_objs = []
+    for i in range(0, len(keys), batch_size):
+        created_objs.extend(model.objects.filter(**{"{}__in".format(key_field): keys[i:i + batch_size]}))
+
+    history_model = model.history.model
+    history_date = timezone.now()
+    history_user = _history_user()
+    historical_objs = []
+    for obj in created_objs:
+        attrs = dict((field.attname, getattr(obj, field.attname)) for field in model._meta.fields)
+        historical_objs.append(history_model(history_date=history_date, history_type="+", history_user=history_user,
+                                             **attrs))
+    history_model.objects.bulk_create(historical_objs, batch_size=batch_size)
+    return created_objs
+
+
+def _history_user():
+    # As determined by HistoricalRecords, from the request recorded by HistoryRequestMiddleware.
+    try:
+        if HistoricalRecords.thread.request.user.is_authenticated():
+            return HistoricalRecords.thread.request.user
+    except AttributeError:
+        pass
+    return None
+
+
+class Credential(DiffFieldsMixin, models.Model):
     TWITTER = "twitter"
     FLICKR = "flickr"
     WEIBO = "weibo"
@@ -89,6 +163,7 @@ class Credential(models.Model):
 
     class Meta:
         diff_fields = ("name", "platform", "token", "is_active")
+        secret_diff_fields = ("token",)
 
     def __str__(self):
         return '<Credential %s "%s">' % (self.id, self.platform)
@@ -97,8 +172,65 @@ class Credential(models.Model):
         return history_save(self, *args, **kw)
 
 
+class StatsQuerySet(models.QuerySet):
+    """
+    QuerySet that can fetch the harvest stats and WARC totals for all of its
+    objects with a couple of grouped queries, rather than a query per object.
+    """
+    _with_stats = False
+
+    def with_stats(self):
+        """
+        Returns a QuerySet whose objects have their stats and WARC totals cached.
+        """
+        clone = self._clone()
+        clone._with_stats = True
+        return clone
+
+    def _clone(self, *args, **kwargs):
+        clone = super(StatsQuerySet, self)._clone(*args, **kwargs)
+        clone._with_stats = self._with_stats
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is not None
+        super(StatsQuerySet, self)._fetch_all()
+        if self._with_stats and not fetched:
+            # Values querysets return dicts rather than objects.
+            objs = [obj for obj in self._result_cache if isinstance(obj, self.model)]
+            if objs:
+                _cache_stats(objs, self.model.HARVEST_LOOKUP)
+
+
+def _cache_stats(objs, harvest_lookup):
+    """
+    Caches item counts and WARC totals on objects.
+
+    :param objs: the objects, e.g., collection sets.
+    :param harvest_lookup: lookup from a harvest to the objects, e.g., collection__collection_set.
+    """
+    objs_dict = dict((obj.id, obj) for obj in objs)
+    for obj in objs:
+        obj._stats = {}
+        obj._warcs_count = 0
+        obj._warcs_bytes = None
+
+    stat_lookup = "harvest__{}".format(harvest_lookup)
+    for item_count in HarvestStat.objects.filter(**{"{}__in".format(stat_lookup): objs_dict.keys()}).order_by(
+    ).values(stat_lookup, "item").annotate(count=models.Sum("count")):
+        objs_dict[item_count[stat_lookup]]._stats[item_count["item"]] = item_count["count"]
+
+    for warc_total in Harvest.objects.filter(**{"{}__in".format(harvest_lookup): objs_dict.keys()}).order_by(
+    ).values(harvest_lookup).annotate(count=models.Sum("warcs_count"), total=models.Sum("warcs_bytes")):
+        obj = objs_dict[warc_total[harvest_lookup]]
+        obj._warcs_count = warc_total["count"] or 0
+        obj._warcs_bytes = warc_total["total"]
+
+
 @python_2_unicode_compatible
-class CollectionSet(models.Model):
+class CollectionSet(DiffFieldsMixin, models.Model):
+    # Lookup from a harvest to the collection set
+    HARVEST_LOOKUP = "collection__collection_set"
     collection_set_id = models.CharField(max_length=32, unique=True, default=default_uuid)
     group = models.ForeignKey(Group,
                               related_name='collection_sets')
@@ -110,6 +242,7 @@ class CollectionSet(models.Model):
     date_updated = models.DateTimeField(auto_now=True)
     history = HistoricalRecords()
     history_note = models.TextField(blank=True)
+    objects = StatsQuerySet.as_manager()
 
     class Meta:
         diff_fields = ("group", "name", "description")
@@ -124,6 +257,8 @@ class CollectionSet(models.Model):
         """
         Returns a dict of items to count.
         """
+        if hasattr(self, "_stats"):
+            return self._stats
         return _item_counts_to_dict(
             HarvestStat.objects.filter(harvest__collection__collection_set=self).values("item").annotate(
                 count=models.Sum("count")))
@@ -132,6 +267,8 @@ class CollectionSet(models.Model):
         """
         Returns a list of items type that have been harvested for this collection set.
         """
+        if hasattr(self, "_stats"):
+            return sorted(self._stats.keys())
         return list(
             HarvestStat.objects.filter(harvest__collection__collection_set=self).values_list("item",
                                                                                              flat=True).distinct())
@@ -142,6 +279,8 @@ class CollectionSet(models.Model):
 
         If there are no items for a day, a date, count (of 0) pair is still returned.
 
+        Counts are read from the harvest stat rollup.
+
         :param item: name of the item to get count for, e.g., tweet.
         :param days: backwards from end_datetime, the number of days to retrieve.
         :param end_date: the date to start backfrom from. Default is today.
@@ -152,11 +291,11 @@ class CollectionSet(models.Model):
 
         if days:
             start_date = end_date - datetime.timedelta(days=days - 1)
-            date_counts = HarvestStat.objects.filter(harvest__collection__collection_set=self, item=item,
-                                                     harvest_date__gte=start_date).order_by(
+            date_counts = HarvestStatRollup.objects.filter(collection_set=self, item=item,
+                                                           harvest_date__gte=start_date).order_by(
                 "harvest_date").values("harvest_date").annotate(count=models.Sum("count"))
         else:
-            date_counts = HarvestStat.objects.filter(harvest__collection__collection_set=self, item=item).order_by(
+            date_counts = HarvestStatRollup.objects.filter(collection_set=self, item=item).order_by(
                 "harvest_date").values("harvest_date").annotate(count=models.Sum("count"))
             if len(date_counts) > 0:
                 days = (end_date - date_counts[0]["harvest_date"]).days + 1
@@ -178,6 +317,8 @@ class CollectionSet(models.Model):
         """
         Returns total number of WARC files harvested for this collection set.
         """
+        if hasattr(self, "_warcs_count"):
+            return self._warcs_count
         return Harvest.objects.filter(collection__collection_set=self).aggregate(count=models.Sum("warcs_count"))[
                    "count"] or 0
 
@@ -185,12 +326,14 @@ class CollectionSet(models.Model):
         """
         Returns total number of WARC bytes harvested for this collection set.
         """
+        if hasattr(self, "_warcs_bytes"):
+            return self._warcs_bytes
         return Harvest.objects.filter(collection__collection_set=self).aggregate(total=models.Sum("warcs_bytes"))[
             "total"]
 
 
 @python_2_unicode_compatible
-class Collection(models.Model):
+class Collection(DiffFieldsMixin, models.Model):
     TWITTER_SEARCH = 'twitter_search'
     TWITTER_FILTER = "twitter_filter"
     TWITTER_USER_TIMELINE = 'twitter_user_timeline'
@@ -233,6 +376,9 @@ class Collection(models.Model):
         TUMBLR_BLOG_POSTS: Credential.TUMBLR
     }
     STREAMING_HARVEST_TYPES = (TWITTER_SAMPLE, TWITTER_FILTER)
+    HARVEST_STATE_FIELDS = ("latest_harvest", "last_harvest_status", "harvest_count", "last_success_date")
+    # Lookup from a harvest to the collection
+    HARVEST_LOOKUP = "collection"
     collection_id = models.CharField(max_length=32, unique=True, default=default_uuid)
     collection_set = models.ForeignKey(CollectionSet, related_name='collections')
     credential = models.ForeignKey(Credential, related_name='collections')
@@ -248,8 +394,15 @@ class Collection(models.Model):
     end_date = models.DateTimeField(blank=True,
                                     null=True,
                                     help_text="If blank, will continue until stopped.")
+    # Harvest state fields, maintained by update_harvest_state()
+    latest_harvest = models.ForeignKey("Harvest", related_name="+", null=True, blank=True,
+                                       on_delete=models.SET_NULL)
+    last_harvest_status = models.CharField(max_length=20, blank=True, null=True)
+    harvest_count = models.PositiveIntegerField(default=0)
+    last_success_date = models.DateTimeField(blank=True, null=True)
     history = HistoricalRecords()
     history_note = models.TextField(blank=True)
+    objects = StatsQuerySet.as_manager()
 
     class Meta:
         diff_fields = (
@@ -281,6 +434,50 @@ class Collection(models.Model):
         """
         return self.harvests.exclude(harvest_type="web").order_by("-date_requested").first()
 
+    def update_harvest_state(self, harvest, created=False):
+        """
+        Updates the harvest state fields of this collection for a harvest that
+        has been created or whose status has changed.
+
+        The fields are updated in the database with update(), so no historical record
+        is created and date_updated is not changed. This should be called within the
+        transaction that creates or updates the harvest.
+        """
+        collections = Collection.objects.filter(pk=self.pk)
+        if created:
+            collections.update(harvest_count=models.F("harvest_count") + 1)
+            self.harvest_count += 1
+        if harvest.harvest_type == "web":
+            return
+        if created:
+            collections.update(latest_harvest=harvest, last_harvest_status=harvest.status)
+            self.latest_harvest = harvest
+            self.last_harvest_status = harvest.status
+        elif collections.filter(latest_harvest=harvest).update(last_harvest_status=harvest.status):
+            self.last_harvest_status = harvest.status
+        if harvest.status == Harvest.SUCCESS:
+            success_date = harvest.success_date()
+            # Only move forward, in case status messages are applied out of order.
+            collections.filter(
+                models.Q(last_success_date__isnull=True) | models.Q(last_success_date__lt=success_date)).update(
+                last_success_date=success_date)
+            if self.last_success_date is None or self.last_success_date < success_date:
+                self.last_success_date = success_date
+
+    def refresh_harvest_state(self):
+        """
+        Recalculates the harvest state fields of this collection from its harvests.
+
+        Called when a harvest is deleted. See harvest_delete_receiver().
+        """
+        self.latest_harvest = self.last_harvest()
+        self.last_harvest_status = self.latest_harvest.status if self.latest_harvest else None
+        self.harvest_count = self.harvests.count()
+        self.last_success_date = self.harvests.filter(status=Harvest.SUCCESS).exclude(harvest_type="web").aggregate(
+            last_success_date=models.Max(Coalesce(*Harvest.SUCCESS_DATE_FIELDS)))["last_success_date"]
+        Collection.objects.filter(pk=self.pk).update(**dict((field_name, getattr(self, field_name))
+                                                            for field_name in self.HARVEST_STATE_FIELDS))
+
     def is_streaming(self):
         """
         Returns True if a streaming harvest type.
@@ -291,6 +488,8 @@ class Collection(models.Model):
         """
         Returns a dict of items to count.
         """
+        if hasattr(self, "_stats"):
+            return self._stats
         return _item_counts_to_dict(
             HarvestStat.objects.filter(harvest__collection=self).values("item").annotate(count=models.Sum("count")))
 
@@ -298,16 +497,33 @@ class Collection(models.Model):
         """
         Returns total number of WARC files harvested for this collection.
         """
+        if hasattr(self, "_warcs_count"):
+            return self._warcs_count
         return Harvest.objects.filter(collection=self).aggregate(count=models.Sum("warcs_count"))["count"] or 0
 
     def warcs_bytes(self):
         """
         Returns total number of WARC bytes harvested for this collection.
         """
+        if hasattr(self, "_warcs_bytes"):
+            return self._warcs_bytes
         return Harvest.objects.filter(collection=self).aggregate(total=models.Sum("warcs_bytes"))["total"]
 
     def save(self, *args, **kw):
-        return history_save(self, *args, **kw)
+        if self.pk is not None and not kw.get("force_insert") and kw.get("update_fields") is None:
+            # The harvest state fields are only changed by update_harvest_state(), so that saving
+            # a collection that was retrieved earlier does not overwrite them with stale values.
+            kw["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                   if not field.primary_key and field.name not in self.HARVEST_STATE_FIELDS]
+        orig_diff_values = getattr(self, "_orig_diff_values", None)
+        moved = self.pk is not None and (orig_diff_values is None or
+                                         orig_diff_values["collection_set_id"] != self.collection_set_id)
+        with transaction.atomic():
+            ret = history_save(self, *args, **kw)
+            if moved:
+                # The harvest stat rollup records the collection set of each collection.
+                HarvestStatRollup.objects.filter(collection=self).update(collection_set=self.collection_set_id)
+        return ret
 
 
 def _item_counts_to_dict(item_counts):
@@ -318,7 +534,7 @@ def _item_counts_to_dict(item_counts):
 
 
 @python_2_unicode_compatible
-class Seed(models.Model):
+class Seed(DiffFieldsMixin, models.Model):
     collection = models.ForeignKey(Collection, related_name='seeds')
     seed_id = models.CharField(max_length=32, unique=True, default=default_uuid)
     token = models.TextField(blank=True)
@@ -366,6 +582,8 @@ class Harvest(models.Model):
         (RUNNING, "Running"),
         (STOP_REQUESTED, "Stop requested")
     )
+    # Fields for the date of a successful harvest, in order of preference. See success_date().
+    SUCCESS_DATE_FIELDS = ("date_ended", "date_started", "date_requested")
     harvest_type = models.CharField(max_length=255)
     historical_collection = models.ForeignKey(HistoricalCollection, related_name='historical_harvests', null=True)
     historical_credential = models.ForeignKey(HistoricalCredential, related_name='historical_harvests', null=True)
@@ -386,12 +604,27 @@ class Harvest(models.Model):
     warcs_count = models.PositiveIntegerField(default=0)
     warcs_bytes = models.BigIntegerField(default=0)
 
+    class Meta:
+        # For harvests of a collection by date requested (e.g., last harvest) and for
+        # warcs of a historical collection by date started (API warc filter).
+        index_together = (("collection", "date_requested"), ("historical_collection", "date_started"))
+
     def __str__(self):
         return '<Harvest %s "%s">' % (self.id, self.harvest_id)
 
     def get_harvest_type_display(self):
         return self.harvest_type.replace("_", " ").capitalize()
 
+    def success_date(self):
+        """
+        Returns the date of this harvest for the last success date of its collection.
+        """
+        for field_name in self.SUCCESS_DATE_FIELDS:
+            value = getattr(self, field_name)
+            if value is not None:
+                return value
+        return None
+
     def message_count(self):
         return len(self.infos) if self.infos else 0 + len(self.warnings) if self.warnings else 0 + len(
             self.errors) if self.errors else 0
@@ -404,12 +637,107 @@ class Harvest(models.Model):
             HarvestStat.objects.filter(harvest=self).values("item").annotate(count=models.Sum("count")))
 
 
+def harvest_delete_receiver(sender, **kwargs):
+    """
+    Recalculates the harvest state fields of the collection of a deleted harvest.
+    """
+    collection = Collection.objects.filter(pk=kwargs["instance"].collection_id).first()
+    if collection is not None:
+        collection.refresh_harvest_state()
+
+
+def _supports_on_conflict(connection):
+    """
+    Returns True if the database supports INSERT ... ON CONFLICT DO UPDATE (PostgreSQL 9.5+, SQLite 3.24+).
+    """
+    return (connection.vendor == "postgresql" and connection.pg_version >= 90500) or (
+        connection.vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 24, 0))
+
+
+def _upsert_on_conflict(connection, model, key_fields, update_fields, rows, batch_size):
+    """
+    Inserts rows, updating the update fields of existing rows with the same key fields.
+
+    The key fields must have a unique constraint. Rows are inserted with a single
+    statement per batch.
+
+    :param key_fields: names of the key fields
+    :param update_fields: names of the fields that are updated
+    :param rows: list of tuples of key field values followed by update field values.
+    Use primary keys for foreign keys.
+    """
+    qn = connection.ops.quote_name
+    opts = model._meta
+    table = qn(opts.db_table)
+    key_columns = [qn(opts.get_field(name).column) for name in key_fields]
+    update_columns = [qn(opts.get_field(name).column) for name in update_fields]
+    columns = key_columns + update_columns
+    sql_template = "INSERT INTO {table} ({columns}) VALUES {{values}} ON CONFLICT ({key_columns}) " \
+                   "DO UPDATE SET {sets} WHERE {changed}".format(
+                       table=table,
+                       columns=", ".join(columns),
+                       key_columns=", ".join(key_columns),
+                       sets=", ".join("{0} = excluded.{0}".format(column) for column in update_columns),
+                       changed=" OR ".join("{0}.{1} <> excluded.{1}".format(table, column)
+                                           for column in update_columns))
+    row_placeholders = "({})".format(", ".join(["%s"] * len(columns)))
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            params = []
+            for row in batch:
+                params.extend(row)
+            cursor.execute(sql_template.format(values=", ".join([row_placeholders] * len(batch))), params)
+
+
+class HarvestStatManager(models.Manager):
+    # Rows per INSERT statement. Keeps within SQLite's limit of 999 parameters.
+    UPSERT_BATCH_SIZE = 200
+
+    def upsert(self, harvest, counts):
+        """
+        Creates or updates the stats for a harvest.
+
+        Where the database supports INSERT ... ON CONFLICT DO UPDATE (PostgreSQL 9.5+,
+        SQLite 3.24+), this is performed with a single statement. Otherwise, the existing
+        stats are retrieved with a single query and then created or updated.
+
+        :param harvest: the harvest
+        :param counts: list of harvest date, item, count tuples
+        """
+        if not counts:
+            return
+        connection = connections[self.db]
+        if _supports_on_conflict(connection):
+            _upsert_on_conflict(connection, self.model, ("harvest", "harvest_date", "item"), ("count",),
+                                [(harvest.pk, harvest_date, item, count) for harvest_date, item, count in counts],
+                                self.UPSERT_BATCH_SIZE)
+        else:
+            self._upsert_portable(harvest, counts)
+
+    def _upsert_portable(self, harvest, counts):
+        existing_stats = {}
+        for stat in self.filter(harvest=harvest, harvest_date__in=set(harvest_date for harvest_date, _, _ in counts)):
+            existing_stats[(stat.harvest_date, stat.item)] = stat
+        new_stats = []
+        for harvest_date, item, count in counts:
+            stat = existing_stats.get((harvest_date, item))
+            if stat is None:
+                new_stats.append(self.model(harvest=harvest, harvest_date=harvest_date, item=item, count=count))
+            elif stat.count != count:
+                stat.count = count
+                stat.save(update_fields=["count"])
+        self.bulk_create(new_stats)
+
+
 class HarvestStat(models.Model):
     harvest = models.ForeignKey(Harvest, related_name="harvest_stats")
     harvest_date = models.DateField()
     item = models.CharField(max_length=255)
     count = models.PositiveIntegerField()
 
+    objects = HarvestStatManager()
+
     class Meta:
         unique_together = ("harvest", "harvest_date", "item")
 
@@ -417,6 +745,115 @@ class HarvestStat(models.Model):
         return '<HarvestStat %s "%s from %s">' % (self.id, self.item, self.harvest_date)
 
 
+class HarvestStatRollupManager(models.Manager):
+    # Rows per INSERT statement when rebuilding.
+    REBUILD_BATCH_SIZE = 500
+    # Rows per INSERT statement when refreshing. Keeps within SQLite's limit of 999 parameters.
+    UPSERT_BATCH_SIZE = 150
+
+    def refresh(self, collection, counts):
+        """
+        Updates the rollup for the dates and items of a collection's harvest stats.
+
+        The counts are recalculated from the harvest stats, so refreshing is
+        idempotent and may be repeated when a status message is redelivered.
+        Where the database supports it, the rollup is upserted, so concurrent
+        refreshes for a collection do not conflict.
+
+        :param collection: the collection
+        :param counts: list of harvest date, item, count tuples, e.g., as passed to HarvestStat.objects.upsert()
+        """
+        if not counts:
+            return
+        harvest_dates = set(harvest_date for harvest_date, _, _ in counts)
+        items = set(item for _, item, _ in counts)
+        totals = dict(((harvest_date, item), 0) for harvest_date, item, _ in counts)
+        for item_count in HarvestStat.objects.filter(harvest__collection=collection, harvest_date__in=harvest_dates,
+                                                     item__in=items).order_by().values(
+                "harvest_date", "item").annotate(count=models.Sum("count")):
+            totals[(item_count["harvest_date"], item_count["item"])] = item_count["count"]
+
+        connection = connections[self.db]
+        if _supports_on_conflict(connection):
+            _upsert_on_conflict(connection, self.model, ("collection", "harvest_date", "item"),
+                                ("collection_set", "count"),
+                                [(collection.pk, harvest_date, item, collection.collection_set_id, count)
+                                 for (harvest_date, item), count in totals.items()],
+                                self.UPSERT_BATCH_SIZE)
+        else:
+            self._refresh_portable(collection, harvest_dates, items, totals)
+
+    def _refresh_portable(self, collection, harvest_dates, items, totals):
+        totals = dict(totals)
+        for rollup in self.filter(collection=collection, harvest_date__in=harvest_dates, item__in=items):
+            count = totals.pop((rollup.harvest_date, rollup.item), None)
+            if count is not None and (rollup.count != count or
+                                      rollup.collection_set_id != collection.collection_set_id):
+                rollup.count = count
+                rollup.collection_set_id = collection.collection_set_id
+                rollup.save(update_fields=["collection_set", "count"])
+        for (harvest_date, item), count in totals.items():
+            rollup = self.model(collection_set_id=collection.collection_set_id, collection=collection,
+                                harvest_date=harvest_date, item=item, count=count)
+            try:
+                with transaction.atomic(using=self.db):
+                    rollup.save(force_insert=True)
+            except IntegrityError:
+                # Created by a concurrent refresh
+                self.filter(collection=collection, harvest_date=harvest_date, item=item).update(
+                    collection_set=collection.collection_set_id, count=count)
+
+    def rebuild(self, collection_set=None):
+        """
+        Recreates the rollup from the harvest stats.
+
+        :param collection_set: limit to this collection set. Default is all collection sets.
+        """
+        rollups = self.all()
+        harvest_stats = HarvestStat.objects.all()
+        if collection_set is not None:
+            rollups = rollups.filter(collection_set=collection_set)
+            harvest_stats = harvest_stats.filter(harvest__collection__collection_set=collection_set)
+        with transaction.atomic(using=self.db):
+            rollups.delete()
+            batch = []
+            for item_count in harvest_stats.order_by().values(
+                    "harvest__collection__collection_set", "harvest__collection", "harvest_date", "item").annotate(
+                    count=models.Sum("count")).iterator():
+                batch.append(self.model(collection_set_id=item_count["harvest__collection__collection_set"],
+                                        collection_id=item_count["harvest__collection"],
+                                        harvest_date=item_count["harvest_date"],
+                                        item=item_count["item"],
+                                        count=item_count["count"]))
+                if len(batch) == self.REBUILD_BATCH_SIZE:
+                    self.bulk_create(batch)
+                    batch = []
+            self.bulk_create(batch)
+
+
+class HarvestStatRollup(models.Model):
+    """
+    Daily count of an item harvested for a collection, summed across harvests.
+
+    This is maintained from HarvestStat so that time series for a collection set
+    do not need to be aggregated from every harvest stat.
+    """
+    collection_set = models.ForeignKey(CollectionSet, related_name="harvest_stat_rollups")
+    collection = models.ForeignKey(Collection, related_name="harvest_stat_rollups")
+    harvest_date = models.DateField()
+    item = models.CharField(max_length=255)
+    count = models.BigIntegerField(default=0)
+
+    objects = HarvestStatRollupManager()
+
+    class Meta:
+        unique_together = ("collection", "harvest_date", "item")
+        index_together = ("collection_set", "item", "harvest_date")
+
+    def __str__(self):
+        return '<HarvestStatRollup %s "%s from %s">' % (self.id, self.item, self.harvest_date)
+
+
 class Warc(models.Model):
     harvest = models.ForeignKey(Harvest, related_name='warcs')
     warc_id = models.CharField(max_length=32, unique=True)
@@ -427,6 +864,10 @@ class Warc(models.Model):
     date_added = models.DateTimeField(default=timezone.now)
     date_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # For cursor pagination in the API
+        index_together = ("date_created", "id")
+
     @property
     def harvest_type(self):
         return self.harvest.harvest_type
@@ -471,6 +912,10 @@ class Export(models.Model):
     infos = JSONField(blank=True)
     warnings = JSONField(blank=True)
     errors = JSONField(blank=True)
+    # List of files recorded when the export completes successfully. See ui.export.create_export_manifest().
+    manifest = JSONField(blank=True, null=True)
+    # True once sha1 checksums have been added to the manifest. See ui.export.checksum_export_manifests().
+    manifest_checksummed = models.BooleanField(default=False)
 
     def save(self, *args, **kwargs):
         self.path = "{}/export/{}".format(settings.SFM_DATA_DIR, self.export_id)
@@ -478,3 +923,63 @@ class Export(models.Model):
 
     def __str__(self):
         return '<Export %s "%s">' % (self.id, self.export_id)
+
+
+class SeedImport(models.Model):
+    """
+    A file of seeds to be added to a collection in the background.
+    """
+    REQUESTED = "requested"
+    RUNNING = "running"
+    SUCCESS = "completed success"
+    FAILURE = "completed failure"
+    STATUS_CHOICES = (
+        (REQUESTED, "Requested"),
+        (RUNNING, "Running"),
+        (SUCCESS, "Success"),
+        (FAILURE, "Failure")
+    )
+    seed_import_id = models.CharField(max_length=32, unique=True, default=default_uuid)
+    collection = models.ForeignKey(Collection, related_name='seed_imports')
+    user = models.ForeignKey(User, related_name='seed_imports')
+    seeds_type = models.CharField(max_length=10)
+    history_note = models.TextField(blank=True)
+    path = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=REQUESTED)
+    lines_processed = models.PositiveIntegerField(default=0)
+    seeds_added = models.PositiveIntegerField(default=0)
+    date_requested = models.DateTimeField(default=timezone.now)
+    date_started = models.DateTimeField(blank=True, null=True)
+    # When the seed import last made progress
+    date_updated = models.DateTimeField(default=timezone.now)
+    date_ended = models.DateTimeField(blank=True, null=True)
+    errors = JSONField(blank=True)
+
+    def save(self, *args, **kwargs):
+        self.path = "{}/seed_import/{}".format(settings.SFM_DATA_DIR, self.seed_import_id)
+        super(SeedImport, self).save(*args, **kwargs)
+
+    def __str__(self):
+        return '<SeedImport %s "%s">' % (self.id, self.seed_import_id)
+
+    def is_done(self):
+        return self.status in (SeedImport.SUCCESS, SeedImport.FAILURE)
+
+
+class OutboxMessage(models.Model):
+    """
+    A message to be published to the messaging service.
+
+    Outbox messages are written in the same transaction as the model changes
+    they announce and are published (and deleted) by ui.outbox.relay_messages().
+    """
+    routing_key = models.CharField(max_length=255)
+    message = JSONField()
+    date_added = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # When claimed by a relay that is sending it
+    date_claimed = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return '<OutboxMessage %s "%s">' % (self.id, self.routing_key)
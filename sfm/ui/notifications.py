@@ -2,79 +2,152 @@ import logging
 import datetime
 from collections import OrderedDict
 from smtplib import SMTPException
+from multiprocessing.pool import ThreadPool
+import socket
 
 from django.template.loader import get_template
 from django.template import Context
-from django.core.mail import EmailMultiAlternatives
-from django.db.models import Sum
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Sum, Case, When, Value, BigIntegerField
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
 
 
-from .models import User, CollectionSet, Collection, HarvestStat
-from .sched import next_run_time
+from .models import User, CollectionSet, Collection, HarvestStatRollup
+from .sched import next_run_times
 
 log = logging.getLogger(__name__)
 
 
-def send_user_harvest_emails(users=None):
-    log.info("Sending user harvest emails")
-    collection_set_cache = {}
-    if users is None:
-        users = User.objects.all()
-    for user in users:
-        if _should_send_email(user):
-            msg = _create_email(user, collection_set_cache)
-            try:
-                log.debug("Sending email to %s: %s", msg.to, msg.subject)
-                msg.send()
-            except SMTPException, ex:
-                log.error("Error sending email: %s", ex)
-        else:
-            log.debug("Not sending email to %s", user.username)
+def send_user_harvest_emails(users=None, date=None):
+    """
+    Sends harvest emails to the users that should receive them.
 
+    The emails are sent by a pool of USER_HARVEST_EMAILS_THREADS threads, each
+    reusing a single connection to the mail server.
 
-def _should_send_email(user, date=None):
+    :param users: limit to these users. Default is all users.
+    :param date: the date to send the emails for. Default is today.
+    :return: dict of recipients to errors for emails that could not be sent
+    """
+    log.info("Sending user harvest emails")
+    collection_set_cache = {}
+    # Computed once for all of the emails
+    collection_stats = _collection_stats()
+    collection_next_run_times = next_run_times()
+    templates = _get_templates()
+    msgs = []
+    for user in _email_users(users=users, date=date):
+        msgs.append(_create_email(user, collection_set_cache, collection_stats=collection_stats,
+                                  collection_next_run_times=collection_next_run_times, templates=templates))
+    failures = _send_emails(msgs)
+    log.info("Sent %s user harvest emails with %s failures", len(msgs) - len(failures), len(failures))
+    return failures
+
+
+def _email_frequencies(date):
+    """
+    Returns the email frequencies for which emails are sent on a date.
+    """
+    frequencies = [User.DAILY]
+    if date.weekday() == 6:
+        frequencies.append(User.WEEKLY)
+    if date.day == 1:
+        frequencies.append(User.MONTHLY)
+    return frequencies
+
+
+def _email_users(users=None, date=None):
+    """
+    Returns the users that should be sent an email with a single query.
+
+    A user should be sent an email if the user has an email address, the email frequency
+    is due on the date, and the user's groups have active collections.
+    """
     if date is None:
         date = datetime.date.today()
-    send_email = False
-    has_active_collections = Collection.objects.filter(collection_set__group__in=user.groups.all(),
-                                                       is_active=True).exists()
-    if user.email and has_active_collections:
-        if user.email_frequency == User.DAILY:
-            send_email = True
-        elif user.email_frequency == User.MONTHLY and date.day == 1:
-            send_email = True
-        elif user.email_frequency == User.WEEKLY and date.weekday() == 6:
-            send_email = True
-    return send_email
-
-
-def _create_email(user, collection_set_cache):
-    text_template = get_template('email/user_harvest_email.txt')
-    html_template = get_template('email/user_harvest_email.html')
-    d = Context(_create_context(user, collection_set_cache))
+    email_users = User.objects.filter(email_frequency__in=_email_frequencies(date),
+                                      groups__collection_sets__collections__is_active=True).exclude(
+        email="").distinct().order_by("id")
+    if users is not None:
+        email_users = email_users.filter(pk__in=[user.pk for user in users])
+    return email_users
+
+
+def _get_templates():
+    return get_template('email/user_harvest_email.txt'), get_template('email/user_harvest_email.html')
+
+
+def _create_email(user, collection_set_cache, collection_stats=None, collection_next_run_times=None, templates=None):
+    text_template, html_template = templates or _get_templates()
+    d = Context(_create_context(user, collection_set_cache, collection_stats=collection_stats,
+                                collection_next_run_times=collection_next_run_times))
     msg = EmailMultiAlternatives("Update on your Social Feed Manager harvests", text_template.render(d),
                                  settings.EMAIL_HOST_USER, [user.email])
     msg.attach_alternative(html_template.render(d), "text/html")
     return msg
 
 
-def _create_context(user, collection_set_cache):
-    today = datetime.date.today()
-    yesterday = today + datetime.timedelta(days=-1)
-    prev_day = today + datetime.timedelta(days=-2)
-    # Greater than this date
-    last_7_start = yesterday + datetime.timedelta(days=-7)
-    prev_7_start = yesterday + datetime.timedelta(days=-14)
-    last_30_start = yesterday + datetime.timedelta(days=-30)
-    prev_30_start = yesterday + datetime.timedelta(days=-60)
-    # Less than or equal to this date
-    last_7_end = yesterday
-    prev_7_end = last_7_start
-    last_30_end = yesterday
-    prev_30_end = last_30_start
+def _send_emails(msgs, threads=None):
+    """
+    Sends emails, dividing them among a pool of threads.
+
+    :return: dict of recipients to errors for emails that could not be sent
+    """
+    if not msgs:
+        return {}
+    threads = min(threads or settings.USER_HARVEST_EMAILS_THREADS, len(msgs))
+    if threads == 1:
+        return _send_emails_with_connection(msgs)
+    pool = ThreadPool(threads)
+    try:
+        results = pool.map(_send_emails_with_connection, [msgs[i::threads] for i in range(threads)])
+    finally:
+        pool.close()
+        pool.join()
+    failures = {}
+    for result in results:
+        failures.update(result)
+    return failures
+
+
+def _send_emails_with_connection(msgs):
+    """
+    Sends emails, reusing a single connection to the mail server.
+
+    :return: dict of recipients to errors for emails that could not be sent
+    """
+    failures = {}
+    connection = get_connection()
+    # The connection is opened here rather than by send_messages(), which would
+    # otherwise open and close a connection for every email.
+    opened = False
+    try:
+        for msg in msgs:
+            try:
+                if not opened:
+                    connection.open()
+                    opened = True
+                log.debug("Sending email to %s: %s", msg.to, msg.subject)
+                connection.send_messages([msg])
+            except (SMTPException, socket.error), ex:
+                log.error("Error sending email to %s: %s", msg.to, ex)
+                for recipient in msg.to:
+                    failures[recipient] = str(ex)
+                # Reconnect for the next email.
+                connection.close()
+                opened = False
+    finally:
+        connection.close()
+    return failures
+
+
+def _create_context(user, collection_set_cache, collection_stats=None, collection_next_run_times=None):
+    if collection_stats is None:
+        collection_stats = _collection_stats()
+    if collection_next_run_times is None:
+        collection_next_run_times = next_run_times()
     c = {
         "url": _create_url(reverse('home'))
     }
@@ -86,42 +159,14 @@ def _create_context(user, collection_set_cache):
             collections = collection_set_cache[collection_set]
         else:
             collections = OrderedDict()
-            for collection in Collection.objects.filter(collection_set=collection_set).order_by('name'):
+            for collection in Collection.objects.filter(collection_set=collection_set).select_related(
+                    'latest_harvest').order_by('name'):
                 collection_info = {
                     "url": _create_url(reverse('collection_detail', args=(collection.id,)))
                 }
                 if collection.is_active:
-                    collection_info['next_run_time'] = next_run_time(collection.id)
-                    stats = {}
-                    # Yesterday
-                    _add_stats(stats, 'yesterday', HarvestStat.objects.filter(harvest__collection=collection,
-                                                                              harvest_date=yesterday).values(
-                        'item').annotate(count=Sum('count')))
-                    # Prev day
-                    _add_stats(stats, 'prev_day', HarvestStat.objects.filter(harvest__collection=collection,
-                                                                             harvest_date=prev_day).values(
-                        'item').annotate(count=Sum('count')))
-                    # Last 7
-                    _add_stats(stats, 'last_7', HarvestStat.objects.filter(harvest__collection=collection,
-                                                                           harvest_date__gt=last_7_start,
-                                                                           harvest_date__lte=last_7_end).values(
-                        'item').annotate(count=Sum('count')))
-                    # Prev 7
-                    _add_stats(stats, 'prev_7', HarvestStat.objects.filter(harvest__collection=collection,
-                                                                           harvest_date__gt=prev_7_start,
-                                                                           harvest_date__lte=prev_7_end).values(
-                        'item').annotate(count=Sum('count')))
-                    # Last 30
-                    _add_stats(stats, 'last_30', HarvestStat.objects.filter(harvest__collection=collection,
-                                                                            harvest_date__gt=last_30_start,
-                                                                            harvest_date__lte=last_30_end).values(
-                        'item').annotate(count=Sum('count')))
-                    # Prev 7
-                    _add_stats(stats, 'prev_30', HarvestStat.objects.filter(harvest__collection=collection,
-                                                                            harvest_date__gt=prev_30_start,
-                                                                            harvest_date__lte=prev_30_end).values(
-                        'item').annotate(count=Sum('count')))
-                    collection_info['stats'] = stats
+                    collection_info['next_run_time'] = collection_next_run_times.get(collection.id)
+                    collection_info['stats'] = collection_stats.get(collection.id, {})
                 collections[collection] = collection_info
 
             collection_set_cache[collection_set] = collections
@@ -134,19 +179,43 @@ def _create_context(user, collection_set_cache):
     return c
 
 
-def _add_stats(stats, name, result_set):
-    for result in result_set:
-        item = result['item']
-        if item not in stats:
-            stats[item] = {
-                'yesterday': 0,
-                'prev_day': 0,
-                'last_7': 0,
-                'prev_7': 0,
-                'last_30': 0,
-                'prev_30': 0
-            }
-        stats[item][name] = result['count']
+def _collection_stats(today=None):
+    """
+    Returns the counts of items harvested by active collections for each period of the email.
+
+    The counts for all of the periods are computed with a single query, using
+    conditional sums over the last 60 days of the harvest stat rollup.
+
+    :return: dict of collection ids to dict of items to dict of periods to counts
+    """
+    if today is None:
+        today = datetime.date.today()
+    yesterday = today + datetime.timedelta(days=-1)
+    prev_day = today + datetime.timedelta(days=-2)
+    last_7_start = yesterday + datetime.timedelta(days=-7)
+    last_30_start = yesterday + datetime.timedelta(days=-30)
+    prev_30_start = yesterday + datetime.timedelta(days=-60)
+    # Greater than the first date and less than or equal to the second date
+    periods = {
+        'yesterday': (prev_day, yesterday),
+        'prev_day': (prev_day + datetime.timedelta(days=-1), prev_day),
+        'last_7': (last_7_start, yesterday),
+        'prev_7': (yesterday + datetime.timedelta(days=-14), last_7_start),
+        'last_30': (last_30_start, yesterday),
+        'prev_30': (prev_30_start, last_30_start)
+    }
+    annotations = {}
+    for name, (start_date, end_date) in periods.items():
+        annotations[name] = Sum(Case(When(harvest_date__gt=start_date, harvest_date__lte=end_date, then='count'),
+                                     default=Value(0), output_field=BigIntegerField()))
+
+    collection_stats = {}
+    for item_counts in HarvestStatRollup.objects.filter(collection__is_active=True, harvest_date__gt=prev_30_start,
+                                                        harvest_date__lte=yesterday).order_by().values(
+            'collection', 'item').annotate(**annotations):
+        stats = collection_stats.setdefault(item_counts['collection'], {})
+        stats[item_counts['item']] = dict((name, item_counts[name]) for name in periods)
+    return collection_stats
 
 
 def _create_url(path):
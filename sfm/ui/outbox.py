@@ -0,0 +1,171 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, connection
+from django.utils import timezone
+
+from .models import OutboxMessage, Harvest, Export
+from .rabbit import RabbitWorker
+
+log = logging.getLogger(__name__)
+
+_relay_lock = threading.Lock()
+_relay_requested = threading.Event()
+
+
+def queue_message(message, routing_key):
+    """
+    Adds a message to the outbox.
+
+    This should be called within the transaction that makes the changes that
+    the message announces, so that the message is only sent if they are committed.
+    """
+    log.debug("Queueing message to %s", routing_key)
+    return OutboxMessage.objects.create(routing_key=routing_key, message=message)
+
+
+def relay_messages(batch_size=None, max_attempts=None):
+    """
+    Publishes messages from the outbox, oldest first.
+
+    Messages are claimed in batches, published outside of a transaction and then
+    removed from the outbox, so that a slow messaging service does not hold locks
+    in the database. A claim expires after OUTBOX_CLAIM_SECONDS in case relaying
+    is interrupted. If another relay has claimed the oldest messages, relaying
+    stops so that messages are not sent out of order.
+
+    If publishing a message fails, it will be retried on the next relay. Later
+    messages with the same id (e.g., the stop message for a harvest) are held back
+    until then, while other messages are still sent. If the messaging service
+    cannot be connected to, relaying stops, since no message can be sent.
+
+    When a message reaches max_attempts, it is left in the outbox and the harvest
+    or export that it requests is marked as failed.
+
+    :return: the number of messages sent
+    """
+    batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+    max_attempts = max_attempts or settings.OUTBOX_MAX_ATTEMPTS
+    rabbit_worker = RabbitWorker()
+    sent_count = 0
+    # Ids of messages that failed or were held back in this relay
+    skipped_ids = []
+    # Message ids of messages that failed in this relay
+    failed_message_ids = set()
+    while True:
+        outbox_messages = _claim_messages(batch_size, max_attempts, skipped_ids)
+        if not outbox_messages:
+            return sent_count
+        sent_ids = []
+        disconnected = False
+        try:
+            for outbox_message in outbox_messages:
+                message_id = outbox_message.message.get("id")
+                if message_id is not None and message_id in failed_message_ids:
+                    log.debug("Holding back %s until an earlier message with the same id is sent", outbox_message)
+                    skipped_ids.append(outbox_message.id)
+                    continue
+                try:
+                    rabbit_worker.send_message(outbox_message.message, outbox_message.routing_key)
+                    sent_ids.append(outbox_message.id)
+                except Exception, ex:
+                    skipped_ids.append(outbox_message.id)
+                    failed_message_ids.add(message_id)
+                    _record_failure(outbox_message, ex, max_attempts)
+                    if isinstance(ex, IOError):
+                        disconnected = True
+                        break
+        finally:
+            OutboxMessage.objects.filter(id__in=sent_ids).delete()
+            # Release the claim on the messages that were not sent.
+            OutboxMessage.objects.filter(id__in=[outbox_message.id for outbox_message in outbox_messages]).update(
+                date_claimed=None)
+        sent_count += len(sent_ids)
+        log.debug("Relayed %s outbox messages", len(sent_ids))
+        if disconnected or len(outbox_messages) < batch_size:
+            return sent_count
+
+
+def _record_failure(outbox_message, ex, max_attempts):
+    """
+    Records a failed attempt to send a message.
+
+    If the message has reached max_attempts, the harvest or export that it requests is marked as failed.
+    """
+    attempts = outbox_message.attempts + 1
+    OutboxMessage.objects.filter(id=outbox_message.id).update(attempts=attempts, last_error=str(ex))
+    if attempts < max_attempts:
+        log.warn("Sending %s failed: %s", outbox_message, ex)
+        return
+    log.error("Giving up sending %s after %s attempts: %s", outbox_message, attempts, ex)
+    message_id = outbox_message.message.get("id")
+    if outbox_message.routing_key.startswith("harvest.start."):
+        obj = Harvest.objects.filter(harvest_id=message_id, status=Harvest.REQUESTED).first()
+        error_message = "Requesting harvest failed: {}".format(ex)
+    elif outbox_message.routing_key.startswith("export.start."):
+        obj = Export.objects.filter(export_id=message_id, status=Export.REQUESTED).first()
+        error_message = "Requesting export failed: {}".format(ex)
+    else:
+        return
+    if obj is not None:
+        obj.status = obj.FAILURE
+        obj.errors = [{"code": "send_message_failed", "message": error_message}]
+        obj.save()
+
+
+def _claim_messages(batch_size, max_attempts, exclude_ids=()):
+    """
+    Claims the oldest messages in the outbox for relaying.
+
+    :param exclude_ids: ids of messages not to claim
+    :return: list of claimed outbox messages. Empty if there are none or another
+    relay has claimed them.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Locking prevents the same messages from being claimed concurrently.
+        outbox_messages = list(OutboxMessage.objects.select_for_update().filter(
+            attempts__lt=max_attempts).exclude(id__in=exclude_ids).order_by("id")[:batch_size])
+        claim_expired = now - timedelta(seconds=settings.OUTBOX_CLAIM_SECONDS)
+        for outbox_message in outbox_messages:
+            if outbox_message.date_claimed is not None and outbox_message.date_claimed > claim_expired:
+                log.debug("%s is claimed by another relay", outbox_message)
+                return []
+        OutboxMessage.objects.filter(id__in=[outbox_message.id for outbox_message in outbox_messages]).update(
+            date_claimed=now)
+    return outbox_messages
+
+
+def request_relay():
+    """
+    Relays messages from the outbox in a background thread.
+
+    Call after committing the transaction that queued messages, so that they
+    are sent without waiting for the scheduled relay. Within a transaction, this
+    does nothing, since the messages are not visible to the relay yet; they are
+    sent by the scheduled relay instead.
+    """
+    if transaction.get_connection().in_atomic_block:
+        return
+    _relay_requested.set()
+    # Only one relay thread at a time. A running thread relays again if requested.
+    if _relay_lock.acquire(False):
+        thread = threading.Thread(target=_run_relay_thread, name="outbox-relay")
+        thread.daemon = True
+        thread.start()
+
+
+def _run_relay_thread():
+    try:
+        while _relay_requested.is_set():
+            _relay_requested.clear()
+            try:
+                relay_messages()
+            except Exception:
+                log.exception("Relaying outbox messages failed")
+    finally:
+        # The thread has its own database connection.
+        connection.close()
+        _relay_lock.release()
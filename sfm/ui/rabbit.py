@@ -1,25 +1,80 @@
 from django.conf import settings
 from kombu import Connection, Exchange
+from kombu.pools import ProducerPool
 from sfmutils.consumer import EXCHANGE
 import logging
 import json
+import threading
 
 log = logging.getLogger(__name__)
 
+# Policy for reconnecting and retrying when publishing fails.
+RETRY_POLICY = {
+    "max_retries": 3,
+    "interval_start": 0,
+    "interval_step": 1,
+    "interval_max": 5
+}
+
 
 class RabbitWorker:
+    # Process-wide pool of producers, each with a long-lived connection and channel.
+    _producer_pool = None
+    _producer_pool_lock = threading.Lock()
+
     def __init__(self):
-        self.exchange = Exchange(name=EXCHANGE,
-                                 type="topic",
-                                 durable=True)
+        self.exchange = self.create_exchange()
+
+    @staticmethod
+    def create_exchange():
+        return Exchange(name=EXCHANGE,
+                        type="topic",
+                        durable=True)
 
     @staticmethod
     def get_connection():
+        if settings.RABBITMQ_CONFIRM_PUBLISH:
+            # librabbitmq does not support publisher confirms.
+            return Connection(transport="pyamqp",
+                              hostname=settings.RABBITMQ_HOST,
+                              userid=settings.RABBITMQ_USER,
+                              password=settings.RABBITMQ_PASSWORD,
+                              transport_options={"confirm_publish": True})
         return Connection(transport="librabbitmq",
                           hostname=settings.RABBITMQ_HOST,
                           userid=settings.RABBITMQ_USER,
                           password=settings.RABBITMQ_PASSWORD)
 
+    @classmethod
+    def producer_pool(cls):
+        """
+        Returns the process-wide producer pool, creating it if necessary.
+        """
+        with cls._producer_pool_lock:
+            if cls._producer_pool is None:
+                log.debug("Creating producer pool with limit of %s", settings.RABBITMQ_POOL_LIMIT)
+                connections = cls.get_connection().Pool(limit=settings.RABBITMQ_POOL_LIMIT)
+                # Pooled producers do not declare the exchange when publishing, so declare it here
+                # in case this process has not.
+                with connections.acquire(block=True) as connection:
+                    log.debug("Declaring %s exchange", EXCHANGE)
+                    cls.create_exchange()(connection).declare()
+                cls._producer_pool = ProducerPool(connections, limit=settings.RABBITMQ_POOL_LIMIT)
+            return cls._producer_pool
+
+    @classmethod
+    def close_producer_pool(cls):
+        """
+        Closes the producer pool's connections.
+
+        A new pool will be created on next use.
+        """
+        with cls._producer_pool_lock:
+            if cls._producer_pool is not None:
+                cls._producer_pool.force_close_all()
+                cls._producer_pool.connections.force_close_all()
+                cls._producer_pool = None
+
     def declare_exchange(self):
         try:
             with self.get_connection() as connection:
@@ -29,12 +84,11 @@ class RabbitWorker:
             log.error("Error connecting to RabbitMQ to declare exchange")
 
     def send_message(self, message, routing_key):
-        with self.get_connection() as connection:
-            log.debug("Sending message to %s: %s", routing_key, json.dumps(message, indent=4))
-            connection.Producer(exchange=self.exchange).publish(message, routing_key=routing_key)
+        self.send_messages((message,), routing_key)
 
     def send_messages(self, messages, routing_key):
-        with self.get_connection() as connection:
+        with self.producer_pool().acquire(block=True) as producer:
             for message in messages:
                 log.debug("Sending message to %s: %s", routing_key, json.dumps(message, indent=4))
-                connection.Producer(exchange=self.exchange).publish(message, routing_key=routing_key)
+                producer.publish(message, exchange=self.exchange, routing_key=routing_key, retry=True,
+                                 retry_policy=RETRY_POLICY)
@@ -1,5 +1,6 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.jobstores.memory import MemoryJobStore
 from django.conf import settings
 import logging
 from jobs import collection_harvest, collection_stop
@@ -15,7 +16,9 @@ sched = BackgroundScheduler()
 
 def start_sched():
     sched.configure(jobstores={
-        'default': SQLAlchemyJobStore(url=settings.SCHEDULER_DB_URL)
+        'default': SQLAlchemyJobStore(url=settings.SCHEDULER_DB_URL),
+        # For jobs that are added on every start, so do not need to be stored.
+        'memory': MemoryJobStore()
     })
     log.info("Starting scheduler")
     sched.start()
@@ -31,6 +34,20 @@ def next_run_time(collection_pk):
         return None
 
 
+def next_run_times():
+    """
+    Returns a dict of collection pks to the next run times of their harvests.
+
+    Unlike next_run_time(), the jobs are retrieved with a single call.
+    """
+    times = {}
+    for job in sched.get_jobs():
+        # Harvest jobs are identified by the collection pk.
+        if job.id.isdigit():
+            times[int(job.id)] = job.next_run_time
+    return times
+
+
 def _job_id(collection_pk):
     return str(collection_pk)
 
@@ -127,11 +144,10 @@ def schedule_harvest_receiver(sender, **kwargs):
 
     if diff_field_changed(collection):
         if collection.is_streaming():
-            last_harvest = collection.last_harvest()
             schedule_stream_harvest(collection.id, collection.is_active,
                                     start_date=datetime.datetime.now() + datetime.timedelta(seconds=15),
                                     end_date=collection.end_date or None,
-                                    last_harvest_status=last_harvest.status if last_harvest else None)
+                                    last_harvest_status=collection.last_harvest_status)
         else:
             schedule_harvest(collection.id, collection.is_active, collection.schedule_minutes,
                              start_date=datetime.datetime.now() + datetime.timedelta(seconds=15),
@@ -0,0 +1,250 @@
+import codecs
+import logging
+import os
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Collection, Seed, SeedImport, history_bulk_create
+from .sched import sched
+from .utils import clean_token, clean_blogname
+
+log = logging.getLogger(__name__)
+
+
+# Maximum number of errors reported when validating a file of seeds
+MAX_SEED_FILE_ERRORS = 10
+
+# Id of the scheduler job that runs seed imports
+SEED_IMPORT_JOB_ID = "seed_imports"
+
+
+def _validate_twitter_user(seeds_type, token):
+    if seeds_type == "token" and token.isdigit():
+        return "Screen names may not be numeric"
+    if seeds_type == "uid" and not token.isdigit():
+        return "UIDs must be numeric"
+    return None
+
+
+# Harvest types to functions that return an error message for an invalid seed
+SEED_VALIDATORS = {
+    Collection.TWITTER_USER_TIMELINE: _validate_twitter_user
+}
+
+
+def clean_seed_token(harvest_type, token):
+    """
+    Cleans a seed token or uid for a harvest type.
+    """
+    if harvest_type == Collection.TUMBLR_BLOG_POSTS:
+        return clean_blogname(token)
+    return clean_token(token)
+
+
+def validate_seed_token(harvest_type, seeds_type, token):
+    """
+    Validates a cleaned seed token or uid for a harvest type.
+
+    :return: an error message or None if valid
+    """
+    validator = SEED_VALIDATORS.get(harvest_type)
+    return validator(seeds_type, token) if validator and token else None
+
+
+def save_seed_file(seed_file, path, harvest_type, seeds_type, max_errors=MAX_SEED_FILE_ERRORS):
+    """
+    Validates a file of seeds, one per line, while writing it to path.
+
+    The file is read line by line, so it is never held in memory. Validation
+    stops after max_errors errors.
+
+    :param seed_file: a file object, e.g., an uploaded file
+    :return: list of error messages. If there are errors, the file is not written.
+    """
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    errors = []
+    with open(path, "wb") as f:
+        for line_number, line in enumerate(seed_file, 1):
+            try:
+                token = clean_seed_token(harvest_type, line.decode("utf-8"))
+                error = validate_seed_token(harvest_type, seeds_type, token)
+                if error:
+                    errors.append(u"Line {}: {} ({}).".format(line_number, error, token))
+            except UnicodeDecodeError:
+                errors.append("Line {}: Must be UTF-8 text.".format(line_number))
+            if len(errors) == max_errors:
+                break
+            f.write(line)
+    if errors:
+        os.remove(path)
+    return errors
+
+
+def import_seeds(collection, tokens, seeds_type, history_note="", progress=None, batch_size=500):
+    """
+    Adds seeds to a collection, skipping seeds that the collection already has.
+
+    The collection's existing seeds are retrieved once and the new seeds are
+    created, along with their historical records, in batches. Each batch is
+    committed separately, unless called within a transaction.
+
+    :param collection: the collection
+    :param tokens: iterable of tokens or uids, e.g., the lines of a file
+    :param seeds_type: token or uid
+    :param history_note: the history note for the new seeds
+    :param progress: function called with the number of tokens processed and seeds added after each batch
+    :param batch_size: number of seeds per batch
+    :return: the number of seeds added
+    """
+    field = "uid" if seeds_type == "uid" else "token"
+    existing_tokens = set(Seed.objects.filter(collection=collection).values_list(field, flat=True))
+    token_count = 0
+    seed_count = 0
+    seeds = []
+    for token in tokens:
+        token_count += 1
+        token = clean_seed_token(collection.harvest_type, token)
+        if not token:
+            continue
+        if token in existing_tokens:
+            log.debug("Skipping creating seed %s for collection %s since it exists", token, collection.pk)
+            continue
+        existing_tokens.add(token)
+        seeds.append(Seed(collection=collection, history_note=history_note, **{field: token}))
+        if len(seeds) == batch_size:
+            seed_count += _create_seeds(collection, seeds)
+            seeds = []
+            if progress is not None:
+                progress(token_count, seed_count)
+    seed_count += _create_seeds(collection, seeds)
+    if progress is not None:
+        progress(token_count, seed_count)
+    return seed_count
+
+
+def _create_seeds(collection, seeds):
+    if seeds:
+        log.debug("Creating %s seeds for collection %s", len(seeds), collection.pk)
+        with transaction.atomic():
+            history_bulk_create(seeds, "seed_id")
+    return len(seeds)
+
+
+def create_seed_import(collection, user, seed_file, seeds_type, history_note=""):
+    """
+    Validates and saves a file of seeds and requests adding them to a collection in the background.
+
+    :return: the seed import and a list of error messages. If there are errors, the seed import is None.
+    """
+    seed_import = SeedImport.objects.create(collection=collection, user=user, seeds_type=seeds_type,
+                                            history_note=history_note)
+    errors = save_seed_file(seed_file, seed_import.path, collection.harvest_type, seeds_type)
+    if errors:
+        seed_import.delete()
+        return None, errors
+    start_seed_import(seed_import)
+    return seed_import, []
+
+
+def start_seed_import(seed_import):
+    """
+    Runs the scheduler's seed import job now rather than at its next interval.
+
+    The seed import is already requested, so it is run by the job even if the
+    scheduler is not running in this process.
+    """
+    if sched.running and sched.get_job(SEED_IMPORT_JOB_ID) is not None:
+        log.debug("Running seed import job for seed import %s", seed_import.seed_import_id)
+        sched.modify_job(SEED_IMPORT_JOB_ID, next_run_time=datetime.now())
+
+
+def run_seed_imports():
+    """
+    Runs requested seed imports, oldest first, until there are none left.
+
+    Run by the scheduler.
+
+    :return: the number of seed imports run
+    """
+    fail_stale_seed_imports()
+    count = 0
+    while True:
+        seed_import = SeedImport.objects.filter(status=SeedImport.REQUESTED).order_by("date_requested", "id").first()
+        if seed_import is None:
+            return count
+        if run_seed_import(seed_import.pk):
+            count += 1
+
+
+def run_seed_import(seed_import_pk):
+    """
+    Adds the seeds in a seed import's file to its collection, recording progress.
+
+    The file is deleted when done. The seed import is only run if it is requested,
+    so that it is not run twice.
+
+    :return: True if the seed import was run
+    """
+    date_started = timezone.now()
+    if not SeedImport.objects.filter(pk=seed_import_pk, status=SeedImport.REQUESTED).update(
+            status=SeedImport.RUNNING, date_started=date_started, date_updated=date_started):
+        log.debug("Skipping seed import %s since it is not requested", seed_import_pk)
+        return False
+    seed_import = SeedImport.objects.select_related("collection").get(pk=seed_import_pk)
+    log.info("Running seed import %s", seed_import.seed_import_id)
+
+    def progress(lines_processed, seeds_added):
+        SeedImport.objects.filter(pk=seed_import_pk).update(lines_processed=lines_processed, seeds_added=seeds_added,
+                                                            date_updated=timezone.now())
+
+    try:
+        with codecs.open(seed_import.path, encoding="utf-8") as tokens:
+            seeds_added = import_seeds(seed_import.collection, tokens, seed_import.seeds_type,
+                                       history_note=seed_import.history_note, progress=progress)
+        seed_import.refresh_from_db()
+        seed_import.status = SeedImport.SUCCESS
+        log.info("Seed import %s added %s seeds", seed_import.seed_import_id, seeds_added)
+    except Exception, ex:
+        log.exception("Seed import %s failed", seed_import.seed_import_id)
+        seed_import.refresh_from_db()
+        seed_import.status = SeedImport.FAILURE
+        seed_import.errors = [str(ex)]
+    finally:
+        seed_import.date_ended = timezone.now()
+        seed_import.save()
+        if os.path.exists(seed_import.path):
+            os.remove(seed_import.path)
+    return True
+
+
+def fail_stale_seed_imports(seed_imports=None):
+    """
+    Marks running seed imports that have not made progress in SEED_IMPORT_STALE_SECS as failed.
+
+    If the scheduler is restarted during a seed import, it is otherwise left running.
+    Requested seed imports are left to be run by the scheduler.
+
+    :param seed_imports: queryset of seed imports to check. Default is all seed imports.
+    :return: the number of seed imports marked as failed
+    """
+    if seed_imports is None:
+        seed_imports = SeedImport.objects.all()
+    stale_seed_imports = seed_imports.filter(
+        status=SeedImport.RUNNING,
+        date_updated__lt=timezone.now() - timedelta(seconds=settings.SEED_IMPORT_STALE_SECS))
+    count = 0
+    for seed_import in stale_seed_imports:
+        # Only if it has not made progress since it was retrieved.
+        if SeedImport.objects.filter(pk=seed_import.pk, status=seed_import.status,
+                                     date_updated=seed_import.date_updated).update(
+                status=SeedImport.FAILURE, date_ended=timezone.now(), errors=["Seed import was interrupted."]):
+            log.warn("Seed import %s was interrupted", seed_import.seed_import_id)
+            count += 1
+            if os.path.exists(seed_import.path):
+                os.remove(seed_import.path)
+    return count
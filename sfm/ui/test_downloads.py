@@ -0,0 +1,130 @@
+from django.test import TestCase, RequestFactory, override_settings
+from django.conf import settings
+from .downloads import download_response, parse_ranges
+from django.utils.http import http_date
+
+import mimetypes
+import os
+import shutil
+
+
+class DownloadsTest(TestCase):
+    def setUp(self):
+        self.path = os.path.join(settings.SFM_DATA_DIR, "export")
+        os.makedirs(self.path)
+        self.filepath = os.path.join(self.path, "test.csv")
+        with open(self.filepath, "w") as f:
+            f.write("0123456789")
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        if os.path.exists(settings.SFM_DATA_DIR):
+            shutil.rmtree(settings.SFM_DATA_DIR)
+
+    def test_parse_ranges(self):
+        self.assertIsNone(parse_ranges(None, 10))
+        self.assertIsNone(parse_ranges("bytes=a-b", 10))
+        self.assertIsNone(parse_ranges("bytes=5-2", 10))
+        self.assertIsNone(parse_ranges("items=2-5", 10))
+        self.assertEqual([(2, 5)], parse_ranges("bytes=2-5", 10))
+        self.assertEqual([(2, 9)], parse_ranges("bytes=2-", 10))
+        self.assertEqual([(2, 9)], parse_ranges("bytes=2-20", 10))
+        self.assertEqual([(7, 9)], parse_ranges("bytes=-3", 10))
+        self.assertEqual([(0, 9)], parse_ranges("bytes=-20", 10))
+        self.assertEqual([(0, 1), (7, 9)], parse_ranges("bytes=0-1, -3", 10))
+        # Unsatisfiable ranges are dropped
+        self.assertEqual([(0, 1)], parse_ranges("bytes=0-1,20-", 10))
+        self.assertEqual([(0, 1)], parse_ranges("bytes=0-1,10-20", 10))
+        self.assertEqual([], parse_ranges("bytes=20-", 10))
+        self.assertEqual([], parse_ranges("bytes=10-,20-", 10))
+        self.assertEqual([], parse_ranges("bytes=10-", 10))
+        self.assertEqual([], parse_ranges("bytes=-0", 10))
+
+    def test_file(self):
+        response = download_response(self.factory.get("/"), self.filepath, "test.csv")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("attachment; filename=test.csv", response["Content-Disposition"])
+        self.assertEqual("10", response["Content-Length"])
+        self.assertEqual("bytes", response["Accept-Ranges"])
+        self.assertEqual("0123456789", b"".join(response.streaming_content))
+
+    def test_file_range(self):
+        response = download_response(self.factory.get("/", HTTP_RANGE="bytes=2-5"), self.filepath, "test.csv")
+        self.assertEqual(206, response.status_code)
+        self.assertEqual("bytes 2-5/10", response["Content-Range"])
+        self.assertEqual("4", response["Content-Length"])
+        self.assertEqual("2345", b"".join(response.streaming_content))
+
+    def test_file_range_not_satisfiable(self):
+        response = download_response(self.factory.get("/", HTTP_RANGE="bytes=20-"), self.filepath, "test.csv")
+        self.assertEqual(416, response.status_code)
+        self.assertEqual("bytes */10", response["Content-Range"])
+        response = download_response(self.factory.get("/", HTTP_RANGE="bytes=10-"), self.filepath, "test.csv")
+        self.assertEqual(416, response.status_code)
+        self.assertEqual("bytes */10", response["Content-Range"])
+        response = download_response(self.factory.get("/", HTTP_RANGE="bytes=10-20"), self.filepath, "test.csv")
+        self.assertEqual(416, response.status_code)
+
+    def test_file_multiple_ranges(self):
+        response = download_response(self.factory.get("/", HTTP_RANGE="bytes=0-1,-3"), self.filepath, "test.csv")
+        self.assertEqual(206, response.status_code)
+        content_type = response["Content-Type"]
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        boundary = content_type[len("multipart/byteranges; boundary="):]
+        content = b"".join(response.streaming_content)
+        self.assertEqual(str(len(content)), response["Content-Length"])
+        part_content_type = mimetypes.guess_type(self.filepath)[0] or "application/octet-stream"
+        self.assertEqual("\r\n--{0}\r\nContent-Type: {1}\r\nContent-Range: bytes 0-1/10\r\n\r\n01"
+                         "\r\n--{0}\r\nContent-Type: {1}\r\nContent-Range: bytes 7-9/10\r\n\r\n789"
+                         "\r\n--{0}--\r\n".format(boundary, part_content_type), content)
+
+    def test_file_multiple_ranges_unsatisfiable_dropped(self):
+        response = download_response(self.factory.get("/", HTTP_RANGE="bytes=0-1,20-"), self.filepath, "test.csv")
+        self.assertEqual(206, response.status_code)
+        self.assertEqual("bytes 0-1/10", response["Content-Range"])
+        self.assertEqual("01", b"".join(response.streaming_content))
+        response = download_response(self.factory.get("/", HTTP_RANGE="bytes=10-,20-"), self.filepath, "test.csv")
+        self.assertEqual(416, response.status_code)
+
+    def test_not_modified(self):
+        response = download_response(self.factory.get("/"), self.filepath, "test.csv")
+        etag = response["ETag"]
+        last_modified = response["Last-Modified"]
+        self.assertEqual(http_date(os.path.getmtime(self.filepath)), last_modified)
+
+        response = download_response(self.factory.get("/", HTTP_IF_NONE_MATCH=etag), self.filepath, "test.csv")
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response["ETag"])
+        response = download_response(self.factory.get("/", HTTP_IF_NONE_MATCH='"other"'), self.filepath,
+                                     "test.csv")
+        self.assertEqual(200, response.status_code)
+
+        response = download_response(self.factory.get("/", HTTP_IF_MODIFIED_SINCE=last_modified), self.filepath,
+                                     "test.csv")
+        self.assertEqual(304, response.status_code)
+        response = download_response(self.factory.get("/", HTTP_IF_MODIFIED_SINCE=http_date(0)), self.filepath,
+                                     "test.csv")
+        self.assertEqual(200, response.status_code)
+
+    def test_if_range(self):
+        etag = download_response(self.factory.get("/"), self.filepath, "test.csv")["ETag"]
+        response = download_response(self.factory.get("/", HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE=etag),
+                                     self.filepath, "test.csv")
+        self.assertEqual(206, response.status_code)
+        # Changed, so whole file
+        response = download_response(self.factory.get("/", HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"other"'),
+                                     self.filepath, "test.csv")
+        self.assertEqual(200, response.status_code)
+
+    @override_settings(EXPORT_DOWNLOAD_BACKEND="x-accel-redirect", EXPORT_DOWNLOAD_ACCEL_PREFIX="/internal/")
+    def test_x_accel_redirect(self):
+        response = download_response(self.factory.get("/"), self.filepath, "test.csv")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("/internal/export/test.csv", response["X-Accel-Redirect"])
+        self.assertEqual("attachment; filename=test.csv", response["Content-Disposition"])
+        self.assertEqual(b"", response.content)
+
+    @override_settings(EXPORT_DOWNLOAD_BACKEND="x-sendfile")
+    def test_x_sendfile(self):
+        response = download_response(self.factory.get("/"), self.filepath, "test.csv")
+        self.assertEqual(self.filepath, response["X-Sendfile"])
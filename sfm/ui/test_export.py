@@ -1,9 +1,11 @@
 from django.test import TestCase
-from mock import MagicMock, patch
-from .export import request_export
-from .models import Collection, CollectionSet, Seed, Credential, Group, User, Export
-from .rabbit import RabbitWorker
+from django.conf import settings
+from .export import request_export, scan_export_files, create_export_manifest, export_fileinfos, \
+    checksum_export_manifests
+from .models import Collection, CollectionSet, Seed, Credential, Group, User, Export, OutboxMessage
 import datetime
+import os
+import shutil
 from tzlocal import get_localzone
 import iso8601
 
@@ -22,11 +24,7 @@ class ExportTests(TestCase):
         self.seed1 = Seed.objects.create(collection=self.collection, uid="test_uid")
         self.seed2 = Seed.objects.create(collection=self.collection, uid="test_uid2")
 
-    @patch("ui.export.RabbitWorker", autospec=True)
-    def test_collection_export(self, mock_rabbit_worker_class):
-        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
-        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
-
+    def test_collection_export(self):
         export = Export.objects.create(user=self.user,
                                        export_type="test_type",
                                        export_format="json",
@@ -40,10 +38,9 @@ class ExportTests(TestCase):
 
         request_export(export)
 
-        # Export start message sent
-        name, args, kwargs = mock_rabbit_worker.mock_calls[0]
-        self.assertEqual("send_message", name)
-        message = args[0]
+        # Export start message queued
+        outbox_message = OutboxMessage.objects.get()
+        message = outbox_message.message
         self.assertEqual(message["id"], export.export_id)
         self.assertEqual(message["path"], export.path)
         self.assertEqual(message["type"], export.export_type)
@@ -54,13 +51,9 @@ class ExportTests(TestCase):
         self.assertEqual(iso8601.parse_date(message["harvest_date_start"]), export.harvest_date_start)
         self.assertEqual(iso8601.parse_date(message["harvest_date_end"]), export.harvest_date_end)
         self.assertEqual(message["collection"]["id"], export.collection.collection_id)
-        self.assertEqual("export.start.test_platform.test_type", args[1])
-
-    @patch("ui.export.RabbitWorker", autospec=True)
-    def test_seed_export(self, mock_rabbit_worker_class):
-        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
-        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
+        self.assertEqual("export.start.test_platform.test_type", outbox_message.routing_key)
 
+    def test_seed_export(self):
         export = Export.objects.create(user=self.user,
                                        export_type="test_type")
         export.seeds.add(self.seed1)
@@ -69,10 +62,9 @@ class ExportTests(TestCase):
 
         request_export(export)
 
-        # Export start message sent
-        name, args, kwargs = mock_rabbit_worker.mock_calls[0]
-        self.assertEqual("send_message", name)
-        message = args[0]
+        # Export start message queued
+        outbox_message = OutboxMessage.objects.get()
+        message = outbox_message.message
         self.assertEqual(message["id"], export.export_id)
         self.assertEqual(message["path"], export.path)
         self.assertEqual(message["type"], export.export_type)
@@ -84,4 +76,57 @@ class ExportTests(TestCase):
         self.assertTrue("harvest_date_end" not in message)
         self.assertListEqual(message["seeds"], [{"id": self.seed1.seed_id, "uid": self.seed1.uid},
                                                 {"id": self.seed2.seed_id, "uid": self.seed2.uid}])
-        self.assertEqual("export.start.test_platform.test_type", args[1])
\ No newline at end of file
+        self.assertEqual("export.start.test_platform.test_type", outbox_message.routing_key)
+
+
+class ExportManifestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="test_user", email="test_user@test.com",
+                                                  password="test_password")
+        self.export = Export.objects.create(user=self.user, export_type="test_type", status=Export.SUCCESS)
+        os.makedirs(os.path.join(self.export.path, "subdir"))
+        for filename, content in (("test2.csv", "test2"), ("test1.csv", "test")):
+            with open(os.path.join(self.export.path, filename), "w") as f:
+                f.write(content)
+
+    def tearDown(self):
+        if os.path.exists(settings.SFM_DATA_DIR):
+            shutil.rmtree(settings.SFM_DATA_DIR)
+
+    def test_scan_export_files(self):
+        self.assertListEqual([("test1.csv", 4), ("test2.csv", 5)], scan_export_files(self.export.path))
+        self.assertListEqual([], scan_export_files(os.path.join(self.export.path, "missing")))
+
+    def test_create_export_manifest(self):
+        self.assertListEqual([
+            {"filename": "test1.csv", "bytes": 4,
+             "mtime": os.path.getmtime(os.path.join(self.export.path, "test1.csv"))},
+            {"filename": "test2.csv", "bytes": 5,
+             "mtime": os.path.getmtime(os.path.join(self.export.path, "test2.csv"))}
+        ], create_export_manifest(self.export.path))
+        # Directory not created yet
+        self.assertIsNone(create_export_manifest(os.path.join(self.export.path, "missing")))
+
+    def test_export_fileinfos(self):
+        # No manifest
+        self.assertListEqual([("test1.csv", 4), ("test2.csv", 5)], export_fileinfos(self.export))
+
+        self.export.manifest = [{"filename": "test3.csv", "bytes": 6, "sha1": "abc"}]
+        self.export.save()
+        self.assertListEqual([("test3.csv", 6)], export_fileinfos(Export.objects.get(pk=self.export.pk)))
+
+    def test_checksum_export_manifests(self):
+        self.export.manifest = create_export_manifest(self.export.path)
+        self.export.save()
+        # Changed since the manifest was created
+        with open(os.path.join(self.export.path, "test2.csv"), "a") as f:
+            f.write("changed")
+
+        self.assertEqual(1, checksum_export_manifests())
+
+        export = Export.objects.get(pk=self.export.pk)
+        self.assertTrue(export.manifest_checksummed)
+        self.assertEqual("a94a8fe5ccb19ba61c4c0873d391e987982fbbd3", export.manifest[0]["sha1"])
+        self.assertNotIn("sha1", export.manifest[1])
+        # Already checksummed
+        self.assertEqual(0, checksum_export_manifests())
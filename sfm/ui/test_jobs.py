@@ -1,10 +1,8 @@
 from django.test import TestCase
 from django.conf import settings
 import json
-from mock import MagicMock, patch
 from .jobs import collection_harvest, collection_stop
-from .models import Collection, CollectionSet, Seed, Credential, Group, User, Harvest
-from .rabbit import RabbitWorker
+from .models import Collection, CollectionSet, Seed, Credential, Group, User, Harvest, OutboxMessage
 
 
 class StartJobsTests(TestCase):
@@ -18,8 +16,7 @@ class StartJobsTests(TestCase):
                                                     token=json.dumps(self.credential_token))
         self.harvest_options = {"test_option": "test_value"}
 
-    @patch("ui.jobs.RabbitWorker", autospec=True)
-    def test_collection_harvest(self, mock_rabbit_worker_class):
+    def test_collection_harvest(self):
         collection = Collection.objects.create(collection_set=self.collection_set, credential=self.credential,
                                                harvest_type=Collection.TWITTER_USER_TIMELINE, name="test_collection",
                                                harvest_options=json.dumps(self.harvest_options), is_active=True)
@@ -29,15 +26,11 @@ class StartJobsTests(TestCase):
         # Creating Inactive seed which will be ignored from harvest
         Seed.objects.create(collection=collection, uid="test_uid4", seed_id="4", is_active=False)
 
-        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
-        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
-
         collection_harvest(collection.id)
 
-        # Harvest start message sent
-        name, args, kwargs = mock_rabbit_worker.mock_calls[0]
-        self.assertEqual("send_message", name)
-        message = args[0]
+        # Harvest start message queued
+        outbox_message = OutboxMessage.objects.get()
+        message = outbox_message.message
         self.assertTrue(message["collection_set"]["id"])
         self.assertEqual(
             "{}/collection_set/{}/{}".format(settings.SFM_DATA_DIR, self.collection_set.collection_set_id,
@@ -49,7 +42,7 @@ class StartJobsTests(TestCase):
         self.assertDictEqual({"token": "test_token3", "uid": "test_uid3", "id": "3"}, message["seeds"][2])
         self.assertEqual(Collection.TWITTER_USER_TIMELINE, message["type"])
         self.assertTrue(message["id"])
-        self.assertEqual("harvest.start.test_platform.twitter_user_timeline", args[1])
+        self.assertEqual("harvest.start.test_platform.twitter_user_timeline", outbox_message.routing_key)
 
         # Harvest model object created
         harvest = Harvest.objects.get(harvest_id=message["id"])
@@ -58,30 +51,27 @@ class StartJobsTests(TestCase):
         self.assertEqual(Harvest.REQUESTED, harvest.status)
         self.assertEqual(Collection.TWITTER_USER_TIMELINE, harvest.harvest_type)
 
-    @patch("ui.jobs.RabbitWorker", autospec=True)
-    def test_missing_collection_harvest(self, mock_rabbit_worker_class):
-        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
-        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
+        # Collection harvest state updated
+        collection = Collection.objects.get(pk=collection.pk)
+        self.assertEqual(harvest, collection.latest_harvest)
+        self.assertEqual(Harvest.REQUESTED, collection.last_harvest_status)
+        self.assertEqual(1, collection.harvest_count)
 
+    def test_missing_collection_harvest(self):
         # Error should be logged and nothing happens
         collection_harvest(1234567)
-        mock_rabbit_worker.assert_not_called()
+        self.assertFalse(OutboxMessage.objects.exists())
 
-    @patch("ui.jobs.RabbitWorker", autospec=True)
-    def test_collection_without_seeds_harvest(self, mock_rabbit_worker_class):
+    def test_collection_without_seeds_harvest(self):
         collection = Collection.objects.create(collection_set=self.collection_set, credential=self.credential,
                                          harvest_type=Collection.TWITTER_SAMPLE, name="test_collection",
                                          harvest_options=json.dumps(self.harvest_options), is_active=True)
 
-        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
-        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
-
         collection_harvest(collection.id)
 
-        # Harvest start message sent
-        name, args, kwargs = mock_rabbit_worker.mock_calls[0]
-        self.assertEqual("send_message", name)
-        message = args[0]
+        # Harvest start message queued
+        outbox_message = OutboxMessage.objects.get()
+        message = outbox_message.message
         self.assertTrue(message["collection_set"]["id"])
         self.assertEqual(
             "{}/collection_set/{}/{}".format(settings.SFM_DATA_DIR, self.collection_set.collection_set_id,
@@ -91,7 +81,7 @@ class StartJobsTests(TestCase):
         self.assertFalse("seeds" in message)
         self.assertEqual(Collection.TWITTER_SAMPLE, message["type"])
         self.assertTrue(message["id"])
-        self.assertEqual("harvest.start.test_platform.twitter_sample", args[1])
+        self.assertEqual("harvest.start.test_platform.twitter_sample", outbox_message.routing_key)
 
         # Harvest model object created
         harvest = Harvest.objects.get(harvest_id=message["id"])
@@ -99,32 +89,24 @@ class StartJobsTests(TestCase):
         self.assertEqual(collection, harvest.collection)
         self.assertEqual(Harvest.REQUESTED, harvest.status)
 
-    @patch("ui.jobs.RabbitWorker", autospec=True)
-    def test_missing_seeds(self, mock_rabbit_worker_class):
+    def test_missing_seeds(self):
         collection = Collection.objects.create(collection_set=self.collection_set, credential=self.credential,
                                                harvest_type=Collection.TWITTER_USER_TIMELINE, name="test_collection",
                                                harvest_options=json.dumps(self.harvest_options), is_active=True)
 
-        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
-        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
-
         # Error should be logged and nothing happens
         collection_harvest(collection.id)
-        mock_rabbit_worker.assert_not_called()
+        self.assertFalse(OutboxMessage.objects.exists())
 
-    @patch("ui.jobs.RabbitWorker", autospec=True)
-    def test_wrong_number_of_seeds(self, mock_rabbit_worker_class):
+    def test_wrong_number_of_seeds(self):
         collection = Collection.objects.create(collection_set=self.collection_set, credential=self.credential,
                                                harvest_type=Collection.TWITTER_SAMPLE, name="test_collection",
                                                harvest_options=json.dumps(self.harvest_options), is_active=True)
         Seed.objects.create(collection=collection, token="test_token1")
 
-        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
-        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
-
         # Error should be logged and nothing happens
         collection_harvest(collection.id)
-        mock_rabbit_worker.assert_not_called()
+        self.assertFalse(OutboxMessage.objects.exists())
 
 
 class StopJobsTests(TestCase):
@@ -143,34 +125,26 @@ class StopJobsTests(TestCase):
         self.historical_collection = self.collection.history.all()[0]
         self.historical_credential = self.historical_collection.credential.history.all()[0]
 
-    @patch("ui.jobs.RabbitWorker", autospec=True)
-    def test_stop_harvest(self, mock_rabbit_worker_class):
+    def test_stop_harvest(self):
         harvest = Harvest.objects.create(harvest_type=Collection.TWITTER_SAMPLE,
                                          collection=self.collection,
                                          historical_collection=self.historical_collection,
                                          historical_credential=self.historical_credential)
-
-        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
-        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
+        self.collection.update_harvest_state(harvest, created=True)
 
         collection_stop(self.collection.id)
 
-        # Harvest stop message sent
-        name, args, kwargs = mock_rabbit_worker.mock_calls[0]
-        self.assertEqual("send_message", name)
-        message = args[0]
+        # Harvest stop message queued
+        outbox_message = OutboxMessage.objects.get()
+        message = outbox_message.message
         self.assertEqual(message["id"], harvest.harvest_id)
-        self.assertEqual("harvest.stop.test_platform.twitter_sample", args[1])
+        self.assertEqual("harvest.stop.test_platform.twitter_sample", outbox_message.routing_key)
 
         # Harvest model object update
         harvest = Harvest.objects.get(harvest_id=message["id"])
         self.assertEqual(Harvest.STOP_REQUESTED, harvest.status)
 
-    @patch("ui.jobs.RabbitWorker", autospec=True)
-    def test_missing_collection(self, mock_rabbit_worker_class):
-        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
-        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
-
+    def test_missing_collection(self):
         # Error should be logged and nothing happens
         collection_stop(1234567)
-        mock_rabbit_worker.assert_not_called()
+        self.assertFalse(OutboxMessage.objects.exists())
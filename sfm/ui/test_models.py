@@ -1,5 +1,6 @@
 from django.test import TestCase
-from .models import User, CollectionSet, Credential, Collection, Seed, Group, Harvest, HarvestStat
+from .models import User, CollectionSet, Credential, Collection, Seed, Group, Harvest, HarvestStat, \
+    HarvestStatRollup, history_bulk_create
 import pytz
 from datetime import datetime, date
 
@@ -73,6 +74,123 @@ class CollectionTest(TestCase):
 
         self.assertEqual(harvest2, collection.last_harvest())
 
+    def test_update_harvest_state(self):
+        collection = Collection.objects.create(collection_set=self.collection_set,
+                                               name="test_collection",
+                                               harvest_type=Collection.TWITTER_SEARCH,
+                                               credential=self.credential)
+        history_count = collection.history.count()
+
+        harvest1 = Harvest.objects.create(collection=collection, status=Harvest.SUCCESS,
+                                          date_ended=datetime(2016, 5, 20, tzinfo=pytz.utc))
+        harvest2 = Harvest.objects.create(collection=collection, status=Harvest.SUCCESS,
+                                          date_ended=datetime(2016, 5, 21, tzinfo=pytz.utc))
+        failed_harvest = Harvest.objects.create(collection=collection, status=Harvest.FAILURE,
+                                                date_ended=datetime(2016, 5, 22, tzinfo=pytz.utc))
+        collection.update_harvest_state(harvest2)
+        # Out of order
+        collection.update_harvest_state(harvest1)
+        collection.update_harvest_state(failed_harvest)
+
+        self.assertEqual(datetime(2016, 5, 21, tzinfo=pytz.utc), collection.last_success_date)
+        self.assertEqual(datetime(2016, 5, 21, tzinfo=pytz.utc),
+                         Collection.objects.get(pk=collection.pk).last_success_date)
+        # No historical record
+        self.assertEqual(history_count, collection.history.count())
+
+    def test_update_harvest_state_created(self):
+        collection = Collection.objects.create(collection_set=self.collection_set,
+                                               name="test_collection",
+                                               harvest_type=Collection.TWITTER_SEARCH,
+                                               credential=self.credential)
+        harvest = Harvest.objects.create(collection=collection)
+        collection.update_harvest_state(harvest, created=True)
+        web_harvest = Harvest.objects.create(collection=collection, harvest_type="web", parent_harvest=harvest)
+        collection.update_harvest_state(web_harvest, created=True)
+        harvest.status = Harvest.RUNNING
+        harvest.save()
+        collection.update_harvest_state(harvest)
+
+        collection = Collection.objects.get(pk=collection.pk)
+        self.assertEqual(harvest, collection.latest_harvest)
+        self.assertEqual(Harvest.RUNNING, collection.last_harvest_status)
+        self.assertEqual(2, collection.harvest_count)
+        self.assertIsNone(collection.last_success_date)
+
+    def test_save_keeps_harvest_state(self):
+        collection = Collection.objects.create(collection_set=self.collection_set,
+                                               name="test_collection",
+                                               harvest_type=Collection.TWITTER_SEARCH,
+                                               credential=self.credential)
+        stale_collection = Collection.objects.get(pk=collection.pk)
+        harvest = Harvest.objects.create(collection=collection)
+        collection.update_harvest_state(harvest, created=True)
+
+        stale_collection.name = "changed_collection"
+        stale_collection.save()
+
+        collection = Collection.objects.get(pk=collection.pk)
+        self.assertEqual("changed_collection", collection.name)
+        self.assertEqual(harvest, collection.latest_harvest)
+        self.assertEqual(1, collection.harvest_count)
+
+    def test_refresh_harvest_state(self):
+        collection = Collection.objects.create(collection_set=self.collection_set,
+                                               name="test_collection",
+                                               harvest_type=Collection.TWITTER_SEARCH,
+                                               credential=self.credential)
+        Harvest.objects.create(collection=collection, status=Harvest.SUCCESS,
+                               date_requested=datetime(2016, 5, 20, tzinfo=pytz.utc),
+                               date_ended=datetime(2016, 5, 20, 1, tzinfo=pytz.utc))
+        harvest2 = Harvest.objects.create(collection=collection, status=Harvest.FAILURE,
+                                          date_requested=datetime(2016, 5, 21, tzinfo=pytz.utc))
+        Harvest.objects.create(collection=collection, harvest_type="web", parent_harvest=harvest2,
+                               date_requested=datetime(2016, 5, 21, 1, tzinfo=pytz.utc))
+
+        collection.refresh_harvest_state()
+
+        collection = Collection.objects.get(pk=collection.pk)
+        self.assertEqual(harvest2, collection.latest_harvest)
+        self.assertEqual(Harvest.FAILURE, collection.last_harvest_status)
+        self.assertEqual(3, collection.harvest_count)
+        self.assertEqual(datetime(2016, 5, 20, 1, tzinfo=pytz.utc), collection.last_success_date)
+
+    def test_harvest_state_success_date(self):
+        collection = Collection.objects.create(collection_set=self.collection_set,
+                                               name="test_collection",
+                                               harvest_type=Collection.TWITTER_SEARCH,
+                                               credential=self.credential)
+        # No date ended
+        harvest = Harvest.objects.create(collection=collection, status=Harvest.SUCCESS,
+                                         date_requested=datetime(2016, 5, 20, tzinfo=pytz.utc),
+                                         date_started=datetime(2016, 5, 20, 1, tzinfo=pytz.utc))
+        collection.update_harvest_state(harvest, created=True)
+        updated_success_date = Collection.objects.get(pk=collection.pk).last_success_date
+
+        collection.refresh_harvest_state()
+
+        self.assertEqual(datetime(2016, 5, 20, 1, tzinfo=pytz.utc), updated_success_date)
+        self.assertEqual(updated_success_date, Collection.objects.get(pk=collection.pk).last_success_date)
+
+    def test_delete_harvest_refreshes_harvest_state(self):
+        collection = Collection.objects.create(collection_set=self.collection_set,
+                                               name="test_collection",
+                                               harvest_type=Collection.TWITTER_SEARCH,
+                                               credential=self.credential)
+        harvest1 = Harvest.objects.create(collection=collection, status=Harvest.SUCCESS,
+                                          date_requested=datetime(2016, 5, 20, tzinfo=pytz.utc))
+        collection.update_harvest_state(harvest1, created=True)
+        harvest2 = Harvest.objects.create(collection=collection, status=Harvest.FAILURE,
+                                          date_requested=datetime(2016, 5, 21, tzinfo=pytz.utc))
+        collection.update_harvest_state(harvest2, created=True)
+
+        harvest2.delete()
+
+        collection = Collection.objects.get(pk=collection.pk)
+        self.assertEqual(harvest1, collection.latest_harvest)
+        self.assertEqual(Harvest.SUCCESS, collection.last_harvest_status)
+        self.assertEqual(1, collection.harvest_count)
+
     def test_stats(self):
         collection1 = Collection.objects.create(collection_set=self.collection_set,
                                                 name="test_collection",
@@ -178,6 +296,7 @@ class CollectionSetTest(TestCase):
                                           date_requested=datetime1,
                                           warcs_count=3, warcs_bytes=30)
         HarvestStat.objects.create(harvest=harvest3, item="tweets", count=7, harvest_date=self.day2)
+        HarvestStatRollup.objects.rebuild()
 
     def test_stats(self):
         stats = self.collection_set.stats()
@@ -203,6 +322,54 @@ class CollectionSetTest(TestCase):
     def test_stats_items(self):
         self.assertListEqual(['tweets', 'users'], self.collection_set.stats_items())
 
+    def test_rebuild_rollup(self):
+        HarvestStatRollup.objects.all().update(count=0)
+        HarvestStatRollup.objects.rebuild(collection_set=self.collection_set)
+
+        self.assertEqual(4, HarvestStatRollup.objects.count())
+        collection1 = Collection.objects.get(name="test_collection")
+        self.assertEqual(10, HarvestStatRollup.objects.get(collection=collection1, harvest_date=date(2016, 5, 18),
+                                                           item="tweets").count)
+        self.assertEqual(7, HarvestStatRollup.objects.get(collection=collection1, harvest_date=self.day2,
+                                                          item="tweets").count)
+
+    def test_move_collection_rollup(self):
+        collection_set2 = CollectionSet.objects.create(group=self.collection_set.group, name="test_collection_set2")
+        collection1 = Collection.objects.get(name="test_collection")
+        collection1.collection_set = collection_set2
+        collection1.save()
+
+        self.assertFalse(HarvestStatRollup.objects.filter(collection=collection1,
+                                                          collection_set=self.collection_set).exists())
+        self.assertEqual(3, HarvestStatRollup.objects.filter(collection=collection1,
+                                                             collection_set=collection_set2).count())
+        self.assertListEqual(['tweets'], self.collection_set.stats_items())
+
+    def test_with_stats(self):
+        # Collection set without harvests
+        CollectionSet.objects.create(group=self.collection_set.group, name="test_collection_set2")
+        with self.assertNumQueries(3):
+            collection_sets = list(CollectionSet.objects.order_by("name").with_stats())
+            self.assertEqual(24, collection_sets[0].stats()["tweets"])
+            self.assertEqual(6, collection_sets[0].stats()["users"])
+            self.assertListEqual(['tweets', 'users'], collection_sets[0].stats_items())
+            self.assertEqual(6, collection_sets[0].warcs_count())
+            self.assertEqual(60, collection_sets[0].warcs_bytes())
+            self.assertEqual({}, collection_sets[1].stats())
+            self.assertListEqual([], collection_sets[1].stats_items())
+            self.assertEqual(0, collection_sets[1].warcs_count())
+            self.assertIsNone(collection_sets[1].warcs_bytes())
+
+    def test_with_stats_collections(self):
+        with self.assertNumQueries(3):
+            collections = list(Collection.objects.order_by("name").with_stats())
+            self.assertEqual({"tweets": 17, "users": 6}, collections[0].stats())
+            self.assertEqual(3, collections[0].warcs_count())
+            self.assertEqual(30, collections[0].warcs_bytes())
+            self.assertEqual({"tweets": 7}, collections[1].stats())
+            self.assertEqual(3, collections[1].warcs_count())
+            self.assertEqual(30, collections[1].warcs_bytes())
+
 
 class HarvestTest(TestCase):
     def setUp(self):
@@ -233,3 +400,104 @@ class HarvestTest(TestCase):
         stats = self.harvest1.stats()
         self.assertEqual(12, stats["tweets"])
         self.assertEqual(6, stats["users"])
+
+    def test_upsert_stats(self):
+        day1 = date(2016, 5, 18)
+        day3 = date(2016, 5, 20)
+        HarvestStat.objects.upsert(self.harvest1, [(day1, "tweets", 5), (day1, "users", 8), (day3, "tweets", 9)])
+
+        self.assertEqual(4, HarvestStat.objects.filter(harvest=self.harvest1).count())
+        self.assertEqual(5, HarvestStat.objects.get(harvest=self.harvest1, harvest_date=day1, item="tweets").count)
+        self.assertEqual(8, HarvestStat.objects.get(harvest=self.harvest1, harvest_date=day1, item="users").count)
+        self.assertEqual(9, HarvestStat.objects.get(harvest=self.harvest1, harvest_date=day3, item="tweets").count)
+
+    def test_refresh_rollup(self):
+        day1 = date(2016, 5, 18)
+        day3 = date(2016, 5, 20)
+        HarvestStatRollup.objects.rebuild()
+        HarvestStat.objects.upsert(self.harvest1, [(day1, "users", 8), (day3, "tweets", 9)])
+        HarvestStatRollup.objects.refresh(self.harvest1.collection, [(day1, "users", 8), (day3, "tweets", 9)])
+
+        rollups = HarvestStatRollup.objects.filter(collection=self.harvest1.collection)
+        self.assertEqual(4, rollups.count())
+        self.assertEqual(5, rollups.get(harvest_date=day1, item="tweets").count)
+        self.assertEqual(8, rollups.get(harvest_date=day1, item="users").count)
+        self.assertEqual(9, rollups.get(harvest_date=day3, item="tweets").count)
+        self.assertEqual(self.harvest1.collection.collection_set, rollups.get(harvest_date=day3).collection_set)
+
+    def test_refresh_rollup_portable(self):
+        day1 = date(2016, 5, 18)
+        day3 = date(2016, 5, 20)
+        HarvestStatRollup.objects.rebuild()
+        HarvestStat.objects.upsert(self.harvest1, [(day1, "users", 8), (day3, "tweets", 9)])
+        collection = self.harvest1.collection
+        # Created by a concurrent refresh
+        HarvestStatRollup.objects.create(collection_set=collection.collection_set, collection=collection,
+                                         harvest_date=day3, item="tweets", count=1)
+        HarvestStatRollup.objects._refresh_portable(collection, {day1, day3}, {"users", "tweets"},
+                                                    {(day1, "users"): 8, (day3, "tweets"): 9})
+
+        rollups = HarvestStatRollup.objects.filter(collection=collection)
+        self.assertEqual(4, rollups.count())
+        self.assertEqual(8, rollups.get(harvest_date=day1, item="users").count)
+        self.assertEqual(9, rollups.get(harvest_date=day3, item="tweets").count)
+
+    def test_upsert_stats_portable(self):
+        day1 = date(2016, 5, 18)
+        day3 = date(2016, 5, 20)
+        HarvestStat.objects._upsert_portable(self.harvest1, [(day1, "users", 8), (day3, "tweets", 9)])
+
+        self.assertEqual(4, HarvestStat.objects.filter(harvest=self.harvest1).count())
+        self.assertEqual(8, HarvestStat.objects.get(harvest=self.harvest1, harvest_date=day1, item="users").count)
+        self.assertEqual(9, HarvestStat.objects.get(harvest=self.harvest1, harvest_date=day3, item="tweets").count)
+
+
+class HistoryTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser(username="test_user", email="test_user@test.com",
+                                             password="test_password")
+        group = Group.objects.create(name="test_group")
+        collection_set = CollectionSet.objects.create(group=group, name="test_collection_set")
+        credential = Credential.objects.create(user=user, platform="test_platform", token="{}")
+        self.collection = Collection.objects.create(collection_set=collection_set, name="test_collection",
+                                                    harvest_type=Collection.TWITTER_USER_TIMELINE,
+                                                    credential=credential)
+        Seed.objects.create(collection=self.collection, token="test_token", seed_id="1")
+
+    def test_history_save(self):
+        seed = Seed.objects.get(seed_id="1")
+        # Not a diff field, so only an update
+        seed.is_valid = False
+        with self.assertNumQueries(1):
+            seed.save()
+        self.assertEqual(1, seed.history.count())
+
+        # Update and historical record
+        seed.token = "changed_token"
+        with self.assertNumQueries(2):
+            seed.save()
+        self.assertEqual(2, seed.history.count())
+
+        # Compared against the values when last saved
+        seed.history_note = "No change"
+        seed.save()
+        self.assertEqual(2, seed.history.count())
+
+    def test_history_save_foreign_key(self):
+        collection = Collection.objects.get(pk=self.collection.pk)
+        collection.collection_set = CollectionSet.objects.create(group=collection.collection_set.group,
+                                                                 name="test_collection_set2")
+        collection.save()
+        self.assertEqual(2, collection.history.count())
+
+    def test_history_bulk_create(self):
+        new_seeds = [Seed(collection=self.collection, token="test_token{}".format(i)) for i in range(3)]
+        seeds = history_bulk_create(new_seeds, "seed_id", batch_size=2)
+
+        self.assertEqual(3, len(seeds))
+        self.assertTrue(all(seed.pk for seed in seeds))
+        for seed in seeds:
+            self.assertEqual(1, seed.history.count())
+            historical_seed = seed.history.first()
+            self.assertEqual("+", historical_seed.history_type)
+            self.assertEqual(seed.token, historical_seed.token)
@@ -1,8 +1,14 @@
 from django.test import TestCase
-from .notifications import _should_send_email, _create_email, _create_context
-from .models import User, Group, CollectionSet, Credential, Collection, Harvest, HarvestStat
+from .notifications import _create_email, _create_context, _collection_stats, _email_users, \
+    send_user_harvest_emails, _send_emails_with_connection
+from .models import User, Group, CollectionSet, Credential, Collection, Harvest, HarvestStat, HarvestStatRollup
 import datetime
 from collections import OrderedDict
+from smtplib import SMTPException
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.smtp import EmailBackend
+from mock import patch, MagicMock
 
 
 class NotificationTests(TestCase):
@@ -82,32 +88,41 @@ class NotificationTests(TestCase):
                                    harvest_date=today + datetime.timedelta(days=-35),
                                    item="test_type1",
                                    count=11111)
+        HarvestStatRollup.objects.rebuild()
 
-    def test_should_send_email_no_email_address(self):
-        self.assertFalse(_should_send_email(self.user_no_email, date=datetime.date.today()))
+    @staticmethod
+    def _is_email_user(user, date=None):
+        return user in _email_users(users=[user], date=date)
 
-    def test_should_send_email_none(self):
+    def test_email_users_no_email_address(self):
+        self.assertFalse(self._is_email_user(self.user_no_email, date=datetime.date.today()))
+
+    def test_email_users_none(self):
         self.user1.email_frequency = User.NONE
-        self.assertFalse(_should_send_email(self.user1))
+        self.user1.save()
+        self.assertFalse(self._is_email_user(self.user1))
 
-    def test_should_send_email_daily(self):
+    def test_email_users_daily(self):
         self.user1.email_frequency = User.DAILY
-        self.assertTrue(_should_send_email(self.user1))
+        self.user1.save()
+        self.assertTrue(self._is_email_user(self.user1))
 
-    def test_should_send_email_weekly(self):
+    def test_email_users_weekly(self):
         self.user1.email_frequency = User.WEEKLY
+        self.user1.save()
         # If it is Sunday
-        self.assertTrue(_should_send_email(self.user1, date=datetime.date(2016, 9, 4)))
-        self.assertFalse(_should_send_email(self.user1, date=datetime.date(2016, 9, 5)))
+        self.assertTrue(self._is_email_user(self.user1, date=datetime.date(2016, 9, 4)))
+        self.assertFalse(self._is_email_user(self.user1, date=datetime.date(2016, 9, 5)))
 
-    def test_should_send_email_monthly(self):
+    def test_email_users_monthly(self):
         self.user1.email_frequency = User.MONTHLY
+        self.user1.save()
         # If it is the 1st
-        self.assertTrue(_should_send_email(self.user1, date=datetime.date(2016, 9, 1)))
-        self.assertFalse(_should_send_email(self.user1, date=datetime.date(2016, 9, 5)))
+        self.assertTrue(self._is_email_user(self.user1, date=datetime.date(2016, 9, 1)))
+        self.assertFalse(self._is_email_user(self.user1, date=datetime.date(2016, 9, 5)))
 
-    def test_should_send_email_no_active_collections(self):
-        self.assertFalse(_should_send_email(self.user2, date=datetime.date.today()))
+    def test_email_users_no_active_collections(self):
+        self.assertFalse(self._is_email_user(self.user2, date=datetime.date.today()))
 
     def test_create_context(self):
         self.assertEqual(
@@ -147,8 +162,70 @@ class NotificationTests(TestCase):
                               'url': 'http://example.com/ui/collections/1/'})])})])},
             _create_context(self.user1, {}))
 
+    def test_collection_stats(self):
+        with self.assertNumQueries(1):
+            collection_stats = _collection_stats()
+        self.assertEqual({self.collection2.id}, set(collection_stats.keys()))
+        self.assertEqual({
+            'prev_day': 11,
+            'prev_30': 11111,
+            'last_7': 12,
+            'yesterday': 1,
+            'prev_7': 111,
+            'last_30': 1234}, collection_stats[self.collection2.id][u'test_type1'])
+
     def test_create_email(self):
         msg = _create_email(self.user1, {})
         self.assertTrue(msg.body.startswith("Here's an update on your harvests from Social Feed Manager "
                                             "(http://example.com/ui/)."))
         self.assertEqual([self.user1.email], msg.to)
+
+    def test_email_users(self):
+        self.user_no_email.email_frequency = User.DAILY
+        self.group1.user_set.add(self.user_no_email)
+        with self.assertNumQueries(1):
+            self.assertEqual([self.user1], list(_email_users()))
+
+        self.user1.email_frequency = User.WEEKLY
+        self.user1.save()
+        self.assertEqual([self.user1], list(_email_users(date=datetime.date(2016, 9, 4))))
+        self.assertEqual([], list(_email_users(date=datetime.date(2016, 9, 5))))
+        self.assertEqual([], list(_email_users(users=[self.user2], date=datetime.date(2016, 9, 4))))
+
+    def test_send_user_harvest_emails(self):
+        self.assertEqual({}, send_user_harvest_emails())
+        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual([self.user1.email], mail.outbox[0].to)
+
+    @patch("ui.notifications.get_connection")
+    def test_send_user_harvest_emails_failure(self, mock_get_connection):
+        mock_connection = MagicMock()
+        mock_connection.send_messages.side_effect = SMTPException("Mail server down")
+        mock_get_connection.return_value = mock_connection
+
+        self.assertEqual({self.user1.email: "Mail server down"}, send_user_harvest_emails())
+        self.assertTrue(mock_connection.close.called)
+
+    @patch("ui.notifications.get_connection")
+    @patch("django.core.mail.backends.smtp.smtplib.SMTP")
+    def test_send_emails_with_connection(self, mock_smtp_class, mock_get_connection):
+        mock_get_connection.return_value = EmailBackend(host="localhost", port=25)
+        msgs = [EmailMessage("Test", "Test", "sfm@example.com", ["user{}@example.com".format(i)]) for i in range(3)]
+
+        self.assertEqual({}, _send_emails_with_connection(msgs))
+        # One connection for all of the emails
+        self.assertEqual(1, mock_smtp_class.call_count)
+        self.assertEqual(3, mock_smtp_class.return_value.sendmail.call_count)
+        self.assertEqual(1, mock_smtp_class.return_value.quit.call_count)
+
+    @patch("ui.notifications.get_connection")
+    @patch("django.core.mail.backends.smtp.smtplib.SMTP")
+    def test_send_emails_with_connection_failure(self, mock_smtp_class, mock_get_connection):
+        mock_get_connection.return_value = EmailBackend(host="localhost", port=25)
+        mock_smtp_class.return_value.sendmail.side_effect = [None, SMTPException("Mail server down"), None]
+        msgs = [EmailMessage("Test", "Test", "sfm@example.com", ["user{}@example.com".format(i)]) for i in range(3)]
+
+        self.assertEqual({"user1@example.com": "Mail server down"}, _send_emails_with_connection(msgs))
+        # Reconnected after the failure
+        self.assertEqual(2, mock_smtp_class.call_count)
+        self.assertEqual(3, mock_smtp_class.return_value.sendmail.call_count)
@@ -0,0 +1,153 @@
+from django.test import TestCase
+from django.utils import timezone
+from mock import MagicMock, patch
+from .models import OutboxMessage, Harvest, Export, Collection, CollectionSet, Credential, Group, User
+from .outbox import queue_message, relay_messages, request_relay
+from .rabbit import RabbitWorker
+from datetime import timedelta
+import json
+import threading
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        queue_message({"id": "test:1"}, "harvest.start.test.test_type")
+        queue_message({"id": "test:2"}, "harvest.start.test.test_type")
+        queue_message({"id": "test:1"}, "harvest.stop.test.test_type")
+
+    @patch("ui.outbox.RabbitWorker", autospec=True)
+    def test_relay_messages(self, mock_rabbit_worker_class):
+        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
+        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
+        claimed_counts = []
+        mock_rabbit_worker.send_message.side_effect = lambda message, routing_key: claimed_counts.append(
+            OutboxMessage.objects.filter(date_claimed__isnull=False).count())
+
+        self.assertEqual(3, relay_messages(batch_size=2))
+
+        # Sent in order
+        self.assertEqual([(({"id": "test:1"}, "harvest.start.test.test_type"),),
+                          (({"id": "test:2"}, "harvest.start.test.test_type"),),
+                          (({"id": "test:1"}, "harvest.stop.test.test_type"),)],
+                         mock_rabbit_worker.send_message.call_args_list)
+        self.assertFalse(OutboxMessage.objects.exists())
+        # Batch is claimed while sending
+        self.assertEqual([2, 2, 1], claimed_counts)
+
+    @patch("ui.outbox.RabbitWorker", autospec=True)
+    def test_relay_messages_failure(self, mock_rabbit_worker_class):
+        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
+        mock_rabbit_worker.send_message.side_effect = [None, IOError("Connection refused")]
+        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
+
+        self.assertEqual(1, relay_messages(max_attempts=2))
+
+        # Stopped at failure
+        self.assertEqual(2, mock_rabbit_worker.send_message.call_count)
+        outbox_messages = list(OutboxMessage.objects.order_by("id"))
+        self.assertEqual(2, len(outbox_messages))
+        self.assertEqual(1, outbox_messages[0].attempts)
+        self.assertEqual("Connection refused", outbox_messages[0].last_error)
+        self.assertEqual(0, outbox_messages[1].attempts)
+        # Claims released
+        self.assertIsNone(outbox_messages[0].date_claimed)
+        self.assertIsNone(outbox_messages[1].date_claimed)
+
+    @patch("ui.outbox.RabbitWorker", autospec=True)
+    def test_relay_messages_message_failure(self, mock_rabbit_worker_class):
+        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
+        mock_rabbit_worker.send_message.side_effect = [ValueError("Bad message"), None]
+        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
+
+        self.assertEqual(1, relay_messages(max_attempts=2))
+
+        # Later message with the same id is held back, but other messages are sent.
+        self.assertEqual([(({"id": "test:1"}, "harvest.start.test.test_type"),),
+                          (({"id": "test:2"}, "harvest.start.test.test_type"),)],
+                         mock_rabbit_worker.send_message.call_args_list)
+        outbox_messages = list(OutboxMessage.objects.order_by("id"))
+        self.assertEqual(["harvest.start.test.test_type", "harvest.stop.test.test_type"],
+                         [outbox_message.routing_key for outbox_message in outbox_messages])
+        self.assertEqual(1, outbox_messages[0].attempts)
+        self.assertEqual("Bad message", outbox_messages[0].last_error)
+        self.assertEqual(0, outbox_messages[1].attempts)
+
+    @patch("ui.outbox.RabbitWorker", autospec=True)
+    def test_relay_messages_max_attempts(self, mock_rabbit_worker_class):
+        user = User.objects.create_superuser(username="test_user", email="test_user@test.com",
+                                             password="test_password")
+        collection_set = CollectionSet.objects.create(group=Group.objects.create(name="test_group"),
+                                                      name="test_collection_set")
+        credential = Credential.objects.create(user=user, platform="test_platform", token=json.dumps({}))
+        collection = Collection.objects.create(collection_set=collection_set, credential=credential,
+                                               harvest_type="test_type", name="test_collection",
+                                               harvest_options=json.dumps({}))
+        Harvest.objects.create(harvest_id="test:2", collection=collection, status=Harvest.REQUESTED)
+        Export.objects.create(export_id="test:3", user=user, export_type="test_type", status=Export.REQUESTED)
+        queue_message({"id": "test:3"}, "export.start.test.test_type")
+        outbox_messages = list(OutboxMessage.objects.order_by("id"))
+        OutboxMessage.objects.filter(id__in=[outbox_messages[1].id, outbox_messages[3].id]).update(attempts=1)
+
+        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
+
+        def send_message(message, routing_key):
+            if message["id"] != "test:1":
+                raise ValueError("Bad message")
+        mock_rabbit_worker.send_message.side_effect = send_message
+        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
+
+        self.assertEqual(2, relay_messages(max_attempts=2))
+
+        # Messages that reached max attempts are kept
+        self.assertEqual(2, OutboxMessage.objects.filter(attempts=2).count())
+        # And the harvest and export are failed.
+        harvest = Harvest.objects.get(harvest_id="test:2")
+        self.assertEqual(Harvest.FAILURE, harvest.status)
+        self.assertEqual([{"code": "send_message_failed", "message": "Requesting harvest failed: Bad message"}],
+                         harvest.errors)
+        export = Export.objects.get(export_id="test:3")
+        self.assertEqual(Export.FAILURE, export.status)
+        self.assertEqual([{"code": "send_message_failed", "message": "Requesting export failed: Bad message"}],
+                         export.errors)
+
+        # Not retried
+        mock_rabbit_worker_class.side_effect = [mock_rabbit_worker]
+        self.assertEqual(0, relay_messages(max_attempts=2))
+        self.assertEqual(4, mock_rabbit_worker.send_message.call_count)
+
+    @patch("ui.outbox.RabbitWorker", autospec=True)
+    def test_relay_messages_claimed(self, mock_rabbit_worker_class):
+        mock_rabbit_worker = MagicMock(spec=RabbitWorker)
+        mock_rabbit_worker_class.return_value = mock_rabbit_worker
+        outbox_message = OutboxMessage.objects.order_by("id")[0]
+        outbox_message.date_claimed = timezone.now()
+        outbox_message.save()
+
+        # Claimed by another relay
+        self.assertEqual(0, relay_messages())
+        self.assertFalse(mock_rabbit_worker.send_message.called)
+
+        # Claim expired
+        outbox_message.date_claimed = timezone.now() - timedelta(days=1)
+        outbox_message.save()
+        self.assertEqual(3, relay_messages())
+
+    @patch("ui.outbox.threading.Thread")
+    def test_request_relay_in_transaction(self, mock_thread_class):
+        # Tests run in a transaction, so the messages are not committed.
+        request_relay()
+
+        self.assertFalse(mock_thread_class.called)
+
+    @patch("ui.outbox._relay_lock", threading.Lock())
+    @patch("ui.outbox.transaction.get_connection")
+    @patch("ui.outbox.threading.Thread")
+    def test_request_relay(self, mock_thread_class, mock_get_connection):
+        mock_get_connection.return_value.in_atomic_block = False
+
+        request_relay()
+
+        self.assertTrue(mock_thread_class.return_value.start.called)
+        # The first thread has not finished, so another thread is not started.
+        request_relay()
+        self.assertEqual(1, mock_thread_class.call_count)
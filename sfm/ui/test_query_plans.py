@@ -0,0 +1,83 @@
+from django.test import TestCase
+from django.db import connection
+from .models import User, CollectionSet, Credential, Collection, Group, Harvest, HarvestStat, HarvestStatRollup, \
+    Warc
+from datetime import datetime, date
+import pytz
+import re
+
+
+class QueryPlanTest(TestCase):
+    """
+    Checks that the hot queries are answered with indexes rather than full table scans.
+    """
+
+    def setUp(self):
+        user = User.objects.create_superuser(username="test_user", email="test_user@test.com",
+                                             password="test_password")
+        group = Group.objects.create(name="test_group")
+        self.collection_set = CollectionSet.objects.create(group=group, name="test_collection_set")
+        credential = Credential.objects.create(user=user, platform="test_platform", token="{}")
+        self.collection = Collection.objects.create(collection_set=self.collection_set, credential=credential,
+                                                    harvest_type=Collection.TWITTER_SEARCH, name="test_collection")
+        self.historical_collection = self.collection.history.all()[0]
+        for i in range(1, 20):
+            harvest = Harvest.objects.create(collection=self.collection,
+                                             historical_collection=self.historical_collection,
+                                             date_requested=datetime(2016, 5, i, tzinfo=pytz.utc),
+                                             date_started=datetime(2016, 5, i, tzinfo=pytz.utc))
+            HarvestStat.objects.create(harvest=harvest, harvest_date=date(2016, 5, i), item="tweets", count=i)
+            Warc.objects.create(harvest=harvest, warc_id="warc{}".format(i), path="/sfm-data/warc{}.warc.gz".format(i),
+                                sha1="7512e1c227c29332172118f0b79b2ca75cbe8979", bytes=i,
+                                date_created=datetime(2016, 5, i, tzinfo=pytz.utc))
+        HarvestStatRollup.objects.rebuild()
+
+    def _plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # The tables are too small for the planner to prefer an index on its own.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN " + sql, params)
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexed(self, queryset, tables, ordered=False):
+        plan = self._plan(queryset)
+        plan_str = "\n".join(plan)
+        for table in tables:
+            if connection.vendor == "postgresql":
+                scan_regex = r"Seq Scan on {}\b".format(table)
+            else:
+                scan_regex = r"^SCAN (TABLE )?{}\b".format(table)
+            for line in plan:
+                self.assertIsNone(re.search(scan_regex, line.strip()),
+                                  "Full scan of {}:\n{}".format(table, plan_str))
+        if ordered:
+            sort_regex = r"\bSort\b" if connection.vendor == "postgresql" else r"TEMP B-TREE FOR ORDER BY"
+            self.assertIsNone(re.search(sort_regex, plan_str), "Sort for order by:\n{}".format(plan_str))
+
+    def test_last_harvest(self):
+        self.assertIndexed(self.collection.harvests.exclude(harvest_type="web").order_by("-date_requested")[:1],
+                           ["ui_harvest"], ordered=True)
+
+    def test_harvest_list(self):
+        self.assertIndexed(self.collection.harvests.all().order_by("-date_requested")[:15], ["ui_harvest"],
+                           ordered=True)
+
+    def test_harvest_stats(self):
+        harvest = self.collection.harvests.first()
+        self.assertIndexed(HarvestStat.objects.filter(harvest=harvest, harvest_date__gte=date(2016, 5, 1)),
+                           ["ui_harveststat"])
+
+    def test_item_stats(self):
+        self.assertIndexed(HarvestStatRollup.objects.filter(collection_set=self.collection_set, item="tweets",
+                                                            harvest_date__gte=date(2016, 5, 10)).order_by(
+            "harvest_date").values("harvest_date"), ["ui_harveststatrollup"], ordered=True)
+
+    def test_warc_filter(self):
+        self.assertIndexed(Warc.objects.filter(
+            harvest__historical_collection__collection_id=self.collection.collection_id,
+            harvest__date_started__gte=datetime(2016, 5, 10, tzinfo=pytz.utc)),
+            ["ui_warc", "ui_harvest", "ui_historicalcollection"])
@@ -0,0 +1,61 @@
+from django.test import TestCase
+from kombu import Connection, Queue, Exchange
+from mock import patch
+from .rabbit import RabbitWorker
+import uuid
+
+
+class RabbitWorkerTests(TestCase):
+    def setUp(self):
+        RabbitWorker.close_producer_pool()
+        self.worker = RabbitWorker()
+        self.connection = Connection("memory://")
+        # The memory transport keeps bindings after a queue is deleted and cannot unbind, so each
+        # test uses its own queue.
+        self.queue = Queue("test_queue_{}".format(uuid.uuid4().hex), exchange=self.worker.exchange,
+                           routing_key="test.#")(self.connection.channel())
+        self.queue.declare()
+
+    def tearDown(self):
+        RabbitWorker.close_producer_pool()
+        self.queue.delete()
+        self.connection.close()
+
+    def _received_messages(self):
+        messages = []
+        while True:
+            message = self.queue.get(no_ack=True)
+            if message is None:
+                return messages
+            messages.append(message.payload)
+
+    @patch("ui.rabbit.RabbitWorker.get_connection")
+    def test_send_message(self, mock_get_connection):
+        mock_get_connection.side_effect = lambda: Connection("memory://")
+
+        self.worker.send_message({"id": 1}, "test.message")
+        RabbitWorker().send_message({"id": 2}, "test.message")
+
+        self.assertEqual([{"id": 1}, {"id": 2}], self._received_messages())
+        # Connections are reused across messages and workers
+        self.assertEqual(1, mock_get_connection.call_count)
+
+    @patch("ui.rabbit.RabbitWorker.get_connection")
+    def test_send_messages(self, mock_get_connection):
+        mock_get_connection.side_effect = lambda: Connection("memory://")
+
+        self.worker.send_messages(({"id": i} for i in range(3)), "test.messages")
+        self.worker.send_message({"id": 3}, "other.message")
+
+        self.assertEqual([{"id": 0}, {"id": 1}, {"id": 2}], self._received_messages())
+
+    @patch("ui.rabbit.RabbitWorker.get_connection")
+    def test_producer_pool_declares_exchange(self, mock_get_connection):
+        mock_get_connection.side_effect = lambda: Connection("memory://")
+
+        with patch.object(Exchange, "declare") as mock_declare:
+            RabbitWorker.producer_pool()
+            RabbitWorker.producer_pool()
+
+        # Declared once, when the pool is created
+        mock_declare.assert_called_once_with()
@@ -1,12 +1,12 @@
 from django.test import TestCase
 import json
-from mock import patch, ANY, call
+from mock import patch, ANY, call, MagicMock
 from .models import Collection, CollectionSet, Credential, Group, User, Harvest
 from jobs import collection_harvest
 from datetime import datetime
 import pytz
 from django.db.models.signals import post_save, pre_delete
-from sched import schedule_harvest_receiver, unschedule_harvest_receiver, toggle_collection_inactive
+from sched import schedule_harvest_receiver, unschedule_harvest_receiver, toggle_collection_inactive, next_run_times
 
 
 class ScheduleTests(TestCase):
@@ -160,9 +160,10 @@ class ScheduleTests(TestCase):
         historical_collection = collection.history.all()[0]
         historical_credential = historical_collection.credential.history.all()[0]
 
-        Harvest.objects.create(collection=collection,
-                               historical_collection=historical_collection,
-                               historical_credential=historical_credential)
+        harvest = Harvest.objects.create(collection=collection,
+                                         historical_collection=historical_collection,
+                                         historical_credential=historical_credential)
+        collection.update_harvest_state(harvest, created=True)
         # Modify collection
         collection.end_date = None
         collection.is_active = False
@@ -172,3 +173,16 @@ class ScheduleTests(TestCase):
         mock_scheduler.get_job.assert_has_calls([call(str(collection_id)), call("end_{}".format(collection_id))])
         mock_scheduler.remove_job.assert_has_calls([call(str(collection_id)), call("end_{}".format(collection_id))])
         mock_collection_stop.assert_called_once_with(collection_id)
+
+    @patch("ui.sched.sched", autospec=True)
+    def test_next_run_times(self, mock_scheduler):
+        run_time = datetime(2016, 9, 4, 1, 0, tzinfo=pytz.utc)
+        end_run_time = datetime(2016, 10, 4, 1, 0, tzinfo=pytz.utc)
+        mock_scheduler.get_jobs.return_value = [
+            MagicMock(id="1", next_run_time=run_time),
+            MagicMock(id="end_1", next_run_time=end_run_time),
+            MagicMock(id="outbox_relay", next_run_time=run_time)
+        ]
+
+        self.assertEqual({1: run_time}, next_run_times())
+        mock_scheduler.get_jobs.assert_called_once_with()
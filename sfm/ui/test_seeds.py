@@ -0,0 +1,153 @@
+from django.test import TestCase
+from .models import User, CollectionSet, Credential, Collection, Seed, Group, SeedImport
+from .seeds import import_seeds, run_seed_import, run_seed_imports, save_seed_file, fail_stale_seed_imports, \
+    start_seed_import, SEED_IMPORT_JOB_ID
+from django.utils import timezone
+from datetime import timedelta
+from mock import MagicMock, call, patch
+import os
+import tempfile
+from StringIO import StringIO
+
+
+class SeedImportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="test_user", email="test_user@test.com",
+                                                  password="test_password")
+        group = Group.objects.create(name="test_group")
+        collection_set = CollectionSet.objects.create(group=group, name="test_collection_set")
+        credential = Credential.objects.create(user=self.user, platform="test_platform", token="{}")
+        self.collection = Collection.objects.create(collection_set=collection_set, name="test_collection",
+                                                    harvest_type=Collection.TWITTER_USER_TIMELINE,
+                                                    credential=credential)
+        Seed.objects.create(collection=self.collection, token="test_token1")
+
+    def test_import_seeds(self):
+        mock_progress = MagicMock()
+        self.assertEqual(3, import_seeds(self.collection,
+                                         ["test_token1", "@test_token2", "", " test_token3", "test_token2",
+                                          "test_token4"],
+                                         "token", history_note="Bulk", progress=mock_progress, batch_size=2))
+
+        seeds = Seed.objects.filter(collection=self.collection)
+        self.assertSetEqual({"test_token1", "test_token2", "test_token3", "test_token4"},
+                            set(seed.token for seed in seeds))
+        seed = seeds.get(token="test_token4")
+        self.assertEqual("Bulk", seed.history_note)
+        self.assertEqual(1, seed.history.count())
+        mock_progress.assert_has_calls([call(4, 2), call(6, 3)])
+
+    def test_import_seed_uids(self):
+        self.assertEqual(1, import_seeds(self.collection, ["123", "123"], "uid"))
+        self.assertTrue(Seed.objects.filter(collection=self.collection, uid="123", token="").exists())
+
+    def test_run_seed_import(self):
+        seed_import = SeedImport.objects.create(collection=self.collection, user=self.user, seeds_type="token")
+        if not os.path.exists(os.path.dirname(seed_import.path)):
+            os.makedirs(os.path.dirname(seed_import.path))
+        with open(seed_import.path, "w") as f:
+            f.write("test_token1\ntest_token2\ntest_token3\n")
+
+        run_seed_import(seed_import.pk)
+
+        seed_import = SeedImport.objects.get(pk=seed_import.pk)
+        self.assertEqual(SeedImport.SUCCESS, seed_import.status)
+        self.assertEqual(3, seed_import.lines_processed)
+        self.assertEqual(2, seed_import.seeds_added)
+        self.assertIsNotNone(seed_import.date_ended)
+        self.assertEqual(3, Seed.objects.filter(collection=self.collection).count())
+        self.assertFalse(os.path.exists(seed_import.path))
+
+    def test_run_seed_import_not_requested(self):
+        seed_import = SeedImport.objects.create(collection=self.collection, user=self.user, seeds_type="token",
+                                                status=SeedImport.RUNNING)
+
+        self.assertFalse(run_seed_import(seed_import.pk))
+
+        self.assertEqual(SeedImport.RUNNING, SeedImport.objects.get(pk=seed_import.pk).status)
+
+    def test_run_seed_imports(self):
+        seed_imports = []
+        for tokens in ("test_token2\n", "test_token3\n"):
+            seed_import = SeedImport.objects.create(collection=self.collection, user=self.user, seeds_type="token")
+            if not os.path.exists(os.path.dirname(seed_import.path)):
+                os.makedirs(os.path.dirname(seed_import.path))
+            with open(seed_import.path, "w") as f:
+                f.write(tokens)
+            seed_imports.append(seed_import)
+        success_seed_import = SeedImport.objects.create(collection=self.collection, user=self.user,
+                                                        seeds_type="token", status=SeedImport.SUCCESS)
+
+        self.assertEqual(2, run_seed_imports())
+
+        for seed_import in seed_imports:
+            self.assertEqual(SeedImport.SUCCESS, SeedImport.objects.get(pk=seed_import.pk).status)
+        self.assertIsNone(SeedImport.objects.get(pk=success_seed_import.pk).date_started)
+        self.assertEqual(3, Seed.objects.filter(collection=self.collection).count())
+
+    @patch("ui.seeds.sched")
+    def test_start_seed_import(self, mock_sched):
+        seed_import = SeedImport.objects.create(collection=self.collection, user=self.user, seeds_type="token")
+        mock_sched.running = True
+
+        start_seed_import(seed_import)
+
+        mock_sched.get_job.assert_called_once_with(SEED_IMPORT_JOB_ID)
+        self.assertEqual(SEED_IMPORT_JOB_ID, mock_sched.modify_job.call_args[0][0])
+        self.assertIn("next_run_time", mock_sched.modify_job.call_args[1])
+
+    @patch("ui.seeds.sched")
+    def test_start_seed_import_no_scheduler(self, mock_sched):
+        seed_import = SeedImport.objects.create(collection=self.collection, user=self.user, seeds_type="token")
+        mock_sched.running = False
+
+        start_seed_import(seed_import)
+
+        self.assertFalse(mock_sched.modify_job.called)
+        self.assertEqual(SeedImport.REQUESTED, SeedImport.objects.get(pk=seed_import.pk).status)
+
+    def test_run_seed_import_missing_file(self):
+        seed_import = SeedImport.objects.create(collection=self.collection, user=self.user, seeds_type="token")
+
+        run_seed_import(seed_import.pk)
+
+        seed_import = SeedImport.objects.get(pk=seed_import.pk)
+        self.assertEqual(SeedImport.FAILURE, seed_import.status)
+        self.assertEqual(1, len(seed_import.errors))
+
+    def test_fail_stale_seed_imports(self):
+        stale_date = timezone.now() - timedelta(days=1)
+        stale_seed_import = SeedImport.objects.create(collection=self.collection, user=self.user, seeds_type="token",
+                                                      status=SeedImport.RUNNING, date_updated=stale_date)
+        running_seed_import = SeedImport.objects.create(collection=self.collection, user=self.user,
+                                                        seeds_type="token", status=SeedImport.RUNNING)
+        success_seed_import = SeedImport.objects.create(collection=self.collection, user=self.user,
+                                                        seeds_type="token", status=SeedImport.SUCCESS,
+                                                        date_updated=stale_date)
+        # Waiting to be run by the scheduler
+        requested_seed_import = SeedImport.objects.create(collection=self.collection, user=self.user,
+                                                          seeds_type="token", date_updated=stale_date)
+
+        self.assertEqual(1, fail_stale_seed_imports())
+
+        stale_seed_import = SeedImport.objects.get(pk=stale_seed_import.pk)
+        self.assertEqual(SeedImport.FAILURE, stale_seed_import.status)
+        self.assertIsNotNone(stale_seed_import.date_ended)
+        self.assertEqual(["Seed import was interrupted."], stale_seed_import.errors)
+        self.assertEqual(SeedImport.RUNNING, SeedImport.objects.get(pk=running_seed_import.pk).status)
+        self.assertEqual(SeedImport.SUCCESS, SeedImport.objects.get(pk=success_seed_import.pk).status)
+        self.assertEqual(SeedImport.REQUESTED, SeedImport.objects.get(pk=requested_seed_import.pk).status)
+
+    def test_save_seed_file(self):
+        path = os.path.join(tempfile.mkdtemp(), "seeds")
+        self.assertEqual([], save_seed_file(StringIO("@jlittman\n\njustin_littman\n"), path,
+                                            Collection.TWITTER_USER_TIMELINE, "token"))
+        with open(path) as f:
+            self.assertEqual("@jlittman\n\njustin_littman\n", f.read())
+
+    def test_save_seed_file_invalid(self):
+        path = os.path.join(tempfile.mkdtemp(), "seeds")
+        self.assertEqual(["Line 1: Screen names may not be numeric (123).", "Line 3: Must be UTF-8 text."],
+                         save_seed_file(StringIO("123\njlittman\n\xff\n456\n"), path,
+                                        Collection.TWITTER_USER_TIMELINE, "token", max_errors=2))
+        self.assertFalse(os.path.exists(path))
@@ -1,6 +1,8 @@
 from django.test import TestCase
 from .models import CollectionSet, Credential, Group, User, Collection
-from .utils import diff_historical_object, diff_object_history, diff_field_changed
+from django.core.cache import cache
+from .utils import diff_historical_object, diff_object_history, diff_field_changed, Diff, _diff_cache_key
+from mock import patch
 
 
 class DiffTests(TestCase):
@@ -53,6 +55,46 @@ class DiffTests(TestCase):
              "is_active": (None, True)},
             diffs[1].fields)
 
+    def test_diff_object_page(self):
+        with self.assertNumQueries(1):
+            diffs = diff_object_history(self.credential, stop=1)
+        self.assertEqual(1, len(diffs))
+        self.assertDictEqual({"token": (self.original_credential_token, self.changed_credential_token)},
+                             diffs[0].fields)
+
+        diffs = diff_object_history(self.credential, start=1, stop=2)
+        self.assertEqual(1, len(diffs))
+        self.assertEqual((None, "original token"), diffs[0].fields["token"])
+
+    @patch("ui.utils.diff_historical_object")
+    def test_diff_object_cached(self, mock_diff_historical_object):
+        self.collection_set.description = "test_description"
+        self.collection_set.save()
+        mock_diff_historical_object.return_value = Diff()
+        diff_object_history(self.collection_set)
+        self.assertEqual(2, mock_diff_historical_object.call_count)
+        mock_diff_historical_object.reset_mock()
+
+        self.assertEqual(2, len(diff_object_history(self.collection_set)))
+        # Only secret fields are diffed, and there are none.
+        for call in mock_diff_historical_object.call_args_list:
+            self.assertEqual((), call[1]["fields"])
+
+    def test_diff_object_cached_secret_fields(self):
+        diff_object_history(self.credential)
+        # Token is not cached
+        self.assertEqual({}, cache.get(_diff_cache_key(self.historical_credentials[0])))
+        self.assertEqual({"name": (None, "test_credential"), "platform": (None, "test_platform"),
+                          "is_active": (None, True)}, cache.get(_diff_cache_key(self.historical_credentials[1])))
+
+        diffs = diff_object_history(self.credential)
+        self.assertDictEqual({"token": (self.original_credential_token, self.changed_credential_token)},
+                             diffs[0].fields)
+        self.assertDictEqual(
+            {"name": (None, "test_credential"), "platform": (None, "test_platform"), "token": (None, "original token"),
+             "is_active": (None, True)},
+            diffs[1].fields)
+
     def test_diff_field_changed(self):
         collection = Collection.objects.create(collection_set=self.collection_set, credential=self.credential,
                                          harvest_type="test_type", name="test_collection", is_active=True,
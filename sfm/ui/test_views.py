@@ -3,14 +3,22 @@ from django.core.urlresolvers import reverse
 from django.test import RequestFactory, TestCase, Client
 from django.conf import settings
 from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils import timezone
+from mock import patch
 
-from .models import CollectionSet, User, Credential, Seed, Collection, Export
+from .models import CollectionSet, User, Credential, Seed, Collection, Export, SeedImport
 from .views import CollectionSetListView, CollectionSetDetailView, CollectionSetUpdateView, CollectionCreateView, \
-    CollectionDetailView, SeedUpdateView, SeedCreateView, SeedDetailView, ExportDetailView, export_file, \
-    ChangeLogView, UserProfileDetailView
+    CollectionDetailView, SeedUpdateView, SeedCreateView, SeedDetailView, ExportDetailView, ExportListView, \
+    export_file, export_zip, ChangeLogView, UserProfileDetailView
 
 import os
 import shutil
+import json
+import zipfile
+from datetime import timedelta
+from StringIO import StringIO
 
 
 class CollectionSetListViewTests(TestCase):
@@ -322,6 +330,82 @@ class SeedBulkCreateViewTests(SeedTestsMixin, TestCase):
         self.assertSetEqual({'123', '45367', '9087'}, {s.uid for s in Seed.objects.filter(collection=self.collection)})
         self.assertTrue(response.url.endswith('/ui/collections/1/'))
 
+    @patch("ui.seeds.start_seed_import")
+    def test_post_file(self, mock_start_seed_import):
+        tokens_file = SimpleUploadedFile("seeds.txt", "test token4\ntest token5\n")
+        response = self.client.post(reverse("bulk_seed_create", args=[self.collection.pk]),
+                                    {'seeds_type': 'token', 'tokens_file': tokens_file})
+        seed_import = SeedImport.objects.get(collection=self.collection)
+        self.assertEqual('token', seed_import.seeds_type)
+        self.assertEqual(self.user, seed_import.user)
+        with open(seed_import.path) as f:
+            self.assertEqual("test token4\ntest token5\n", f.read())
+        os.remove(seed_import.path)
+        mock_start_seed_import.assert_called_once_with(seed_import)
+        self.assertTrue(response.url.endswith('/ui/collections/1/'))
+
+    def test_post_no_seeds(self):
+        response = self.client.post(reverse("bulk_seed_create", args=[self.collection.pk]), {'seeds_type': 'token'})
+        self.assertTrue(response.context["form"].errors)
+
+
+class SeedImportViewTests(SeedTestsMixin, TestCase):
+    def setUp(self):
+        SeedTestsMixin.setUp(self)
+        self.client = Client()
+        self.assertTrue(self.client.login(username=self.user.username, password='password'))
+
+    @patch("ui.seeds.start_seed_import")
+    def test_post(self, mock_start_seed_import):
+        response = self.client.post(reverse("seed_import_create", args=[self.collection.pk]),
+                                    {'seeds_type': 'uid', 'tokens_file': SimpleUploadedFile("seeds.txt", "123\n456\n")})
+        self.assertEqual(202, response.status_code)
+        seed_import = SeedImport.objects.get(collection=self.collection)
+        os.remove(seed_import.path)
+        mock_start_seed_import.assert_called_once_with(seed_import)
+        status = json.loads(response.content)
+        self.assertEqual(SeedImport.REQUESTED, status["status"])
+        self.assertEqual(reverse("seed_import_status", args=[seed_import.seed_import_id]), status["status_url"])
+
+    @patch("ui.seeds.start_seed_import")
+    def test_post_invalid(self, mock_start_seed_import):
+        response = self.client.post(reverse("seed_import_create", args=[self.collection.pk]),
+                                    {'seeds_type': 'uid',
+                                     'tokens_file': SimpleUploadedFile("seeds.txt", "123\njlittman\n")})
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(["Line 2: UIDs must be numeric (jlittman)."], json.loads(response.content)["errors"])
+        self.assertFalse(SeedImport.objects.exists())
+        self.assertFalse(mock_start_seed_import.called)
+
+    @patch("ui.seeds.start_seed_import")
+    def test_post_no_file(self, mock_start_seed_import):
+        response = self.client.post(reverse("seed_import_create", args=[self.collection.pk]),
+                                    {'seeds_type': 'uid', 'tokens': "98765\n"})
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(["Enter seeds or upload a file of seeds."], json.loads(response.content)["errors"])
+        self.assertFalse(Seed.objects.filter(collection=self.collection, uid="98765").exists())
+        self.assertFalse(mock_start_seed_import.called)
+
+    def test_status(self):
+        seed_import = SeedImport.objects.create(collection=self.collection, user=self.user, seeds_type="token",
+                                                status=SeedImport.RUNNING, lines_processed=10, seeds_added=5)
+        response = self.client.get(reverse("seed_import_status", args=[seed_import.seed_import_id]))
+        status = json.loads(response.content)
+        self.assertEqual(SeedImport.RUNNING, status["status"])
+        self.assertFalse(status["is_done"])
+        self.assertEqual(10, status["lines_processed"])
+        self.assertEqual(5, status["seeds_added"])
+
+    def test_status_stale(self):
+        seed_import = SeedImport.objects.create(collection=self.collection, user=self.user, seeds_type="token",
+                                                status=SeedImport.RUNNING,
+                                                date_updated=timezone.now() - timedelta(days=1))
+        response = self.client.get(reverse("seed_import_status", args=[seed_import.seed_import_id]))
+        status = json.loads(response.content)
+        self.assertEqual(SeedImport.FAILURE, status["status"])
+        self.assertTrue(status["is_done"])
+        self.assertEqual(["Seed import was interrupted."], status["errors"])
+
 
 class ExportDetailViewTests(TestCase):
     def setUp(self):
@@ -396,6 +480,47 @@ class ExportDetailViewTests(TestCase):
         self.assertEqual([("test.csv", 4)], response.context_data["fileinfos"])
 
 
+class ExportListViewTests(TestCase):
+    def setUp(self):
+        group = Group.objects.create(name='testgroup1')
+        self.user = User.objects.create_user('testuser', 'testuser@example.com', 'password')
+        self.user.groups.add(group)
+        collection_set = CollectionSet.objects.create(name='Test Collection Set One', group=group)
+        credential = Credential.objects.create(user=self.user, platform='test platform', token="{'key': '1'}")
+        self.collection1 = Collection.objects.create(collection_set=collection_set, credential=credential,
+                                                     harvest_type='test harvest type', name='Test collection one')
+        self.collection2 = Collection.objects.create(collection_set=collection_set, credential=credential,
+                                                     harvest_type='test harvest type', name='Test collection two')
+        self.seed = Seed.objects.create(collection=self.collection2, token="test token", uid="123")
+        self.factory = RequestFactory()
+
+    def _create_exports(self, count):
+        for _ in range(count):
+            Export.objects.create(user=self.user, collection=self.collection1, export_type="flickr_user")
+            export = Export.objects.create(user=self.user, export_type="flickr_user")
+            export.seeds.add(self.seed)
+
+    def _get_export_list(self):
+        request = self.factory.get(reverse("export_list"))
+        request.user = self.user
+        with self.assertNumQueries(4):
+            response = ExportListView.as_view()(request)
+        return response.context_data["export_list"]
+
+    def test_export_list(self):
+        self._create_exports(1)
+        export_list = self._get_export_list()
+        self.assertEqual(2, len(export_list))
+        # Most recent first
+        self.assertEqual(self.collection2, export_list[0][1])
+        self.assertEqual(self.collection1, export_list[1][1])
+        self.assertEqual(self.collection1.collection_set, export_list[1][0])
+
+    def test_export_list_paginated(self):
+        self._create_exports(15)
+        self.assertEqual(ExportListView.paginate_by, len(self._get_export_list()))
+
+
 class ExportFileTest(TestCase):
     def setUp(self):
         self.group = Group.objects.create(name='testgroup1')
@@ -451,6 +576,24 @@ class ExportFileTest(TestCase):
         with self.assertRaises(PermissionDenied):
             export_file(request, self.export.pk, "test.csv")
 
+    def test_export_zip(self):
+        self.export.status = Export.SUCCESS
+        self.export.save()
+        request = self.factory.get(reverse("export_zip", args=[self.export.pk]))
+        request.user = self.user
+        response = export_zip(request, self.export.pk)
+        self.assertEquals(response["content-disposition"], "attachment; filename={}.zip".format(
+            self.export.export_id))
+        zip_file = zipfile.ZipFile(StringIO("".join(response.streaming_content)))
+        self.assertEqual(["test.csv"], zip_file.namelist())
+        self.assertEqual("test", zip_file.read("test.csv"))
+
+    def test_export_zip_not_success(self):
+        request = self.factory.get(reverse("export_zip", args=[self.export.pk]))
+        request.user = self.user
+        with self.assertRaises(Http404):
+            export_zip(request, self.export.pk)
+
 
 class ChangeLogTests(TestCase):
     def setUp(self):
@@ -477,6 +620,9 @@ class ChangeLogTests(TestCase):
         response = ChangeLogView.as_view()(request, model="CollectionSet", item_id=self.collection_set.id)
         self.assertEqual(self.collection_set.id, response.context_data["item_id"])
         self.assertEqual(2, response.context_data["paginator"].count)
+        diffs_page = response.context_data["diffs_page"]
+        self.assertEqual(2, len(diffs_page))
+        self.assertEqual(("Test Collection Set One", "changed collection_set name"), diffs_page[0].fields["name"])
         self.assertEqual("CollectionSet", response.context_data["model_name"])
         self.assertEqual("changed collection_set name", response.context_data["name"])
 
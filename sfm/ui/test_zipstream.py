@@ -0,0 +1,43 @@
+from django.test import TestCase
+from django.conf import settings
+from mock import patch
+from .zipstream import zip_stream
+
+import os
+import shutil
+import zipfile
+from StringIO import StringIO
+
+
+class ZipStreamTest(TestCase):
+    def setUp(self):
+        self.path = os.path.join(settings.SFM_DATA_DIR, "zip")
+        os.makedirs(self.path)
+        self.files = []
+        for arcname, filename, content in ((u"test1.txt", "test1.txt", "test1"),
+                                           (u"t\u00e9st2.txt", "test2.txt", "test2" * 100)):
+            filepath = os.path.join(self.path, filename)
+            with open(filepath, "w") as f:
+                f.write(content)
+            self.files.append((arcname, filepath))
+
+    def tearDown(self):
+        if os.path.exists(settings.SFM_DATA_DIR):
+            shutil.rmtree(settings.SFM_DATA_DIR)
+
+    def _assert_zip(self, content):
+        zip_file = zipfile.ZipFile(StringIO(content))
+        self.assertIsNone(zip_file.testzip())
+        self.assertEqual([u"test1.txt", u"t\u00e9st2.txt"], zip_file.namelist())
+        self.assertEqual("test1", zip_file.read(u"test1.txt"))
+        self.assertEqual("test2" * 100, zip_file.read(u"t\u00e9st2.txt"))
+        for zip_info in zip_file.infolist():
+            self.assertEqual(zipfile.ZIP_STORED, zip_info.compress_type)
+
+    def test_zip_stream(self):
+        self._assert_zip("".join(zip_stream(self.files)))
+
+    @patch("ui.zipstream.ZIP64_COUNT_LIMIT", 1)
+    @patch("ui.zipstream.ZIP64_LIMIT", 100)
+    def test_zip_stream_zip64(self):
+        self._assert_zip("".join(zip_stream(self.files)))
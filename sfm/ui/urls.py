@@ -54,6 +54,14 @@ urlpatterns = patterns('',
                            views.BulkSeedCreateView.as_view(),
                            name="bulk_seed_create"),
 
+                       url(r'^seeds/import/(?P<collection_pk>\d+)$',
+                           views.SeedImportCreateView.as_view(),
+                           name="seed_import_create"),
+
+                       url(r'^seeds/import/status/(?P<seed_import_id>[0-9a-f]+)/$',
+                           views.SeedImportStatusView.as_view(),
+                           name="seed_import_status"),
+
                        url(r'^seeds/(?P<pk>\d+)/update/$',
                            views.SeedUpdateView.as_view(),
                            name="seed_update"),
@@ -98,6 +106,10 @@ urlpatterns = patterns('',
                            views.export_file,
                            name='export_file'),
 
+                       url(r'^exports/(?P<pk>\d+)/zip/$',
+                           views.export_zip,
+                           name='export_zip'),
+
                        url(r'^harvests/(?P<pk>\d+)/$',
                            views.HarvestDetailView.as_view(),
                            name="harvest_detail"),
@@ -1,3 +1,7 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
 class Diff:
     def __init__(self):
         self.user = None
@@ -6,7 +10,7 @@ class Diff:
         self.fields = {}
 
 
-def diff_historical_object(original_historical_object, changed_historical_object):
+def diff_historical_object(original_historical_object, changed_historical_object, fields=None):
     """
     Performs a diff between two historical objects to determine which fields have changed.
 
@@ -15,13 +19,16 @@ def diff_historical_object(original_historical_object, changed_historical_object
     a Meta field named diff_fields containing a list of field names to diff.
     :param original_historical_object: the original historical object
     :param changed_historical_object: the changed historical object
+    :param fields: the field names to diff. Default is the diff fields.
     :return: a Diff
     """
     diff = Diff()
     diff.date = changed_historical_object.history_date
     diff.user = changed_historical_object.history_user
     diff.note = changed_historical_object.history_note
-    for field in changed_historical_object.history_object._meta.diff_fields:
+    if fields is None:
+        fields = changed_historical_object.history_object._meta.diff_fields
+    for field in fields:
         value = getattr(changed_historical_object, field)
         if value == "":
             value = None
@@ -33,20 +40,56 @@ def diff_historical_object(original_historical_object, changed_historical_object
     return diff
 
 
-def diff_object_history(obj):
+def diff_object_history(obj, start=0, stop=None):
     """
-    Performs a diff on all of an object's historical objects.
+    Performs a diff on an object's historical objects.
+
+    Only the requested historical objects and the historical object preceding
+    the last of them are retrieved. Since historical objects do not change,
+    the changed fields are cached by historical object for DIFF_CACHE_SECS.
+    Secret diff fields (e.g., credential tokens) are not cached and are diffed
+    each time.
     :param obj: the object which has a history
+    :param start: index of the first historical object to diff, from most recent backwards
+    :param stop: index after the last historical object to diff. Default is all.
     :return: a list of Diffs, from most recent historical object backwards
     """
+    historical_objects = obj.history.select_related("history_user")
+    if stop is None:
+        historical_objects = list(historical_objects[start:])
+        count = len(historical_objects)
+    else:
+        # Including the next historical object, which the last is diffed against.
+        historical_objects = list(historical_objects[start:stop + 1])
+        count = min(len(historical_objects), stop - start)
+
+    secret_fields = getattr(obj._meta, "secret_diff_fields", ())
+    cache_keys = [_diff_cache_key(historical_object) for historical_object in historical_objects[:count]]
+    cached_fields = cache.get_many(cache_keys)
     diffs = []
-    historical_objects = list(obj.history.all())
-    for i, historical_object in enumerate(historical_objects):
-        diffs.append(diff_historical_object(historical_objects[i + 1] if i < len(historical_objects) - 1 else None,
-                                            historical_object))
+    new_fields = {}
+    for i, cache_key in enumerate(cache_keys):
+        original_historical_object = historical_objects[i + 1] if i < len(historical_objects) - 1 else None
+        fields = cached_fields.get(cache_key)
+        if fields is None:
+            diff = diff_historical_object(original_historical_object, historical_objects[i])
+            new_fields[cache_key] = dict((field, values) for field, values in diff.fields.items()
+                                         if field not in secret_fields)
+        else:
+            diff = diff_historical_object(original_historical_object, historical_objects[i], fields=secret_fields)
+            diff.fields.update(fields)
+        diffs.append(diff)
+    if new_fields:
+        cache.set_many(new_fields, timeout=settings.DIFF_CACHE_SECS)
     return diffs
 
 
+def _diff_cache_key(historical_object):
+    # Including the date in case history ids are reused, e.g., by recreating the database.
+    return "diff.{}.{}.{}".format(historical_object._meta.db_table, historical_object.history_id,
+                                  historical_object.history_date.isoformat())
+
+
 def diff_field_changed(obj):
     """
     Returns True if a diff field was changed the last time this object was saved.
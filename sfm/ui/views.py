@@ -1,5 +1,7 @@
 from django.core.urlresolvers import reverse_lazy, reverse
-from django.db.models import Count
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.views.generic.list import ListView
@@ -18,12 +20,17 @@ from allauth.socialaccount.models import SocialApp
 
 from .forms import CollectionSetForm, ExportForm
 import forms
-from .models import CollectionSet, Collection, Seed, Credential, Harvest, Export, User
+from .models import CollectionSet, Collection, Seed, Credential, Harvest, Export, User, SeedImport
+from .seeds import import_seeds, create_seed_import, fail_stale_seed_imports
 from .sched import next_run_time
-from .utils import diff_object_history, clean_token, clean_blogname
+from .utils import diff_object_history
+from .downloads import download_response
+from .export import export_fileinfos
+from .zipstream import zip_stream
 
 import os
 import logging
+from datetime import timedelta
 
 log = logging.getLogger(__name__)
 
@@ -50,6 +57,7 @@ class CollectionSetListView(LoginRequiredMixin, ListView):
 
 class CollectionSetDetailView(LoginRequiredMixin, DetailView):
     model = CollectionSet
+    queryset = CollectionSet.objects.with_stats()
     template_name = 'ui/collection_set_detail.html'
     context_object_name = 'collection_set'
 
@@ -57,7 +65,8 @@ class CollectionSetDetailView(LoginRequiredMixin, DetailView):
         context = super(CollectionSetDetailView, self).get_context_data(**kwargs)
         context['collection_list'] = Collection.objects.filter(
             collection_set=self.object.pk).annotate(num_seeds=Count('seeds')).order_by('name')
-        context["diffs"] = diff_object_history(self.object)
+        context["diffs"] = diff_object_history(self.object, stop=3)
+        context["diff_count"] = self.object.history.count()
         context["harvest_types"] = sorted(Collection.HARVEST_CHOICES)
         context["item_id"] = self.object.id
         context["model_name"] = "collection_set"
@@ -103,6 +112,7 @@ class CollectionSetUpdateView(LoginRequiredMixin, UpdateView):
 
 class CollectionDetailView(LoginRequiredMixin, DetailView):
     model = Collection
+    queryset = Collection.objects.with_stats().select_related("latest_harvest")
     template_name = 'ui/collection_detail.html'
 
     def get_context_data(self, **kwargs):
@@ -110,11 +120,17 @@ class CollectionDetailView(LoginRequiredMixin, DetailView):
         context["next_run_time"] = next_run_time(self.object.id)
         # Last 5 harvests
         context["harvests"] = self.object.harvests.all().order_by('-date_requested')[:5]
-        context["harvest_count"] = self.object.harvests.all().count()
-        context["last_harvest"] = self.object.last_harvest()
-        context["diffs"] = diff_object_history(self.object)
+        context["harvest_count"] = self.object.harvest_count
+        context["last_harvest"] = self.object.latest_harvest
+        context["diffs"] = diff_object_history(self.object, stop=3)
+        context["diff_count"] = self.object.history.count()
         context["seed_list"] = Seed.objects.filter(collection=self.object.pk).order_by('token')
         context["has_seeds_list"] = self.object.required_seed_count() != 0
+        # Seed imports that are running or ended in the last day
+        fail_stale_seed_imports(self.object.seed_imports.all())
+        context["seed_imports"] = self.object.seed_imports.filter(
+            Q(date_ended__isnull=True) | Q(date_ended__gte=timezone.now() - timedelta(days=1))).order_by(
+            'date_requested')
         # For not enough seeds
         seed_warning_message = None
         # For too many seeds
@@ -152,12 +168,7 @@ class CollectionDetailView(LoginRequiredMixin, DetailView):
         context["credential_used_col"] = credential_used_col
         # Harvest types that are not limited support bulk add
         context["can_add_bulk_seeds"] = self.object.required_seed_count() is None
-        harvest_list = Harvest.objects.filter(harvest_type=self.object.harvest_type,
-                                              historical_collection__id=self.object.id)
-        if not harvest_list or "completed success" not in [str(item.status) for item in harvest_list]:
-            context["can_export"] = False
-        else:
-            context["can_export"] = True
+        context["can_export"] = self.object.last_success_date is not None
         context["item_id"] = self.object.id
         context["model_name"] = "collection"
         return context
@@ -272,7 +283,8 @@ class SeedDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         context = super(SeedDetailView, self).get_context_data(**kwargs)
-        context["diffs"] = diff_object_history(self.object)
+        context["diffs"] = diff_object_history(self.object, stop=3)
+        context["diff_count"] = self.object.history.count()
         context["collection_set"] = CollectionSet.objects.get(id=self.object.collection.collection_set.id)
         context["item_id"] = self.object.id
         context["model_name"] = "seed"
@@ -344,39 +356,46 @@ class BulkSeedCreateView(LoginRequiredMixin, View):
     template_name = 'ui/bulk_seed_create.html'
 
     def get(self, request, *args, **kwargs):
-        collection = Collection.objects.get(pk=kwargs["collection_pk"])
+        collection = self._get_collection(request, kwargs["collection_pk"])
         form = self._form_class(collection)(initial={}, collection=kwargs["collection_pk"])
         return self._render(request, form, collection)
 
     def post(self, request, *args, **kwargs):
-        collection = Collection.objects.get(pk=kwargs["collection_pk"])
-        form = self._form_class(collection)(request.POST, collection=kwargs["collection_pk"])
-        if form.is_valid():
-            tokens = form.cleaned_data['tokens'].splitlines()
-            seeds_type = form.cleaned_data['seeds_type']
-            seed_count = 0
-            if collection.harvest_type == collection.TUMBLR_BLOG_POSTS:
-                cleaned_data = [clean_blogname(t) for t in tokens]
-            else:
-                cleaned_data = [clean_token(t) for t in tokens]
-
-            for token in cleaned_data:
-                if token:
-                    param = {'uid': token} if seeds_type == 'uid' else {'token': token}
-                    if not Seed.objects.filter(collection=collection, **param).exists():
-                        log.debug("Creating seed %s for collection %s", token, collection.pk)
-                        Seed.objects.create(collection=collection,
-                                            history_note=form.cleaned_data['history_note'], **param)
-                        seed_count += 1
-                    else:
-                        log.debug("Skipping creating seed %s for collection %s since it exists", token,
-                                  collection.pk)
-            # <process form cleaned data>
-            messages.info(request, "{} seeds added.".format(seed_count))
-            return HttpResponseRedirect(reverse("collection_detail", args=(self.kwargs["collection_pk"],)))
+        collection = self._get_collection(request, kwargs["collection_pk"])
+        form = self._get_form(request, collection)
+        if not form.is_valid():
+            return self._form_invalid(request, form, collection)
+        seeds_type = form.cleaned_data['seeds_type']
+        history_note = form.cleaned_data['history_note']
+        if form.cleaned_data.get('tokens_file'):
+            seed_import, errors = create_seed_import(collection, request.user, form.cleaned_data['tokens_file'],
+                                                     seeds_type, history_note=history_note)
+            if errors:
+                for error in errors:
+                    form.add_error('tokens_file', error)
+                return self._form_invalid(request, form, collection)
+            return self._seed_import_created(request, form, seed_import)
+        with transaction.atomic():
+            seed_count = import_seeds(collection, form.cleaned_data['tokens'].splitlines(), seeds_type,
+                                      history_note=history_note)
+        messages.info(request, "{} seeds added.".format(seed_count))
+        return HttpResponseRedirect(reverse("collection_detail", args=(collection.pk,)))
+
+    @staticmethod
+    def _get_collection(request, collection_pk):
+        return Collection.objects.get(pk=collection_pk)
 
+    def _get_form(self, request, collection):
+        return self._form_class(collection)(request.POST, request.FILES, collection=collection.pk)
+
+    def _form_invalid(self, request, form, collection):
         return self._render(request, form, collection)
 
+    def _seed_import_created(self, request, form, seed_import):
+        messages.info(request, "Adding seeds from {}. This may take a few minutes.".format(
+            form.cleaned_data['tokens_file'].name))
+        return HttpResponseRedirect(reverse("collection_detail", args=(seed_import.collection_id,)))
+
     @staticmethod
     def _form_class(collection):
         return getattr(forms,
@@ -388,6 +407,73 @@ class BulkSeedCreateView(LoginRequiredMixin, View):
                        'harvest_type_name': _get_harvest_type_name(collection.harvest_type)})
 
 
+class SeedImportCreateView(BulkSeedCreateView):
+    """
+    Adds the seeds in an uploaded file to a collection in the background.
+
+    Expects the same fields as the bulk seed form, except that a file of seeds
+    is required as tokens_file. Returns the status of the seed import or the
+    validation errors as JSON.
+    """
+    http_method_names = ['post']
+
+    @staticmethod
+    def _get_collection(request, collection_pk):
+        collection = get_object_or_404(Collection, pk=collection_pk)
+        if not _can_access_collection(request.user, collection):
+            raise PermissionDenied
+        return collection
+
+    def _get_form(self, request, collection):
+        form = super(SeedImportCreateView, self)._get_form(request, collection)
+        # Only files of seeds
+        del form.fields['tokens']
+        return form
+
+    def _form_invalid(self, request, form, collection):
+        errors = []
+        for field_errors in form.errors.values():
+            errors.extend(field_errors)
+        return JsonResponse({"errors": errors}, status=400)
+
+    def _seed_import_created(self, request, form, seed_import):
+        return JsonResponse(_seed_import_status(seed_import), status=202)
+
+
+class SeedImportStatusView(LoginRequiredMixin, View):
+    """
+    Returns the status of a seed import as JSON.
+    """
+
+    def get(self, request, *args, **kwargs):
+        seed_import = get_object_or_404(SeedImport.objects.select_related("collection__collection_set"),
+                                        seed_import_id=kwargs["seed_import_id"])
+        if not _can_access_collection(request.user, seed_import.collection):
+            raise PermissionDenied
+        if fail_stale_seed_imports(SeedImport.objects.filter(pk=seed_import.pk)):
+            seed_import.refresh_from_db()
+        return JsonResponse(_seed_import_status(seed_import))
+
+
+def _can_access_collection(user, collection):
+    return user.is_superuser or user.groups.filter(pk=collection.collection_set.group_id).exists()
+
+
+def _seed_import_status(seed_import):
+    return {
+        "seed_import_id": seed_import.seed_import_id,
+        "status": seed_import.status,
+        "is_done": seed_import.is_done(),
+        "lines_processed": seed_import.lines_processed,
+        "seeds_added": seed_import.seeds_added,
+        "errors": seed_import.errors or [],
+        "date_requested": seed_import.date_requested,
+        "date_started": seed_import.date_started,
+        "date_ended": seed_import.date_ended,
+        "status_url": reverse("seed_import_status", args=(seed_import.seed_import_id,))
+    }
+
+
 class CredentialDetailView(LoginRequiredMixin, DetailView):
     model = Credential
     template_name = 'ui/credential_detail.html'
@@ -395,7 +481,8 @@ class CredentialDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         context = super(CredentialDetailView, self).get_context_data(**kwargs)
-        context["diffs"] = diff_object_history(self.object)
+        context["diffs"] = diff_object_history(self.object, stop=3)
+        context["diff_count"] = self.object.history.count()
         context["can_edit"] = self.request.user.is_superuser or self.object.user == self.request.user
         context["item_id"] = self.object.id
         context["model_name"] = "credential"
@@ -466,15 +553,21 @@ class ExportListView(LoginRequiredMixin, ListView):
     allow_empty = True
     paginate_orphans = 0
 
+    def get_queryset(self):
+        return Export.objects.filter(user=self.request.user).select_related(
+            "collection__collection_set").order_by('-date_requested', '-id')
+
     def get_context_data(self, **kwargs):
         context = super(ExportListView, self).get_context_data(**kwargs)
-        exports = Export.objects.filter(
-            user=self.request.user).order_by(
-            '-date_requested')
+        exports = list(context["object_list"])
+        # Seeds of an export are from a single collection, so looking up one collection per export.
+        seed_collection_ids = dict(Export.seeds.through.objects.filter(
+            export__in=[export.id for export in exports]).values_list("export_id", "seed__collection_id"))
+        seed_collections = Collection.objects.select_related("collection_set").in_bulk(
+            set(seed_collection_ids.values()))
         export_list = []
         for export in exports:
-            seeds = list(export.seeds.all())
-            collection = seeds[0].collection if seeds else export.collection
+            collection = seed_collections.get(seed_collection_ids.get(export.id)) or export.collection
             export_list.append((collection.collection_set, collection, export))
         context['export_list'] = export_list
         return context
@@ -510,20 +603,6 @@ class ExportCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
         return reverse('export_detail', args=(self.object.pk,))
 
 
-def _get_fileinfos(path):
-    """
-    Returns list of file names, bytes within directory
-    """
-    fileinfos = list()
-    if os.path.exists(path):
-        contents = os.listdir(path)
-        for item in contents:
-            path = os.path.join(path, item)
-            if os.path.isfile(path):
-                fileinfos.append((item, os.path.getsize(path)))
-    return fileinfos
-
-
 class ExportDetailView(LoginRequiredMixin, DetailView):
     model = Export
     template_name = 'ui/export_detail.html'
@@ -534,7 +613,7 @@ class ExportDetailView(LoginRequiredMixin, DetailView):
         collection = seeds[0].collection if seeds else self.object.collection
         context["collection_set"] = collection.collection_set
         context["collection"] = collection
-        context["fileinfos"] = _get_fileinfos(self.object.path) if self.object.status == Export.SUCCESS else ()
+        context["fileinfos"] = export_fileinfos(self.object) if self.object.status == Export.SUCCESS else ()
         return context
 
 
@@ -565,17 +644,6 @@ class HarvestDetailView(LoginRequiredMixin, DetailView):
         return context
 
 
-def _read_file_chunkwise(file_obj):
-    """
-    Reads file in 32Kb chunks
-    """
-    while True:
-        data = file_obj.read(32768)
-        if not data:
-            break
-        yield data
-
-
 def export_file(request, pk, file_name):
     """
     Allows authorized user to export a file.
@@ -587,17 +655,36 @@ def export_file(request, pk, file_name):
         filepath = os.path.join(export.path, file_name)
         log.debug("Exporting %s", filepath)
         if os.path.exists(filepath):
-            response = StreamingHttpResponse()
-            response['Content-Disposition'] = 'attachment; filename=%s' % file_name
-            file_obj = open(filepath)
-            response.streaming_content = _read_file_chunkwise(file_obj)
-            return response
+            return download_response(request, filepath, file_name)
         else:
             raise Http404
     else:
         raise PermissionDenied
 
 
+def export_zip(request, pk):
+    """
+    Allows authorized user to download all of the files of an export as a ZIP.
+
+    The ZIP is streamed as it is written.
+    """
+    export = get_object_or_404(Export, pk=pk)
+    if (request.user == export.user) or request.user.is_superuser:
+        if export.status != Export.SUCCESS:
+            raise Http404
+        files = []
+        for filename, _ in export_fileinfos(export):
+            filepath = os.path.join(export.path, filename)
+            if os.path.exists(filepath):
+                files.append((filename, filepath))
+        log.debug("Exporting %s files of %s as zip", len(files), export.export_id)
+        response = StreamingHttpResponse(zip_stream(files), content_type="application/zip")
+        response['Content-Disposition'] = 'attachment; filename=%s.zip' % export.export_id
+        return response
+    else:
+        raise PermissionDenied
+
+
 class ChangeLogView(LoginRequiredMixin, TemplateView):
     template_name = "ui/change_log.html"
 
@@ -608,11 +695,13 @@ class ChangeLogView(LoginRequiredMixin, TemplateView):
         ModelName = apps.get_model(app_label="ui", model_name=model_name)
         item = ModelName.objects.get(pk=item_id)
         context["item"] = item
-        diffs = diff_object_history(item)
-        paginator = Paginator(diffs, 15)
+        paginator = Paginator(item.history.all(), 15)
         # if no page in URL, show first
         page = self.request.GET.get("page", 1)
         diffs_page = paginator.page(page)
+        # Only diffing the historical objects on this page
+        start = (diffs_page.number - 1) * paginator.per_page
+        diffs_page.object_list = diff_object_history(item, start=start, stop=start + paginator.per_page)
         context["paginator"] = paginator
         context["diffs_page"] = diffs_page
         context["model_name"] = self.kwargs["model"].replace("_", " ")
@@ -639,7 +728,7 @@ class HomeView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super(HomeView, self).get_context_data(**kwargs)
         context['collection_set_list'] = CollectionSet.objects.filter(
-            group__in=self.request.user.groups.all()).order_by('name')
+            group__in=self.request.user.groups.all()).order_by('name').with_stats()
         return context
 
 
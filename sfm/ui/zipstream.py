@@ -0,0 +1,122 @@
+import binascii
+import datetime
+import os
+import struct
+
+# Values from these limits are recorded in ZIP64 structures.
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+CHUNK_SIZE = 65536
+
+# Data descriptor follows data (bit 3) and UTF-8 file names (bit 11)
+FLAGS = 0x08 | 0x800
+STORED = 0
+VERSION = 20
+ZIP64_VERSION = 45
+# Regular file, rw-r--r--
+EXTERNAL_ATTR = 0o100644 << 16
+
+
+def zip_stream(files):
+    """
+    Generates a ZIP archive of files.
+
+    Entries are stored (not compressed) and data descriptors are used, so the
+    archive is written in a single pass without seeking or holding a file in
+    memory. ZIP64 is used for files and archives that are too large for ZIP.
+
+    :param files: list of (name in archive, file path)
+    """
+    offset = 0
+    central_directory = []
+    for arcname, filepath in files:
+        if isinstance(arcname, unicode):
+            arcname = arcname.encode("utf-8")
+        size = os.path.getsize(filepath)
+        zip64 = size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+        dos_time, dos_date = _dos_date_time(os.path.getmtime(filepath))
+
+        local_header = _local_header(arcname, dos_time, dos_date, zip64)
+        yield local_header
+
+        crc = 0
+        size = 0
+        with open(filepath, "rb") as f:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if not data:
+                    break
+                crc = binascii.crc32(data, crc)
+                size += len(data)
+                yield data
+        crc &= 0xFFFFFFFF
+
+        data_descriptor = struct.pack("<LLQQ" if zip64 else "<LLLL", 0x08074b50, crc, size, size)
+        yield data_descriptor
+
+        central_directory.append(_central_directory_header(arcname, dos_time, dos_date, crc, size, offset, zip64))
+        offset += len(local_header) + size + len(data_descriptor)
+
+    central_directory_offset = offset
+    central_directory_size = 0
+    for central_directory_header in central_directory:
+        yield central_directory_header
+        central_directory_size += len(central_directory_header)
+
+    yield _end_of_central_directory(len(central_directory), central_directory_size, central_directory_offset)
+
+
+def _dos_date_time(timestamp):
+    dt = datetime.datetime.fromtimestamp(timestamp)
+    if dt.year < 1980:
+        dt = datetime.datetime(1980, 1, 1)
+    dos_time = (dt.hour << 11) | (dt.minute << 5) | (dt.second // 2)
+    dos_date = ((dt.year - 1980) << 9) | (dt.month << 5) | dt.day
+    return dos_time, dos_date
+
+
+def _local_header(arcname, dos_time, dos_date, zip64):
+    # CRC and sizes are in the data descriptor.
+    extra = b""
+    size = 0
+    if zip64:
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+        size = 0xFFFFFFFF
+    return struct.pack("<LHHHHHLLLHH", 0x04034b50, ZIP64_VERSION if zip64 else VERSION, FLAGS, STORED, dos_time,
+                       dos_date, 0, size, size, len(arcname), len(extra)) + arcname + extra
+
+
+def _central_directory_header(arcname, dos_time, dos_date, crc, size, offset, zip64):
+    extra_values = []
+    if size >= ZIP64_LIMIT:
+        # Uncompressed and compressed sizes
+        extra_values.extend([size, size])
+    if offset >= ZIP64_LIMIT:
+        extra_values.append(offset)
+    extra = b""
+    if extra_values:
+        extra = struct.pack("<HH" + "Q" * len(extra_values), 0x0001, 8 * len(extra_values), *extra_values)
+    version = ZIP64_VERSION if zip64 or extra_values else VERSION
+    return struct.pack("<LHHHHHHLLLHHHHHLL", 0x02014b50, version, version, FLAGS, STORED, dos_time, dos_date, crc,
+                       _zip_value(size), _zip_value(size), len(arcname), len(extra), 0, 0, 0,
+                       EXTERNAL_ATTR, _zip_value(offset)) + arcname + extra
+
+
+def _end_of_central_directory(count, central_directory_size, central_directory_offset):
+    end = b""
+    if count >= ZIP64_COUNT_LIMIT or central_directory_size >= ZIP64_LIMIT \
+            or central_directory_offset >= ZIP64_LIMIT:
+        zip64_end_offset = central_directory_offset + central_directory_size
+        end += struct.pack("<LQHHLLQQQQ", 0x06064b50, 44, ZIP64_VERSION, ZIP64_VERSION, 0, 0, count, count,
+                           central_directory_size, central_directory_offset)
+        end += struct.pack("<LLQL", 0x07064b50, 0, zip64_end_offset, 1)
+    zip_count = count if count < ZIP64_COUNT_LIMIT else 0xFFFF
+    end += struct.pack("<LHHHHLLH", 0x06054b50, 0, 0, zip_count, zip_count, _zip_value(central_directory_size),
+                       _zip_value(central_directory_offset), 0)
+    return end
+
+
+def _zip_value(value):
+    # Too large for ZIP, so recorded in a ZIP64 structure
+    return value if value < ZIP64_LIMIT else 0xFFFFFFFF